@@ -5,6 +5,7 @@ ITG Video Compressor - Main Entry Point
 
 import sys
 import os
+import multiprocessing
 
 # Handle both development and PyInstaller bundled executable
 if getattr(sys, 'frozen', False):
@@ -32,6 +33,8 @@ if base_path not in sys.path:
 from app import App
 
 if __name__ == "__main__":
+    # Batch compression runs in worker processes; required for PyInstaller builds
+    multiprocessing.freeze_support()
     app = App()
     app.mainloop()
 
@@ -1,6 +1,7 @@
 import customtkinter as ctk
 import os
 import sys
+import time
 import threading
 import subprocess
 import ctypes
@@ -15,7 +16,20 @@ from ui.widgets.settings import SettingsPanel
 from ui.widgets.action_bar import ActionBar
 from ui.widgets.status_panel import StatusPanel
 from utils.drive_importer import DriveImporter
-from compressor import VideoCompressor
+from utils.probe_cache import ProbeCache
+from utils.rate_history import RateHistory
+from utils.codecs import available_backends, get_backend, DEFAULT_CODEC
+from utils.result_cache import ResultCache
+from utils.targets import OutputTarget, parse_target_sizes, target_suffix
+from utils.trim import parse_range, trimmed_duration
+from utils.budget import BatchBudget, plan_batch_budget, processing_budget, MIN_SHARE_MB
+from utils.batch_settings import BatchSettings
+from utils.batch_executor import BatchExecutor
+from utils.cancellation import CancellationToken
+from utils.concurrency import ConcurrencyPlanner
+from utils.watchdog import DEFAULT_STALL_SECONDS
+from compressor import (VideoCompressor, ENGINE_FFMPEG, ENGINE_MOVIEPY, RATE_ABR, RATE_TWO_PASS,
+                        RATE_QUALITY, MIN_VIDEO_KBPS)
 
 # Fix for PyInstaller noconsole mode
 class NullWriter:
@@ -25,6 +39,14 @@ class NullWriter:
 if sys.stdout is None: sys.stdout = NullWriter()
 if sys.stderr is None: sys.stderr = NullWriter()
 
+# Settings "Mode" -> (ffmpeg preset, rate control)
+MODE_SETTINGS = {
+    "Fast": ("faster", RATE_ABR),
+    "Balanced": ("medium", RATE_ABR),
+    "Two-Pass": ("medium", RATE_TWO_PASS),
+    "Quality": ("medium", RATE_QUALITY),
+}
+
 class App(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -36,6 +58,11 @@ class App(ctk.CTk):
         # Managers
         self.theme_manager = ThemeManager()
         self.asset_manager = AssetManager()
+        self.probe_cache = ProbeCache()
+        self.rate_history = RateHistory()
+        # Probed once per ffmpeg binary, then cached on disk
+        self.codec_backends = available_backends()
+        self.result_cache = ResultCache()
         
         self.configure(fg_color=self.theme_manager.colors["bg"])
         
@@ -47,7 +74,12 @@ class App(ctk.CTk):
         self.abort_flag = False
         self.is_compressing = False
         self.was_aborted = False
-        self.current_processing_item = None
+        self.current_processing_items = {}
+        self.current_progress = {}
+        self.over_budget_jobs = set()
+        self.batch_executor = None
+        # Stops the work done before the executor exists (budget scans); set by Abort
+        self.batch_cancel_token = CancellationToken()
         self.compression_thread = None
 
         # Protocol
@@ -90,14 +122,16 @@ class App(ctk.CTk):
             self.main_container,
             self.theme_manager,
             on_queue_change=self.on_queue_changed,
-            on_drive_import=self.import_from_drive
+            on_drive_import=self.import_from_drive,
+            probe_cache=self.probe_cache
         )
         self.file_list.grid(row=1, column=0, pady=(10, 10), sticky="nsew")
 
         # 3. Settings
         self.settings_panel = SettingsPanel(
             self.main_container,
-            self.theme_manager
+            self.theme_manager,
+            codecs=[backend.label for backend in self.codec_backends]
         )
         self.settings_panel.grid(row=2, column=0, padx=100, pady=(0, 20), sticky="ew")
 
@@ -143,7 +177,8 @@ class App(ctk.CTk):
         if item not in self.file_list.queue_files:
             return 
         
-        status_icons = {"Processing...": "⚙️", "Done": "✅", "Error": "❌", "Pending": "⏳", "Timeout": "⏱️"}
+        status_icons = {"Processing...": "⚙️", "Done": "✅", "Error": "❌", "Pending": "⏳",
+                        "Timeout": "⏱️", "Cancelled": "🚫"}
         icon = status_icons.get(status_text, "")
         display_text = f"{icon} {status_text}" if icon else status_text
         
@@ -227,12 +262,43 @@ class App(ctk.CTk):
         
         settings = self.settings_panel.get_settings()
         try:
-            target_size = float(settings['target_size'])
+            target_sizes = parse_target_sizes(settings['target_size'])
         except ValueError:
             self.status_panel.label_status.configure(text="Invalid size.")
             return
+        if settings['budget'] and len(target_sizes) > 1:
+            self.status_panel.label_status.configure(text="A batch total takes a single size.")
+            return
+        try:
+            workers = settings['workers'].strip().lower()
+            workers = None if workers in ("", "auto") else max(1, int(workers))
+        except ValueError:
+            self.status_panel.label_status.configure(text="Invalid worker count.")
+            return
+        try:
+            max_fps = settings['max_fps'].strip().lower()
+            max_fps = None if max_fps in ("", "source") else float(max_fps)
+            if max_fps is not None and max_fps <= 0:
+                raise ValueError(max_fps)
+        except ValueError:
+            self.status_panel.label_status.configure(text="Invalid max FPS.")
+            return
+        try:
+            stall = settings['stall'].strip()
+            stall_timeout = float(stall) if stall else DEFAULT_STALL_SECONDS
+            if stall_timeout <= 0:
+                raise ValueError(stall_timeout)
+        except ValueError:
+            self.status_panel.label_status.configure(text="Invalid stall timeout.")
+            return
+        try:
+            trim = parse_range(settings['range'])
+        except ValueError:
+            self.status_panel.label_status.configure(text="Invalid range (e.g. 12:30-13:10).")
+            return
 
         self.abort_flag = False
+        self.batch_cancel_token = CancellationToken()
         self.is_compressing = True
         self.was_aborted = False
         
@@ -243,88 +309,312 @@ class App(ctk.CTk):
         self.status_panel.progressbar.set(0)
         
         speed_mode = settings['mode']
-        ffmpeg_preset = "faster" if speed_mode == "Fast" else "medium"
+        ffmpeg_preset, rate_control = MODE_SETTINGS.get(speed_mode, MODE_SETTINGS["Fast"])
+        engine = ENGINE_MOVIEPY if settings['engine'] == "MoviePy" else ENGINE_FFMPEG
+        if rate_control == RATE_TWO_PASS and engine != ENGINE_FFMPEG:
+            engine = ENGINE_FFMPEG
+            self.status_panel.log_message(
+                "Two-Pass mode needs the FFmpeg engine; switching engine for this batch.",
+                "warning")
+        backend = next((b for b in self.codec_backends if b.label == settings['codec']),
+                       get_backend(DEFAULT_CODEC))
+        if engine == ENGINE_MOVIEPY and not backend.moviepy:
+            engine = ENGINE_FFMPEG
+            self.status_panel.log_message(
+                f"{backend.label} needs the FFmpeg engine; switching engine for this batch.",
+                "warning")
+        if rate_control == RATE_TWO_PASS and not backend.supports_two_pass:
+            rate_control = RATE_ABR
+            self.status_panel.log_message(
+                f"{backend.label} has no two-pass mode; using single-pass for this batch.",
+                "warning")
+        segmented = settings['segmented']
+        if segmented and (engine != ENGINE_FFMPEG or rate_control == RATE_TWO_PASS):
+            self.status_panel.log_message(
+                "Splitting long videos needs the FFmpeg engine and a single-pass mode; "
+                "encoding them in one piece.", "warning")
         
-        self.status_panel.log_message(f"Starting batch compression of {len(queue_files)} videos (Mode: {speed_mode})...", "info")
+        self.status_panel.log_message(
+            f"Starting batch compression of {len(queue_files)} videos (Mode: {speed_mode}, "
+            f"Engine: {engine}, Codec: {backend.label})...", "info")
         
+        batch = BatchSettings(
+            target_sizes=tuple(target_sizes), preset=ffmpeg_preset, suffix=settings['suffix'],
+            output_folder=settings['output_folder'], engine=engine, rate_control=rate_control,
+            workers=workers, segmented=segmented, downscale=settings['downscale'],
+            dedupe=settings['dedupe'], max_fps=max_fps, codec=backend.name,
+            crop=settings['crop'], screen=settings['screen'], budget=settings['budget'],
+            trim=trim, speed_mode=speed_mode, stall_timeout=stall_timeout)
         self.compression_thread = threading.Thread(
-            target=self.run_batch_compression, 
-            args=(target_size, ffmpeg_preset, settings['suffix'], settings['output_folder']), 
-            daemon=True
+            target=self.run_batch_compression, args=(batch,), daemon=True
         )
         self.compression_thread.start()
 
-    def run_batch_compression(self, target_size, preset, suffix, output_folder_override):
-        compressor = VideoCompressor(target_size_mb=target_size)
+    def build_output_path(self, file_path, suffix, output_folder_override, containers=None):
+        basename = os.path.basename(file_path)
+        name, ext = os.path.splitext(basename)
+        if containers and ext.lower() not in containers:
+            ext = containers[0]  # The codec cannot be stored in the source's container
+        folder = output_folder_override or os.path.dirname(file_path)
+        return os.path.join(folder, f"{name}{suffix}{ext}")
+
+    def run_batch_compression(self, batch):
+        """Compress the queue with the BatchSettings the run was started with."""
+        target_sizes, preset, suffix = batch.target_sizes, batch.preset, batch.suffix
+        output_folder_override, trim, workers = batch.output_folder, batch.trim, batch.workers
+        # Batch budget: the size is the total for the whole queue, split across the files as
+        # they start
+        budget = BatchBudget(target_sizes[0]) if batch.budget else None
+        compressor_kwargs = batch.compressor_kwargs()
+        # Only used for settings_key(); encodes run in workers
+        compressor = VideoCompressor(**compressor_kwargs)
+        # Several sizes: every file gets one output per size (name suffixed with the size), all
+        # from one decode
+        targets = [OutputTarget(size) for size in target_sizes]
         queue_files = self.file_list.queue_files 
         total_files = len(queue_files)
         success_count = 0
         error_count = 0
+        finished_count = 0
         
+        # Work out what actually needs encoding (skip done items, serve cache hits right away)
+        jobs = []
         for index, item in enumerate(queue_files):
-            if self.abort_flag:
-                self.status_panel.log_message("Compression aborted by user.", "warning")
-                if self.current_processing_item:
-                    self.update_queue_item_status(self.current_processing_item, "Pending", "text")
-                break
-                
-            if item not in queue_files: continue
-            
             try:
                 if item.get('status_label'):
                     if "Done" in item['status_label'].cget("text"):
                         success_count += 1
+                        finished_count += 1
+                        if budget is not None:
+                            done_path = self.build_output_path(item['path'], suffix,
+                                                               output_folder_override,
+                                                               compressor.backend.containers)
+                            if os.path.isfile(done_path):
+                                budget.spend(os.path.getsize(done_path) / (1024 * 1024))
                         continue
             except: continue
             
             file_path = item['path']
-            self.current_processing_item = item
-            self.update_queue_item_status(item, "Processing...", "orange")
             filename = os.path.basename(file_path)
+            outputs = []
+            for target in targets:
+                target_compressor = compressor.for_target(target)
+                output_suffix = suffix
+                if len(targets) > 1:
+                    output_suffix = target_suffix(suffix, target.size_mb)
+                output_path = self.build_output_path(file_path, output_suffix,
+                                                     output_folder_override,
+                                                     target_compressor.backend.containers)
+                # Identical input + settings already compressed before: reuse that output.
+                # Budget shares depend on the whole batch, so they never match an earlier result
+                settings_key = target_compressor.settings_key(output_path, preset, trim)
+                cache_key = (self.result_cache.make_key(file_path, settings_key)
+                             if budget is None else None)
+                if not self.result_cache.restore(cache_key, output_path):
+                    outputs.append((target, output_path, cache_key))
+            if not outputs:
+                self.update_queue_item_status(item, "Done", "green")
+                success_count += 1
+                finished_count += 1
+                self.status_panel.log_message(f"♻️ Reused previous result: {filename}", "success")
+                continue
             
-            self.after(0, lambda f=filename, i=index, t=total_files: 
-                self.status_panel.label_status.configure(text=f"Compressing {i+1}/{t}: {f}..."))
-            self.status_panel.log_message(f"Processing: {filename}", "info")
-            
-            if output_folder_override:
-                basename = os.path.basename(file_path)
-                name, ext = os.path.splitext(basename)
-                output_path = os.path.join(output_folder_override, f"{name}{suffix}{ext}")
-            else:
-                dirname = os.path.dirname(file_path)
-                basename = os.path.basename(file_path)
-                name, ext = os.path.splitext(basename)
-                output_path = os.path.join(dirname, f"{name}{suffix}{ext}")
-                
+            # Cached probe (filled by the queue's metadata worker) drives the thread plan
+            info = self.probe_cache.get(file_path)
+            shared_targets = None
+            if len(targets) > 1:
+                shared_targets = [(target.to_dict(), output_path)
+                                  for target, output_path, _ in outputs]
+            jobs.append({
+                'id': index,
+                'item': item,
+                'info': info,
+                'cache_keys': [(cache_key, output_path) for _, output_path, cache_key in outputs],
+                'height': info.height if info else None,
+                'duration': trimmed_duration(trim, info.duration) if info else None,
+                'job': {
+                    'input_path': file_path,
+                    'trim': trim,
+                    'output_path': outputs[0][1],
+                    'targets': shared_targets,
+                    'preset': preset,
+                    'compressor': compressor_kwargs,
+                    'probe_cache_path': self.probe_cache.db_path,
+                    'rate_history_path': self.rate_history.db_path,
+                }
+            })
+        
+        self.after(0, lambda p=finished_count / max(total_files, 1):
+                   self.status_panel.progressbar.set(p))
+        
+        if jobs and budget is not None:
+            self.plan_budget_shares(budget, jobs, batch)
+        
+        for entry in jobs:
+            entry['job']['max_processing_time'] = processing_budget(
+                batch.speed_mode, entry['duration'], len(entry['cache_keys']))
+        
+        if jobs:
+            planner = ConcurrencyPlanner(max_workers=workers)
+            workers = planner.plan_workers([(job['height'], job['duration']) for job in jobs])
+            self.status_panel.log_message(
+                f"🧮 Running {len(jobs)} compressions on {workers} worker process(es) "
+                f"across {planner.cpu_count} cores.", "info")
+            executor = BatchExecutor(max_workers=workers)
+            self.batch_executor = executor
+            running = {}
+            aborted = False
             try:
-                res = compressor.compress_video(file_path, output_path, preset=preset)
-                
-                if res:
-                    self.update_queue_item_status(item, "Done", "green")
-                    success_count += 1
-                    self.status_panel.log_message(f"✅ Success: {filename}", "success")
-                else:
-                     self.update_queue_item_status(item, "Error", "red")
-                     error_count += 1
-                     self.status_panel.log_message(f"❌ Failed: {filename}", "error")
-                     
-            except Exception as e:
-                self.update_queue_item_status(item, "Error", "red")
-                error_count += 1
-                self.status_panel.log_message(f"❌ Error: {filename} - {e}", "error")
-                
-            self.current_processing_item = None
-            progress = (index + 1) / total_files
-            self.after(0, lambda p=progress: self.status_panel.progressbar.set(p))
+                while (jobs or running):
+                    if self.abort_flag and not aborted:
+                        # Kills the encoders of running files right away instead of letting
+                        # them finish
+                        aborted = True
+                        executor.cancel()
+                        self.status_panel.log_message("Compression aborted by user.", "warning")
+                        if jobs:
+                            self.status_panel.log_message(f"{len(jobs)} queued videos not started.",
+                                                          "warning")
+                        jobs = []
+                    
+                    # Keep every worker busy
+                    while jobs and len(running) < workers:
+                        entry = jobs.pop(0)
+                        jobs_left = len(jobs) + len(running) + 1
+                        entry['job']['threads'] = planner.threads_for(
+                            entry['height'], entry['duration'], workers, jobs_left)
+                        entry['job']['cpu_budget'] = planner.core_share(workers, jobs_left)
+                        if budget is not None:
+                            left_mb = budget.remaining_mb()
+                            share = max(budget.reserve(entry['id']), MIN_SHARE_MB)
+                            entry['job']['compressor'] = dict(compressor_kwargs,
+                                                              target_size_mb=round(share, 2))
+                            self.status_panel.log_message(
+                                f"💰 {os.path.basename(entry['job']['input_path'])}: "
+                                f"{share:.2f} MB of the {left_mb:.2f} MB left", "info")
+                        running[entry['id']] = entry
+                        self.current_processing_items[entry['id']] = entry['item']
+                        self.update_queue_item_status(entry['item'], "Processing...", "orange")
+                        filename = os.path.basename(entry['job']['input_path'])
+                        self.status_panel.log_message(
+                            f"Processing: {filename} ({entry['height'] or '?'}p, "
+                            f"{entry['job']['threads']} threads)", "info")
+                        executor.submit(entry['id'], entry['job'])
+                    
+                    self.after(0, lambda n=len(running), d=finished_count, t=total_files:
+                        self.status_panel.label_status.configure(
+                            text=f"Compressing: {n} running, {d}/{t} finished..."))
+                    
+                    event = executor.get_event(timeout=0.2)
+                    while event is not None:
+                        self.handle_worker_event(event)
+                        event = executor.get_event(timeout=0)
+                    
+                    # Finished files plus the fraction done of every running one
+                    running_done = sum(self.current_progress.values()) / 100
+                    overall = (finished_count + running_done) / total_files
+                    self.after(0, lambda p=overall: self.status_panel.progressbar.set(p))
+                    
+                    for result in executor.poll_finished():
+                        entry = running.pop(result['job_id'])
+                        self.current_processing_items.pop(result['job_id'], None)
+                        self.current_progress.pop(result['job_id'], None)
+                        item = entry['item']
+                        filename = os.path.basename(entry['job']['input_path'])
+                        self.after(0, lambda name=filename:
+                                   self.status_panel.clear_file_progress(name))
+                        if budget is not None:
+                            # What this file really used decides the shares of the files still
+                            # waiting
+                            written = [path for _, path in entry['cache_keys']
+                                       if result['success'] and os.path.isfile(path)]
+                            written_mb = sum(os.path.getsize(path) for path in written)
+                            budget.finish(entry['id'], written_mb / (1024 * 1024))
+                        if result['success']:
+                            for cache_key, output_path in entry['cache_keys']:
+                                self.result_cache.store(cache_key, output_path)
+                            self.update_queue_item_status(item, "Done", "green")
+                            success_count += 1
+                            self.status_panel.log_message(f"✅ Success: {filename}", "success")
+                        elif result.get('status') == "cancelled":
+                            self.update_queue_item_status(item, "Cancelled", "text")
+                            self.status_panel.log_message(
+                                f"🚫 Cancelled: {filename} (partial output removed)", "warning")
+                        elif result.get('status') == "timeout":
+                            self.update_queue_item_status(item, "Timeout", "red")
+                            error_count += 1
+                            self.status_panel.log_message(
+                                f"⏱️ Timeout: {filename} stopped making progress "
+                                "(corrupt or truncated file?)", "timeout")
+                        else:
+                            self.update_queue_item_status(item, "Error", "red")
+                            error_count += 1
+                            if result.get('error'):
+                                self.status_panel.log_message(
+                                    f"❌ Error: {filename} - {result['error']}", "error")
+                            else:
+                                self.status_panel.log_message(f"❌ Failed: {filename}", "error")
+                        finished_count += 1
+                        self.after(0, lambda p=finished_count / total_files:
+                                   self.status_panel.progressbar.set(p))
+            finally:
+                self.batch_executor = None
+                executor.shutdown()
             
-        self.current_processing_item = None
+        if budget is not None:
+            used_mb = budget.used_mb()
+            self.status_panel.log_message(
+                f"💰 Batch total: {used_mb:.2f} MB of the {target_sizes[0]:g} MB budget",
+                "success" if used_mb <= budget.total_mb else "warning")
+        self.current_processing_items = {}
+        self.current_progress = {}
+        self.over_budget_jobs = set()
+        self.after(0, self.status_panel.clear_file_progress)
         if self.abort_flag: self.was_aborted = True
         
         self.after(0, lambda: self.compression_finished(success_count, total_files, error_count))
 
+    def plan_budget_shares(self, budget, jobs, batch):
+        """Weigh the files of a budget batch (see utils.budget.plan_batch_budget()) and log it."""
+        start_time = time.time()
+        min_video_kbps = MIN_VIDEO_KBPS[batch.engine]
+        floor_mb = plan_batch_budget(budget, jobs, min_video_kbps, self.probe_cache, batch.trim,
+                                     batch.workers, cancel_token=self.batch_cancel_token)
+        self.status_panel.log_message(
+            f"💰 Batch budget: {budget.remaining_mb():.2f} MB for {len(jobs)} files, split by "
+            f"duration, resolution and complexity (analysed in {time.time() - start_time:.1f}s)",
+            "info")
+        if floor_mb > budget.remaining_mb():
+            self.status_panel.log_message(
+                f"The budget is below the {min_video_kbps} kbps minimum for these files "
+                f"(~{floor_mb:.1f} MB); the total will run over.", "warning")
+
+    def handle_worker_event(self, event):
+        kind, job_id = event[0], event[1]
+        item = self.current_processing_items.get(job_id)
+        if kind == "status" and item is not None:
+            self.update_queue_item_status(item, event[2], event[3])
+        elif kind == "log":
+            self.status_panel.log_message(event[2], event[3])
+        elif kind == "progress" and item is not None:
+            stats = event[2]
+            self.current_progress[job_id] = stats.get('percent') or 0
+            filename = os.path.basename(item['path'])
+            if stats.get('over_budget') and job_id not in self.over_budget_jobs:
+                self.over_budget_jobs.add(job_id)
+                self.status_panel.log_message(
+                    f"{filename} is running slower than its time budget "
+                    f"(about {stats['eta'] / 60:.0f} min left)", "warning")
+            self.after(0, lambda name=filename, s=stats:
+                       self.status_panel.show_file_progress(name, s))
+
     def abort_compression(self):
         self.abort_flag = True
+        self.batch_cancel_token.cancel()
         self.is_compressing = False
+        executor = self.batch_executor
+        if executor is not None:
+            executor.cancel_token.cancel()
         self.status_panel.log_message("Abort requested...", "warning")
         
     def compression_finished(self, success_count, total, error_count):
@@ -371,10 +661,13 @@ class App(ctk.CTk):
         self.status_panel.log_message("Refreshing...", "info")
         if self.is_compressing:
             self.abort_flag = True
+            self.batch_cancel_token.cancel()
             self.is_compressing = False
             
         self.was_aborted = False
-        self.current_processing_item = None
+        self.current_processing_items = {}
+        self.current_progress = {}
+        self.over_budget_jobs = set()
         
         self.file_list.clear_queue()
         self.settings_panel.reset()
@@ -400,6 +693,12 @@ class App(ctk.CTk):
 
     def on_closing(self):
         self.abort_flag = True
+        self.batch_cancel_token.cancel()
+        executor = self.batch_executor
+        if executor is not None:
+            # Let workers kill their ffmpeg processes before the pool goes, so none are orphaned
+            executor.cancel(wait_seconds=1.0)
+            executor.shutdown(terminate=True)
         self.destroy()
         os._exit(0)
 
@@ -29,37 +29,741 @@ if getattr(sys, 'frozen', False):
 from moviepy.editor import VideoFileClip
 from colorama import init, Fore
 
+from utils.ffmpeg_tools import get_ffmpeg_path, run_ffmpeg
+from utils.media_info import MediaInfo, probe_media
+from utils.concurrency import plan_threads
+from utils import resolution
+from utils.codecs import get_backend, DEFAULT_CODEC
+from utils.encode_plan import EncodePlan
+from utils import crop
+from utils import content
+from utils import complexity
+from utils.audio import AudioPlan, plan_audio, scan_audio_levels
+from utils import predictor
+from utils.rate_history import rate_profile
+from utils import segments
+from utils.segments import MIN_SEGMENTED_DURATION
+from utils.progress import ProgressTracker
+from utils.watchdog import StallWatchdog, DEFAULT_STALL_SECONDS
+from utils import passlog
+from utils import passthrough
+from utils import moviepy_engine
+from utils import targets
+from utils import trim as trimming
+from utils.constants import (ENGINE_MOVIEPY, ENGINE_FFMPEG, ENGINES, RATE_ABR, RATE_TWO_PASS,
+                             RATE_QUALITY, RATE_CONTROLS, STATUS_DONE, STATUS_FAILED,
+                             STATUS_CANCELLED, STATUS_TIMEOUT, SCREEN_MAX_FPS,
+                             SCREEN_KEYFRAME_SECONDS, SCREEN_BPP_FACTOR, FASTSTART_EXTENSIONS,
+                             SIZE_MARGIN, SIZE_TOLERANCE, MIN_VIDEO_KBPS)
+
 init(autoreset=True)
 
+# Encodes per file, including the first one
+DEFAULT_MAX_ATTEMPTS = 3
+
+# VBV buffer of the "quality" mode's bitrate ceiling in seconds at that rate (the constant
+# quality itself comes from the codec backend); larger buffers let motion borrow more bits
+QUALITY_BUFFER_SECONDS = 2.0
+
+# x264's default GOP length in frames; with dropped or capped frames keyframes are
+# forced at the same spacing in seconds instead, so seeking behaves as before
+X264_DEFAULT_KEYINT = 250
+DEFAULT_FPS = 30.0
+
 class VideoCompressor:
-    def __init__(self, target_size_mb=9, safe_bitrate_kbps=800):
+    def __init__(self, target_size_mb=9, safe_bitrate_kbps=800, engine=ENGINE_MOVIEPY,
+                 rate_control=RATE_ABR, allow_passthrough=True, probe_cache=None, segmented=False,
+                 stall_timeout=DEFAULT_STALL_SECONDS, auto_downscale=False, drop_duplicates=False,
+                 max_fps=None, predict_size=False, rate_history=None,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, codec=DEFAULT_CODEC, auto_crop=False,
+                 content_tuning=False, allocate_bitrate=False, max_height=None):
         """
         Initialize the compressor with target size and bitrate.
         
         Args:
             target_size_mb: Maximum target size in MB (default 9)
             safe_bitrate_kbps: Safe bitrate in kbps (default 800)
+            engine: Encoding engine, "moviepy" (default) or "ffmpeg"
+            rate_control: "abr" (default), "two_pass" (requires the ffmpeg engine) or "quality"
+                (constant quality, capped at the bitrate the target size allows)
+            allow_passthrough: Copy/remux inputs that already fit the target instead of re-encoding
+            probe_cache: Optional ProbeCache; unchanged files are then never re-probed
+            segmented: Split long inputs at keyframes and encode the chunks in parallel (ffmpeg
+                engine, single-pass modes)
+            stall_timeout: Seconds an encode may go without any progress before it is killed as hung
+            auto_downscale: Lower the output resolution when the bitrate is too low for the
+                source size
+            drop_duplicates: Drop near-duplicate frames (static screen content) and write variable
+                frame rate output
+            max_fps: Cap the output frame rate (e.g. 15 or 24), None to keep the source rate
+            predict_size: Encode short samples first and correct the bitrate before the full
+                encode (ABR only)
+            rate_history: Optional RateHistory; every attempt is recorded and seeds the bitrate of
+                similar files
+            max_attempts: Encodes per file; outputs over the target are re-encoded at a corrected
+                bitrate
+            codec: Video codec backend, "h264" (default), "hevc", "av1" or "vp9" (see utils.codecs)
+            auto_crop: Crop away black bars and dead canvas found in frames sampled across the input
+            content_tuning: Classify each input from sampled frames and encode screen content
+                with the screen profile (codec tune, longer GOP, frame rate capped at
+                SCREEN_MAX_FPS)
+            allocate_bitrate: In segmented encodes, give each chunk a bitrate that follows the
+                input's complexity curve (from a low-resolution scan) instead of the same
+                bitrate for all
+            max_height: Largest output resolution as a "p" number (the short side, e.g. 720),
+                None for no limit
         """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'. Expected one of: {', '.join(ENGINES)}")
+        if rate_control not in RATE_CONTROLS:
+            raise ValueError(f"Unknown rate control '{rate_control}'. "
+                             f"Expected one of: {', '.join(RATE_CONTROLS)}")
+        if rate_control == RATE_TWO_PASS and engine != ENGINE_FFMPEG:
+            raise ValueError("Two-pass encoding requires the ffmpeg engine")
+        backend = get_backend(codec)
+        if engine == ENGINE_MOVIEPY and not backend.moviepy:
+            raise ValueError(f"{backend.label} encoding requires the ffmpeg engine")
+        if rate_control == RATE_TWO_PASS and not backend.supports_two_pass:
+            raise ValueError(f"{backend.label} does not support two-pass encoding")
+        if max_fps is not None and max_fps <= 0:
+            raise ValueError("max_fps must be positive")
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        if max_height is not None and max_height <= 0:
+            raise ValueError("max_height must be positive")
         self.target_size_mb = target_size_mb
         self.safe_bitrate_kbps = safe_bitrate_kbps
         self.max_size_bytes = target_size_mb * 1024 * 1024
+        self.engine = engine
+        self.rate_control = rate_control
+        self.allow_passthrough = allow_passthrough
+        self.probe_cache = probe_cache
+        self.segmented = segmented
+        self.auto_downscale = auto_downscale
+        self.drop_duplicates = drop_duplicates
+        self.max_fps = max_fps
+        self.predict_size = predict_size
+        self.rate_history = rate_history
+        self.max_attempts = max_attempts
+        self.backend = backend
+        self.auto_crop = auto_crop
+        self.content_tuning = content_tuning
+        self.allocate_bitrate = allocate_bitrate
+        self.max_height = max_height
+        self.stall_timeout = stall_timeout
+        # State of the file being compressed, shared with the encode helpers in utils
+        # (segments, passlog, moviepy_engine, targets, trim)
+        self.crop_box = None  # (width, height, x, y), set by plan_crop()
+        self.content_stats = None  # ContentStats, set by plan_content()
+        self.progress = ProgressTracker(None, 0)  # Replaced for every compress_video() call
+        self.cancel_token = None
+        self.timed_out = False  # Set when the watchdog stopped an encode
+        self.display_name = None  # Name of the user's file while a cut of it is compressed
+        self.last_status = None
+
+    def name_of(self, input_path):
+        """Name of the input in messages: the user's file, also while a cut of it is compressed."""
+        return self.display_name or os.path.basename(input_path)
 
-    def compress_video(self, input_path, output_path, progress_callback=None, max_processing_time=None, preset="medium"):
+    def settings_key(self, output_path, preset="medium", trim=None):
         """
-        Compress video using MoviePy with calculated bitrate to achieve target size.
+        Describe every setting that changes the produced output (used as a result cache key).
+        
+        Args:
+            output_path: Output path (its container matters, its name does not)
+            preset: FFmpeg preset
+            trim: Time range of the input that is compressed, None for the whole file
+            
+        Returns:
+            String key
+        """
+        ext = os.path.splitext(output_path)[1].lower()
+        return (f"target={self.target_size_mb}|engine={self.engine}|rate={self.rate_control}|"
+                f"preset={preset}|codec={self.backend.encoder}/{self.backend.audio_codec(ext)}|"
+                f"passthrough={self.allow_passthrough}|segmented={self.segmented}|"
+                f"downscale={self.auto_downscale}|dedupe={self.drop_duplicates}|"
+                f"max_fps={self.max_fps}|"
+                f"predict={self.predict_size}|attempts={self.max_attempts}|crop={self.auto_crop}|"
+                f"content={self.content_tuning}|allocate={self.allocate_bitrate}|"
+                f"max_height={self.max_height}|trim={trim}|ext={ext}")
+
+    def build_ffmpeg_command(self, input_path, output_path, video_bitrate_kbps, audio_bitrate_kbps,
+                             preset="medium", threads=4, pass_number=None, passlog_prefix=None,
+                             output_size=None, fps_cap=None, source_fps=None, audio_plan=None,
+                             seek=None):
+        """
+        Build a single ffmpeg command line that decodes, scales and encodes in one process.
+        
+        For two-pass encoding, pass 1 drops audio and writes to the null muxer;
+        only its stats file (``passlog_prefix``) is kept.
         
         Args:
             input_path: Path to input video
             output_path: Path to save compressed video
-            progress_callback: Optional callback for progress updates
-            max_processing_time: Maximum allowed processing time in seconds (calculated from duration if None)
+            video_bitrate_kbps: Target video bitrate in kbps (the ceiling in quality mode)
+            audio_bitrate_kbps: Target audio bitrate in kbps
             preset: FFmpeg preset (e.g. 'medium', 'faster', 'veryfast')
+            threads: Number of encoder threads
+            pass_number: None for single-pass, 1 or 2 for two-pass encoding
+            passlog_prefix: Stats file prefix shared by both passes
+            output_size: (width, height) to scale to, None to keep the source size
+            fps_cap: Output frame rate to reduce to, None to keep the source rate
+            source_fps: Frame rate of the input, for keyframe spacing when frames are dropped
+            audio_plan: AudioPlan for the audio track (replaces audio_bitrate_kbps), None to
+                encode the first track, if any, at audio_bitrate_kbps
+            seek: Optional (start, seconds) window to encode instead of the whole input
+            
+        Returns:
+            List of command line arguments
+        """
+        cmd = [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y"]
+        if seek is not None:
+            cmd += ["-ss", f"{seek[0]:.3f}", "-t", f"{seek[1]:.3f}"]
+        output_ext = os.path.splitext(output_path)[1]
+        cmd += [
+            "-i", input_path,
+            "-map", "0:v:0",
+            "-vf", self.video_filter(output_size, fps_cap),
+        ] + self.video_output_args(output_ext, video_bitrate_kbps, preset, threads, fps_cap,
+                                    source_fps, pass_number, passlog_prefix)
+        if pass_number == 1:
+            cmd += ["-an", "-f", "null", "-"]
+            return cmd
+        
+        if audio_plan is None:
+            audio_plan = AudioPlan("encode", bitrate_kbps=audio_bitrate_kbps,
+                                   codec=self.backend.audio_codec(output_ext))
+        return cmd + audio_plan.ffmpeg_args() + self.container_args(output_ext) + [output_path]
+
+    def video_output_args(self, output_ext, video_bitrate_kbps, preset, threads, fps_cap=None,
+                          source_fps=None, pass_number=None, passlog_prefix=None):
+        """Encoder, rate control and frame timing options of one video output."""
+        args = self.backend.encoder_args(preset, output_ext, pass_number, passlog_prefix)
+        args += self.rate_args(video_bitrate_kbps)
+        args += ["-pix_fmt", "yuv420p", "-threads", str(threads)]
+        return (args + self.content_args(fps_cap or source_fps)
+                + self.frame_rate_args(fps_cap, source_fps))
+
+    @staticmethod
+    def container_args(output_ext):
+        return ["-movflags", "+faststart"] if output_ext.lower() in FASTSTART_EXTENSIONS else []
+
+    def rate_args(self, video_bitrate_kbps):
+        """
+        Rate control: an average bitrate, or constant quality under a ceiling.
+        
+        In quality mode static content comes out well under the ceiling, while
+        motion can use it fully; the VBV buffer bounds how long it may exceed it.
+        """
+        return self.backend.rate_args(video_bitrate_kbps, quality=self.rate_control == RATE_QUALITY,
+                                      buffer_seconds=QUALITY_BUFFER_SECONDS)
+
+    def video_filter(self, output_size=None, fps_cap=None):
+        """
+        Filter chain for the video stream: frame-rate cap, crop, duplicate dropping, then scaling.
+        
+        The cap comes first so that mpdecimate sees the reduced stream; the
+        other way round, the fps filter would fill the dropped frames back in.
+        """
+        return ",".join(self.video_filters(fps_cap) + [self.scale_filter(output_size)])
+
+    def video_filters(self, fps_cap=None):
+        """The filters before scaling, which do not depend on the output size."""
+        filters = []
+        if fps_cap:
+            filters.append(f"fps={fps_cap:g}")
+        if self.crop_box:
+            filters.append("crop={}:{}:{}:{}".format(*self.crop_box))
+        if self.drop_duplicates:
+            filters.append("mpdecimate")
+        return filters
+
+    @staticmethod
+    def scale_filter(output_size=None):
+        if output_size is None:
+            return "scale=trunc(iw/2)*2:trunc(ih/2)*2"  # yuv420p needs even dimensions
+        return f"scale={output_size[0]}:{output_size[1]}"
+
+    def frame_rate_args(self, fps_cap=None, source_fps=None):
+        """
+        Output options that keep timestamps and keyframe spacing intact when frames are dropped
+        or capped.
+        
+        Dropped frames leave gaps in the timestamps (variable frame rate), so
+        audio stays in sync; keyframes are forced by time because a GOP of
+        X264_DEFAULT_KEYINT frames could otherwise span minutes of static screen.
+        """
+        if not self.drop_duplicates and not fps_cap:
+            return []
+        args = ["-fps_mode", "vfr"] if self.drop_duplicates else []
+        keyframe_seconds = X264_DEFAULT_KEYINT / (source_fps or DEFAULT_FPS)
+        if self.is_screen():
+            keyframe_seconds = SCREEN_KEYFRAME_SECONDS
+        # Spaced from the previous forced keyframe, so a long dropped stretch does not cause a
+        # burst of them
+        expression = f"expr:if(isnan(prev_forced_t),1,gte(t,prev_forced_t+{keyframe_seconds:.3f}))"
+        return args + ["-force_key_frames", expression]
+
+    def plan_fps_cap(self, info):
+        """Frame rate to reduce the output to, or None when the source is at or below the cap."""
+        max_fps = self.max_fps
+        if self.is_screen():
+            max_fps = min(max_fps or SCREEN_MAX_FPS, SCREEN_MAX_FPS)
+        if not max_fps or not info.fps or info.fps <= max_fps:
+            return None
+        return max_fps
+
+    def is_screen(self):
+        return self.content_stats is not None and self.content_stats.is_screen
+
+    def content_args(self, fps=None):
+        """Codec tune and GOP length of the screen profile; nothing for camera content."""
+        if not self.is_screen():
+            return []
+        gop = round(SCREEN_KEYFRAME_SECONDS * (fps or DEFAULT_FPS))
+        return self.backend.screen_args() + ["-g", str(gop)]
+
+    def plan_content(self, input_path, info):
+        """
+        Screen or camera content of this file (see utils.content.plan_content()).
+        
+        The cropped area is analysed, so plan_crop() runs first. Screen content
+        gets the screen profile for this file.
+        
+        Returns:
+            ContentStats, or None if content tuning is off or no frames decoded
+        """
+        self.content_stats = None
+        if self.content_tuning:
+            self.content_stats = content.plan_content(input_path, info, crop=self.crop_box,
+                                                      codec_label=self.backend.label)
+        return self.content_stats
+
+    def plan_crop(self, input_path, info):
+        """Crop for black bars or dead canvas in this file (see utils.crop.plan_crop())."""
+        self.crop_box = crop.plan_crop(input_path, info) if self.auto_crop else None
+        return self.crop_box
+
+    def frame_size(self, info):
+        """Display size of the input after cropping."""
+        if self.crop_box:
+            return self.crop_box[0], self.crop_box[1]
+        return info.width, info.height
+
+    def plan_output_size(self, info, video_bitrate_kbps, report=True):
+        """Output resolution for an encode (see utils.resolution.plan_output_size())."""
+        # Newer codecs reach the same quality with fewer bits per pixel, and so does screen content
+        min_bits_per_pixel = resolution.MIN_BITS_PER_PIXEL * self.backend.efficiency
+        if self.is_screen():
+            min_bits_per_pixel *= SCREEN_BPP_FACTOR
+        return resolution.plan_output_size(self.frame_size(info),
+                                           self.plan_fps_cap(info) or info.fps,
+                                           video_bitrate_kbps, min_bits_per_pixel,
+                                           self.max_height, self.auto_downscale, report)
+
+    def predict_output(self, input_path, info, video_bitrate_kbps, preset, threads,
+                       output_size=None, fps_cap=None):
+        """
+        Encode a few short samples at the planned settings to predict the full encode.
+        
+        Returns:
+            SizePrediction, or None for short inputs or when sampling failed
+        """
+        def build_sample(start, seconds, sample_path):
+            return self.build_ffmpeg_command(input_path, sample_path, video_bitrate_kbps, 0,
+                                             preset=preset, threads=threads,
+                                             output_size=output_size, fps_cap=fps_cap,
+                                             source_fps=info.fps, audio_plan=AudioPlan("none"),
+                                             seek=(start, seconds))
+        return predictor.predict_output(build_sample, info.duration, video_bitrate_kbps,
+                                        cancel_token=self.cancel_token,
+                                        watchdog_factory=lambda: StallWatchdog(self.stall_timeout))
+
+    def probe(self, input_path):
+        """
+        Return MediaInfo for an input, served from the probe cache when the file is unchanged.
+        
+        Scratch files (cuts, chunks) are probed directly and never cached.
+        """
+        use_cache = self.probe_cache is not None and not segments.is_scratch_path(input_path)
+        if use_cache:
+            info = self.probe_cache.get(input_path)
+            if info is not None:
+                return info
+        info = probe_media(input_path)
+        if info is not None and use_cache:
+            self.probe_cache.put(info)
+        return info
+
+    def try_passthrough(self, input_path, output_path, info):
+        """
+        Skip the encode entirely when the input already fits the target.
+        
+        See utils.passthrough.try_passthrough().
+        
+        Returns:
+            True if the output was produced without encoding, False to fall back to an encode
+        """
+        return passthrough.try_passthrough(self, input_path, output_path, info)
+
+    def encode_with_ffmpeg(self, input_path, output_path, video_bitrate_kbps, audio_plan, preset,
+                           threads=4, output_size=None, fps_cap=None, source_fps=None):
+        """Encode in a single ffmpeg process. Returns True if ffmpeg exited cleanly."""
+        if self.rate_control == RATE_TWO_PASS:
+            return passlog.encode_two_pass(self, input_path, output_path, video_bitrate_kbps,
+                                           audio_plan, preset, threads, output_size, fps_cap,
+                                           source_fps)
+        cmd = self.build_ffmpeg_command(input_path, output_path, video_bitrate_kbps,
+                                        audio_plan.bitrate_kbps, preset=preset, threads=threads,
+                                        output_size=output_size, fps_cap=fps_cap,
+                                        source_fps=source_fps, audio_plan=audio_plan)
+        return self.run_ffmpeg_step(cmd, input_path, self.progress.step("encode"))
+
+    def should_segment(self, duration, cpu_budget):
+        """Whether an input is long enough, and the job has enough cores, for a split encode."""
+        return (self.segmented and self.engine == ENGINE_FFMPEG
+                and self.rate_control != RATE_TWO_PASS
+                and duration >= MIN_SEGMENTED_DURATION and cpu_budget >= 2)
+
+    def plan_complexity(self, input_path, info, scratch_dir):
+        """
+        Complexity curve for a split encode (see utils.complexity.plan_complexity()).
+        
+        Returns:
+            ComplexityCurve, or None when allocation is off or the scan failed
+        """
+        if not self.allocate_bitrate:
+            return None
+        return complexity.plan_complexity(input_path, info, scratch_dir, self.cancel_token,
+                                          self.probe_cache)
+
+    def is_cancelled(self):
+        return self.cancel_token is not None and self.cancel_token.cancelled
+
+    def run_ffmpeg_step(self, cmd, input_path, on_progress=None):
+        """Run one ffmpeg command, reporting failures. Returns True on a clean exit."""
+        if self.is_cancelled():
+            return False
+        video_name = self.name_of(input_path)
+        start_time = time.time()
+        watchdog = StallWatchdog(self.stall_timeout)
+        try:
+            returncode, stderr_tail = run_ffmpeg(cmd, on_progress=on_progress,
+                                                 cancel_token=self.cancel_token, watchdog=watchdog)
+        except (OSError, subprocess.SubprocessError) as run_error:
+            returncode, stderr_tail = -1, str(run_error)
+        if self.is_cancelled():
+            return False  # Killed on purpose; compress_video reports the cancellation
+        if watchdog.stalled:
+            return self.report_stall(video_name, watchdog, time.time() - start_time)
+        if returncode != 0:
+            elapsed = time.time() - start_time
+            print(Fore.RED + f"⚠️ Error: {video_name} - ffmpeg failed after {elapsed:.0f}s "
+                             f"(exit code {returncode}):\n{stderr_tail}")
+            return False
+        return True
+
+    def report_stall(self, video_name, watchdog, elapsed):
+        """Report an encode the watchdog killed. Always returns False."""
+        self.timed_out = True
+        print(Fore.MAGENTA + f"⏱️ Timeout: {video_name} - encoder stalled ({watchdog.reason}), "
+                             f"stopped after {elapsed:.0f}s")
+        return False
+
+    def _encode_attempt(self, clip, input_path, output_path, info, video_bitrate_kbps, audio_plan,
+                        preset, threads, cpu_budget, output_size=None, fps_cap=None):
+        """Run one full encode with the configured engine. Returns True if it completed."""
+        written = None
+        if self.should_segment(info.duration, cpu_budget):
+            written = segments.encode_segmented(self, input_path, output_path, info,
+                                                video_bitrate_kbps, audio_plan, preset, cpu_budget,
+                                                output_size, fps_cap)
+        if written is None and self.engine == ENGINE_FFMPEG:
+            written = self.encode_with_ffmpeg(input_path, output_path, video_bitrate_kbps,
+                                              audio_plan, preset, threads, output_size, fps_cap,
+                                              info.fps)
+        elif written is None:
+            written = moviepy_engine.encode_with_moviepy(self, clip, input_path, output_path,
+                                                         video_bitrate_kbps, audio_plan, preset,
+                                                         threads, output_size, fps_cap)
+        return written
+
+    def rate_history_key(self, info, preset, output_size=None, fps_cap=None):
+        """RateHistory key of an encode of this input at the planned settings."""
+        height = output_size[1] if output_size else self.frame_size(info)[1]
+        kind = self.content_stats.kind if self.content_stats else None
+        return rate_profile(self.engine, self.rate_control, preset, info.video_codec, height,
+                            fps_cap or info.fps, encoder=self.backend.encoder, content=kind)
+
+    @property
+    def min_video_kbps(self):
+        """Lowest video bitrate this engine's encodes ask for (see MIN_VIDEO_KBPS)."""
+        return MIN_VIDEO_KBPS[self.engine]
+
+    def clamp_video_bitrate(self, video_bitrate_kbps):
+        """Keep a calculated video bitrate within min_video_kbps..5000 kbps, warning if moved."""
+        if video_bitrate_kbps < self.min_video_kbps:
+            print(Fore.YELLOW + f"⚠️ Warning: Calculated bitrate too low, using minimum "
+                                f"{self.min_video_kbps} kbps")
+            return self.min_video_kbps
+        # Ensure maximum reasonable bitrate (prevent huge files)
+        max_bitrate_kbps = 5000
+        if video_bitrate_kbps > max_bitrate_kbps:
+            print(Fore.YELLOW + f"⚠️ Warning: Calculated bitrate too high, capping at "
+                                f"{max_bitrate_kbps} kbps")
+            return max_bitrate_kbps
+        return video_bitrate_kbps
+
+    @staticmethod
+    def discard_partial_output(output_path, output_before):
+        """Remove what an interrupted encode wrote, but never an older output it did not touch."""
+        try:
+            stat = os.stat(output_path)
+            if output_before is None or (stat.st_mtime_ns, stat.st_size) != output_before:
+                os.remove(output_path)
+        except OSError:
+            pass
+
+    def begin_file(self, cancel_token=None):
+        """Reset the state of the previous file before compressing the next one."""
+        self.cancel_token = cancel_token
+        self.timed_out = False
+        self.crop_box = None
+        self.content_stats = None
+        self.last_status = STATUS_FAILED
+
+    def track_progress(self, progress_callback, duration, max_processing_time, video_name):
+        """Start the progress reporting of a file, warning when it will not fit its time budget."""
+        self.progress = ProgressTracker(
+            progress_callback, duration, budget_seconds=max_processing_time,
+            on_overrun=lambda predicted: print(
+                Fore.YELLOW + f"⚠️ Warning: {video_name} is predicted to take "
+                              f"{predicted / 60:.1f} min, over the "
+                              f"{max_processing_time / 60:.1f} min budget")
+        )
+
+    @staticmethod
+    def check_duration(duration, video_name):
+        """Report an input whose duration is missing or too short. Returns True if it is usable."""
+        if duration is None:
+            print(Fore.RED + f"⚠️ Error: {video_name} has no duration (None). Skipping.")
+            return False
+        if duration <= 0:
+            print(Fore.RED + f"⚠️ Error: {video_name} has invalid duration ({duration} seconds). "
+                             f"Skipping.")
+            return False
+        if duration < 0.1:  # Less than 100ms
+            print(Fore.RED + f"⚠️ Error: {video_name} is too short ({duration:.2f} seconds). "
+                             f"Minimum 0.1 seconds required.")
+            return False
+        return True
+
+    def plan_encode(self, input_path, output_path, info, fps_cap=None, levels=None, report=True):
+        """
+        Split the target size into audio and video bitrates and pick the output size.
+        
+        Args:
+            input_path: Path to input video
+            output_path: Output path
+            info: MediaInfo of the input
+            fps_cap: Output frame rate (see plan_fps_cap())
+            levels: Audio levels when the input was already scanned, None to scan it
+            report: Print the plan (off when the caller reports several targets itself)
+            
+        Returns:
+            EncodePlan
+        """
+        # Formula: bitrate (kbps) = (target_size_mb * 8 * 1024) / duration (seconds)
+        # Audio takes what its plan needs (nothing for silent files); video gets the rest
+        target_size_bits = self.target_size_mb * 8 * 1024 * 1024  # Convert MB to bits
+        total_kbps = int(target_size_bits * (1 - SIZE_MARGIN) / info.duration / 1000)
+        if levels is None and info.audio_streams:
+            levels = scan_audio_levels(input_path, info)
+        output_ext = os.path.splitext(output_path)[1]
+        audio_plan = plan_audio(info, total_kbps, output_ext, levels,
+                                audio_codec=self.backend.audio_codec(output_ext))
+        video_bitrate_kbps = self.clamp_video_bitrate(total_kbps - audio_plan.bitrate_kbps)
+        if report:
+            print(Fore.CYAN + f"🔊 Audio: {audio_plan.describe()}")
+            if self.rate_control == RATE_QUALITY:
+                rate_text = (f"{self.backend.label} CRF {self.backend.crf}, "
+                             f"capped at {video_bitrate_kbps}k")
+            else:
+                rate_text = f"Calculated bitrate: {video_bitrate_kbps}k {self.backend.label}"
+            print(Fore.CYAN + f"📊 Video duration: {info.duration:.2f}s | "
+                              f"Target: {self.target_size_mb}MB | {rate_text} "
+                              f"(+{audio_plan.bitrate_kbps}k audio)")
+        output_size = self.plan_output_size(info, video_bitrate_kbps, report)
+        return EncodePlan(output_path, total_kbps, audio_plan, video_bitrate_kbps, output_size,
+                          fps_cap)
+
+    def correct_plan(self, plan, input_path, info, preset, threads):
+        """
+        Correct the planned bitrate before the long encode.
+        
+        Sample encodes of this input are used when size prediction applies
+        (ABR), otherwise how similar files came out (rate history).
+        
+        Args:
+            plan: EncodePlan to correct in place
+            input_path: Path to input video
+            info: MediaInfo of the input
+            preset: FFmpeg preset
+            threads: Encoder threads of the samples
+        """
+        prediction = None
+        if self.predict_size and self.rate_control == RATE_ABR:
+            prediction = self.predict_output(input_path, info, plan.video_kbps, preset, threads,
+                                             plan.output_size, plan.fps_cap)
+        if prediction is not None:
+            corrected_kbps = prediction.corrected_kbps(plan.video_kbps, self.min_video_kbps)
+            plan.expect(prediction, corrected_kbps, info.duration)
+            print(Fore.CYAN + f"🔮 Samples: encoder runs at {prediction.ratio:.2f}x the "
+                              f"requested bitrate on this content "
+                              f"({prediction.sampled_seconds:.0f}s sampled in "
+                              f"{prediction.wall_seconds:.1f}s)")
+            if corrected_kbps != plan.video_kbps:
+                if prediction.needs_replan:
+                    print(Fore.YELLOW + f"🎯 Re-planned for content this hard to compress: "
+                                        f"{plan.video_kbps}k → {corrected_kbps}k")
+                else:
+                    print(Fore.CYAN + f"🎯 Bitrate corrected: {plan.video_kbps}k → "
+                                      f"{corrected_kbps}k")
+                plan.video_kbps = corrected_kbps
+                plan.output_size = self.plan_output_size(info, corrected_kbps)
+            print(Fore.CYAN + f"🔮 Predicted: {plan.predicted_mb:.2f} MB, "
+                              f"encode ~{plan.predicted_seconds / 60:.1f} min")
+        elif self.rate_history is not None and self.rate_control != RATE_QUALITY:
+            # No samples for this file: start from how similar files came out
+            ratio = self.rate_history.estimate(
+                self.rate_history_key(info, preset, plan.output_size, plan.fps_cap))
+            corrected_kbps = plan.video_kbps
+            if ratio:
+                corrected_kbps = predictor.correct_bitrate(plan.video_kbps, ratio)
+            if corrected_kbps != plan.video_kbps:
+                print(Fore.CYAN + f"📚 Bitrate corrected from earlier encodes ({ratio:.2f}x): "
+                                  f"{plan.video_kbps}k → {corrected_kbps}k")
+                plan.video_kbps = corrected_kbps
+                plan.output_size = self.plan_output_size(info, corrected_kbps)
+
+    def encode_until_fits(self, input_path, info, plan, preset, threads, cpu_budget):
+        """
+        Measure an encoded output and re-encode it at a corrected bitrate while it overshoots.
+        
+        Every attempt is recorded in the rate history. Retries write next to
+        the output and only replace it (atomically) when they are smaller.
+        
+        Args:
+            input_path: Path to input video
+            info: MediaInfo of the input
+            plan: EncodePlan the output at plan.output_path was encoded with
+            preset: FFmpeg preset
+            threads: Encoder threads
+            cpu_budget: Cores a split re-encode may use
+            
+        Returns:
+            (size in MB, attempts) of the kept output, or None if a retry was cancelled
+        """
+        duration = info.duration
+        root, ext = os.path.splitext(plan.output_path)
+        video_bitrate_kbps, output_size = plan.video_kbps, plan.output_size
+        attempt_path = plan.output_path
+        best_size_mb = None
+        attempt = 1
+        while True:
+            size_mb = os.path.getsize(attempt_path) / (1024 * 1024)
+            actual_kbps = (size_mb * 1024 * 1024 * 8 / duration / 1000
+                           - plan.audio_plan.bitrate_kbps)
+            # Quality mode undershoots by design; its ratios say nothing about overshoot
+            if (self.rate_history is not None and actual_kbps > 0
+                    and self.rate_control != RATE_QUALITY):
+                self.rate_history.record(
+                    self.rate_history_key(info, preset, output_size, plan.fps_cap),
+                    video_bitrate_kbps, actual_kbps)
+            if best_size_mb is None:
+                best_size_mb = size_mb
+            elif size_mb < best_size_mb:
+                os.replace(attempt_path, plan.output_path)
+                best_size_mb = size_mb
+            else:
+                self.discard_partial_output(attempt_path, None)
+            
+            if best_size_mb <= self.target_size_mb * SIZE_TOLERANCE or attempt >= self.max_attempts:
+                break
+            retarget_kbps = plan.retarget_kbps(video_bitrate_kbps, actual_kbps,
+                                               self.min_video_kbps)
+            if retarget_kbps is None:
+                break
+            attempt += 1
+            print(Fore.YELLOW + f"🔁 {self.name_of(input_path)} is {size_mb:.2f} MB "
+                                f"(target {self.target_size_mb} MB), attempt "
+                                f"{attempt}/{self.max_attempts} at {retarget_kbps}k "
+                                f"(was {video_bitrate_kbps}k)")
+            video_bitrate_kbps = retarget_kbps
+            output_size = self.plan_output_size(info, video_bitrate_kbps)
+            self.progress.reset()
+            attempt_path = f"{root}.retry{attempt}{ext}"
+            clip = None
+            if self.engine == ENGINE_MOVIEPY:
+                clip = VideoFileClip(input_path, audio=False)
+            try:
+                written = self._encode_attempt(clip, input_path, attempt_path, info,
+                                               video_bitrate_kbps, plan.audio_plan, preset,
+                                               threads, cpu_budget, output_size, plan.fps_cap)
+            finally:
+                if clip is not None:
+                    clip.close()
+            if self.is_cancelled():
+                self.discard_partial_output(attempt_path, None)
+                return None
+            if self.timed_out or not written or not os.path.exists(attempt_path):
+                # The first output is complete; a failed retry only means it stays
+                self.timed_out = False
+                self.discard_partial_output(attempt_path, None)
+                break
+        return best_size_mb, attempt
+
+    def _report_cancelled(self, video_name, output_path, output_before):
+        """Remove what a cancelled encode wrote and report the cancellation."""
+        self.discard_partial_output(output_path, output_before)
+        self.last_status = STATUS_CANCELLED
+        print(Fore.YELLOW + f"🚫 Cancelled: {video_name}")
+
+    def compress_video(self, input_path, output_path, progress_callback=None,
+                       max_processing_time=None, preset="medium", threads=None, cpu_budget=None,
+                       cancel_token=None, trim=None):
+        """
+        Compress video with calculated bitrate to achieve target size.
+        
+        Uses MoviePy or a direct ffmpeg process depending on ``self.engine``.
+        
+        Args:
+            input_path: Path to input video
+            output_path: Path to save compressed video
+            progress_callback: Optional callable receiving throttled progress dicts
+                (percent, out_time, fps, speed, total_size, eta, over_budget, stage) while encoding
+            max_processing_time: Optional time budget in seconds; encodes whose measured speed
+                predicts a later finish are flagged early (they are only stopped if they stall)
+            preset: FFmpeg preset (e.g. 'medium', 'faster', 'veryfast')
+            threads: Encoder threads (planned from resolution, duration and core count if None)
+            cpu_budget: Cores this job may use for a segmented encode (all cores if None)
+            cancel_token: Optional CancellationToken; the running encoder is killed and
+                the partial output deleted as soon as it is cancelled
+            trim: Optional (start, end) in seconds (end None for the end of the file); only
+                that range is cut out (see utils.trim.cut_range()) and compressed, with the bitrate
+                planned for its length
             
         Returns:
             True if successful, False otherwise
         """
-        video_name = os.path.basename(input_path)
+        if trim is not None:
+            return trimming.compress_range(self, input_path, trim, cancel_token, lambda cut_path: (
+                self.compress_video(cut_path, output_path, progress_callback,
+                                    max_processing_time, preset, threads, cpu_budget,
+                                    cancel_token)))
+        video_name = self.name_of(input_path)
         print(Fore.CYAN + f"\n🎬 Compressing: {video_name}")
+        self.begin_file(cancel_token)
         
         clip = None
         try:
@@ -72,153 +776,153 @@ class VideoCompressor:
             # Try to get file size - if it's 0 or very small, it's likely invalid
             file_size = os.path.getsize(input_path)
             if file_size < 1024:  # Less than 1KB is suspicious
-                print(Fore.RED + f"⚠️ Error: {video_name} - File too small ({file_size} bytes). Likely invalid video.")
+                print(Fore.RED + f"⚠️ Error: {video_name} - File too small ({file_size} bytes). "
+                                 f"Likely invalid video.")
                 return False
             
-            # Try to load the video clip with timeout
+            # An output hardlinked from the result cache must not be overwritten in place
+            if os.path.isfile(output_path) and os.stat(output_path).st_nlink > 1:
+                os.remove(output_path)
+            try:
+                output_stat = os.stat(output_path)
+                output_before = (output_stat.st_mtime_ns, output_stat.st_size)
+            except OSError:
+                output_before = None
+            
+            # Probe once: duration, streams, codecs, resolution, fps, rotation and keyframe hints.
+            # Every later decision reads from this instead of re-opening the file.
             # For browser downloads, sometimes metadata is missing but video is valid
-            duration = None
             clip = None
-            
-            # First, try to get duration using ffprobe (more reliable for browser downloads)
-            try:
-                result = subprocess.run(
-                    ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', 
-                     '-of', 'default=noprint_wrappers=1:nokey=1', input_path],
-                    capture_output=True,
-                    text=True,
-                    timeout=10  # 10 second timeout
-                )
-                if result.returncode == 0 and result.stdout.strip():
-                    duration = float(result.stdout.strip())
-                    print(Fore.CYAN + f"📹 Got duration from ffprobe: {duration:.2f}s")
-            except (subprocess.TimeoutExpired, ValueError, FileNotFoundError, subprocess.SubprocessError) as e:
-                print(Fore.YELLOW + f"⚠️ Could not get duration from ffprobe: {e}. Trying MoviePy...")
-            
-            # If ffprobe failed, try MoviePy
-            if duration is None:
+            info = self.probe(input_path)
+            if info is not None and info.duration:
+                print(Fore.CYAN + f"📹 Probed with {info.source}: {info.duration:.2f}s | "
+                                  f"{info.width}x{info.height} @ {info.fps or 0:.0f} fps | "
+                                  f"video: {info.video_codec} | "
+                                  f"audio: {info.audio_codec or 'none'}")
+            else:
+                print(Fore.YELLOW + f"⚠️ Could not probe {video_name} with ffprobe/ffmpeg. "
+                                    "Trying MoviePy...")
                 try:
                     clip = VideoFileClip(input_path)
-                    duration = clip.duration
+                    info = MediaInfo.from_clip(input_path, clip, size_bytes=file_size)
                 except Exception as load_error:
-                    print(Fore.RED + f"⚠️ Error: {video_name} - Cannot load video file: {load_error}")
+                    print(Fore.RED + f"⚠️ Error: {video_name} - Cannot load video file: "
+                                     f"{load_error}")
                     return False
+            duration = info.duration
+            self.track_progress(progress_callback, duration, max_processing_time, video_name)
             
             # Validate duration
-            if duration is None:
-                print(Fore.RED + f"⚠️ Error: {video_name} has no duration (None). Skipping.")
-                if clip:
-                    clip.close()
+            if not self.check_duration(duration, video_name):
                 return False
             
-            if duration <= 0:
-                print(Fore.RED + f"⚠️ Error: {video_name} has invalid duration ({duration} seconds). Skipping.")
-                if clip:
-                    clip.close()
-                return False
-            
-            if duration < 0.1:  # Less than 100ms
-                print(Fore.RED + f"⚠️ Error: {video_name} is too short ({duration:.2f} seconds). Minimum 0.1 seconds required.")
-                if clip:
-                    clip.close()
-                return False
-            
-            # Calculate expected processing time based on video duration
-            # Processing typically takes 1.5-2x the video duration, plus overhead
-            # For compression: encoding is CPU-intensive, so longer videos take proportionally longer
-            processing_factor = 2.0  # Processing takes roughly 2x the video duration
-            overhead_seconds = 60    # Fixed overhead for setup, file I/O, etc.
-            expected_processing_time = (duration * processing_factor) + overhead_seconds
-            
-            # Add buffer time (2 minutes = 120 seconds) to allow for variations
-            buffer_seconds = 120
-            max_allowed_time = expected_processing_time + buffer_seconds
-            
-            # Cap maximum at 15 minutes (900 seconds) to prevent extremely long waits
-            absolute_max_time = 900
-            if max_allowed_time > absolute_max_time:
-                max_allowed_time = absolute_max_time
-            
+            # No fixed timeout: the watchdog only stops encodes that stop making progress,
+            # so slow presets and long files run to completion however long they take
             duration_minutes = duration / 60
-            expected_minutes = expected_processing_time / 60
-            max_minutes = max_allowed_time / 60
+            budget_text = ""
+            if max_processing_time:
+                budget_text = f" | Budget: {max_processing_time / 60:.1f} minutes"
             
             # Enhanced logging with colors and formatting
             print(Fore.CYAN + "═" * 80)
-            print(Fore.CYAN + f"📹 Video duration: {duration_minutes:.1f} minutes ({duration:.1f} seconds)")
-            print(Fore.CYAN + f"⏱️ Expected processing: {expected_minutes:.1f} minutes | Max allowed: {max_minutes:.1f} minutes (with {buffer_seconds/60:.1f} min buffer)")
+            print(Fore.CYAN + f"📹 Video duration: {duration_minutes:.1f} minutes "
+                              f"({duration:.1f} seconds)")
+            print(Fore.CYAN + f"⏱️ Stall timeout: {self.stall_timeout:.0f}s without progress"
+                              f"{budget_text}")
             print(Fore.CYAN + "─" * 80)
             
-            # Use provided max_processing_time or calculated one
-            if max_processing_time is None:
-                max_processing_time = max_allowed_time
+            # Black bars and dead canvas cost bits and encode time; the resolution plan works on
+            # what is left
+            self.plan_crop(input_path, info)
+            # Screen recordings get their own tune, GOP length and frame rate ceiling
+            self.plan_content(input_path, info)
+            
+            # Inputs that already fit, and whose frames would not change, need no encode at all
+            if self.try_passthrough(input_path, output_path, info):
+                self.last_status = STATUS_DONE
+                return True
             
-            # If we got duration from ffprobe but don't have clip yet, load it now
-            if clip is None:
+            # The ffmpeg engine never needs the clip; release it if the fallback opened one
+            if self.engine == ENGINE_FFMPEG and clip is not None:
+                clip.close()
+                clip = None
+            
+            # If we got metadata from the probe but don't have clip yet, load it now
+            if clip is None and self.engine == ENGINE_MOVIEPY:
                 try:
-                    clip = VideoFileClip(input_path)
+                    # The writer reads audio from the file itself
+                    clip = VideoFileClip(input_path, audio=False)
                 except Exception as load_error:
-                    print(Fore.RED + f"⚠️ Error: {video_name} - Cannot load video file: {load_error}")
+                    print(Fore.RED + f"⚠️ Error: {video_name} - Cannot load video file: "
+                                     f"{load_error}")
                     return False
             
-            # Calculate bitrate needed to achieve target size
-            # Formula: bitrate (kbps) = (target_size_mb * 8 * 1024) / duration (seconds)
-            # We reserve ~10% for audio, so video gets ~90%
-            target_size_bits = self.target_size_mb * 8 * 1024 * 1024  # Convert MB to bits
-            video_bitrate_bps = (target_size_bits * 0.9) / duration  # 90% for video
-            video_bitrate_kbps = int(video_bitrate_bps / 1000)
+            fps_cap = self.plan_fps_cap(info)
+            plan = self.plan_encode(input_path, output_path, info, fps_cap)
+            if fps_cap or self.drop_duplicates:
+                frames = [f"capped at {fps_cap:g} fps (source {info.fps:.0f} fps)"
+                          if fps_cap else None,
+                          "near-duplicate frames dropped (variable frame rate)"
+                          if self.drop_duplicates else None]
+                print(Fore.CYAN + "🎞️ Frame rate: " + ", ".join(f for f in frames if f))
+            output_height = (plan.output_size or self.frame_size(info))[1]
             
-            # Audio bitrate (typically 128 kbps is good quality)
-            audio_bitrate_kbps = 128
-            
-            # Ensure minimum bitrate for quality (at least 400 kbps for video)
-            if video_bitrate_kbps < 400:
-                video_bitrate_kbps = 400
-                print(Fore.YELLOW + f"⚠️ Warning: Calculated bitrate too low, using minimum 400 kbps")
-            
-            # Ensure maximum reasonable bitrate (prevent huge files)
-            max_bitrate_kbps = 5000
-            if video_bitrate_kbps > max_bitrate_kbps:
-                video_bitrate_kbps = max_bitrate_kbps
-                print(Fore.YELLOW + f"⚠️ Warning: Calculated bitrate too high, capping at {max_bitrate_kbps} kbps")
+            if threads is None:
+                threads = plan_threads(output_height, duration)
+                print(Fore.CYAN + f"🧵 Encoder threads: {threads} (planned for "
+                                  f"{output_height or 'unknown'}p on {os.cpu_count() or 1} cores)")
+            else:
+                print(Fore.CYAN + f"🧵 Encoder threads: {threads}")
             
-            print(Fore.CYAN + f"📊 Video duration: {duration:.2f}s | Target: {self.target_size_mb}MB | Calculated bitrate: {video_bitrate_kbps}k")
+            # Sample the content before committing to the long encode
+            self.correct_plan(plan, input_path, info, preset, threads)
             print(Fore.CYAN + "─" * 80)
             
-            # Write video file (timeout is handled at thread level in app.py)
-            start_time = time.time()
-            try:
-                clip.write_videofile(
-                    output_path,
-                    codec="libx264",
-                    audio_codec="aac",
-                    bitrate=f"{video_bitrate_kbps}k",
-                    audio_bitrate=f"{audio_bitrate_kbps}k",
-                    threads=4,
-                    preset=preset,  # Use user-selected preset
-                    verbose=False,  # Suppress moviepy output
-                    logger=None
-                )
-            except Exception as write_error:
-                elapsed = time.time() - start_time
-                print(Fore.RED + f"⚠️ Error: {video_name} - Write failed after {elapsed:.0f}s: {write_error}")
-                if clip:
-                    clip.close()
+            # Encode, and re-encode at a corrected bitrate while the output overshoots the target
+            cpu_budget = cpu_budget or os.cpu_count() or 1
+            encode_start = time.time()
+            if clip is None and self.engine == ENGINE_MOVIEPY:
+                clip = VideoFileClip(input_path, audio=False)
+            written = self._encode_attempt(clip, input_path, output_path, info, plan.video_kbps,
+                                           plan.audio_plan, preset, threads, cpu_budget,
+                                           plan.output_size, fps_cap)
+            if clip is not None:
+                clip.close()
+                clip = None
+            if self.is_cancelled():
+                self._report_cancelled(video_name, output_path, output_before)
+                return False
+            if self.timed_out:
+                self.discard_partial_output(output_path, output_before)
+                self.last_status = STATUS_TIMEOUT
+                return False
+            if not written:
                 return False
-            
-            clip.close()
-
             # Check final size
             if not os.path.exists(output_path):
                 print(Fore.RED + f"⚠️ Error: Output file was not created")
                 return False
-                
-            final_size_mb = os.path.getsize(output_path) / (1024 * 1024)
-            if final_size_mb > self.target_size_mb * 1.1:  # Allow 10% tolerance
-                print(Fore.YELLOW + f"⚠️ Warning: {video_name} is {final_size_mb:.2f} MB (target was {self.target_size_mb} MB)")
+            if plan.prediction is not None:
+                size_mb = os.path.getsize(output_path) / (1024 * 1024)
+                elapsed_minutes = (time.time() - encode_start) / 60
+                print(Fore.CYAN + f"📏 Actual vs predicted: {size_mb:.2f} / "
+                                  f"{plan.predicted_mb:.2f} MB, {elapsed_minutes:.1f} / "
+                                  f"{plan.predicted_seconds / 60:.1f} min")
+            kept = self.encode_until_fits(input_path, info, plan, preset, threads, cpu_budget)
+            if kept is None:
+                self._report_cancelled(video_name, output_path, output_before)
+                return False
+            best_size_mb, attempt = kept
+            
+            retries = f" after {attempt} attempts" if attempt > 1 else ""
+            if best_size_mb > self.target_size_mb * SIZE_TOLERANCE:
+                print(Fore.YELLOW + f"⚠️ Warning: {video_name} is {best_size_mb:.2f} MB "
+                                    f"(target was {self.target_size_mb} MB){retries}")
             else:
-                print(Fore.GREEN + f"✅ Done: {video_name} ({final_size_mb:.2f} MB / {self.target_size_mb} MB target)")
+                print(Fore.GREEN + f"✅ Done: {video_name} ({best_size_mb:.2f} MB / "
+                                   f"{self.target_size_mb} MB target){retries}")
 
+            self.last_status = STATUS_DONE
             return True
 
         except Exception as e:
@@ -239,3 +943,47 @@ class VideoCompressor:
                     clip.close()
                 except:
                     pass
+
+    def for_target(self, target):
+        """
+        A compressor with this one's settings, writing one OutputTarget.
+        
+        It shares the state of the file being compressed (crop, content,
+        progress, cancel token), so the child can encode its target of that file.
+        
+        Args:
+            target: OutputTarget; its size replaces target_size_mb, its codec and
+                height (when set) replace the codec and the resolution limit
+            
+        Returns:
+            VideoCompressor
+        """
+        child = VideoCompressor(
+            target_size_mb=target.size_mb, safe_bitrate_kbps=self.safe_bitrate_kbps,
+            engine=self.engine, rate_control=self.rate_control,
+            allow_passthrough=self.allow_passthrough, probe_cache=self.probe_cache,
+            segmented=self.segmented, stall_timeout=self.stall_timeout,
+            auto_downscale=self.auto_downscale, drop_duplicates=self.drop_duplicates,
+            max_fps=self.max_fps, predict_size=self.predict_size, rate_history=self.rate_history,
+            max_attempts=self.max_attempts, codec=target.codec or self.backend.name,
+            auto_crop=self.auto_crop, content_tuning=self.content_tuning,
+            allocate_bitrate=self.allocate_bitrate, max_height=target.height or self.max_height)
+        child.display_name = self.display_name
+        child.crop_box, child.content_stats = self.crop_box, self.content_stats
+        child.progress, child.cancel_token = self.progress, self.cancel_token
+        return child
+
+    def compress_targets(self, input_path, outputs, progress_callback=None, preset="medium",
+                         threads=None, cpu_budget=None, cancel_token=None, trim=None,
+                         max_processing_time=None):
+        """
+        Compress one input to several OutputTargets, from a single decode where possible.
+        
+        See utils.targets.compress_targets() for the arguments and fallbacks.
+        
+        Returns:
+            True if every output was written, False otherwise (see last_status)
+        """
+        return targets.compress_targets(self, input_path, outputs, progress_callback, preset,
+                                        threads, cpu_budget, cancel_token, trim,
+                                        max_processing_time)
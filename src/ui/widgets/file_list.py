@@ -3,19 +3,24 @@ import customtkinter as ctk
 from tkinter import filedialog
 import shutil
 import threading
+import queue
 try:
     import gdown
 except ImportError:
     gdown = None
 
 class FileList(ctk.CTkFrame):
-    def __init__(self, master, theme_manager, on_queue_change, on_drive_import, **kwargs):
+    def __init__(self, master, theme_manager, on_queue_change, on_drive_import, probe_cache=None,
+                 **kwargs):
         super().__init__(master, fg_color="transparent", **kwargs)
         self.theme_manager = theme_manager
         self.on_queue_change = on_queue_change # Callback when queue changes
         self.on_drive_import = on_drive_import # Callback for drive import (starts thread in App)
+        self.probe_cache = probe_cache # Optional ProbeCache for queue-time metadata
         
         self.queue_files = [] # List of dicts
+        self._probe_queue = queue.Queue()
+        self._probe_thread = None
         
         self.grid_columnconfigure(0, weight=1)
         self.grid_columnconfigure(1, weight=1)
@@ -145,8 +150,45 @@ class FileList(ctk.CTkFrame):
             'frame': row,
             'status_label': lbl_status,
             'name_label': lbl_name,
-            'size_label': lbl_size
+            'size_label': lbl_size,
+            'size_text': size_text
         })
+        self._request_metadata(f)
+
+    # --- Queue-time metadata (served from the probe cache, probed in background otherwise) ---
+
+    def _request_metadata(self, path):
+        if self.probe_cache is None:
+            return
+        self._probe_queue.put(path)
+        if self._probe_thread is None:
+            self._probe_thread = threading.Thread(target=self._metadata_worker, daemon=True)
+            self._probe_thread.start()
+
+    def _metadata_worker(self):
+        while True:
+            path = self._probe_queue.get()
+            try:
+                info = self.probe_cache.probe(path)
+            except Exception:
+                info = None
+            if info is not None:
+                self.after(0, lambda p=path, i=info: self._show_metadata(p, i))
+
+    def _show_metadata(self, path, info):
+        parts = []
+        if info.duration:
+            minutes, seconds = divmod(int(round(info.duration)), 60)
+            parts.append(f"{minutes}:{seconds:02d}")
+        if info.width and info.height:
+            parts.append(f"{info.width}x{info.height}")
+        if info.video_codec:
+            parts.append(info.video_codec)
+        for item in self.queue_files:
+            if item['path'] == path:
+                try:
+                    item['size_label'].configure(text="  •  ".join([item['size_text']] + parts))
+                except: pass
 
     def remove_file(self, path, frame):
         frame.destroy()
@@ -2,10 +2,13 @@ import customtkinter as ctk
 from tkinter import filedialog
 import os
 
+from utils.watchdog import DEFAULT_STALL_SECONDS
+
 class SettingsPanel(ctk.CTkFrame):
-    def __init__(self, master, theme_manager, **kwargs):
+    def __init__(self, master, theme_manager, codecs=None, **kwargs):
         super().__init__(master, fg_color="transparent", **kwargs)
         self.theme_manager = theme_manager
+        self.codecs = codecs or ["H.264"]  # Only what the local ffmpeg can encode
         self.output_folder = None
         
         self.grid_columnconfigure(0, weight=1)
@@ -13,16 +16,28 @@ class SettingsPanel(ctk.CTkFrame):
         self.inner = ctk.CTkFrame(self, fg_color="transparent")
         self.inner.pack(anchor="center")
 
-        # Target Size
-        self.label_target = ctk.CTkLabel(self.inner, text="Target Size (MB)", text_color=self.theme_manager.colors["text_scd"], font=("Roboto", 14))
+        # Target Size (several sizes, e.g. "10, 25, 50", are all encoded from one decode)
+        self.label_target = ctk.CTkLabel(
+            self.inner, text="Target Size(s) (MB)",
+            text_color=self.theme_manager.colors["text_scd"], font=("Roboto", 14)
+        )
         self.label_target.pack(side="left", padx=(0, 10))
         
         self.entry_size = ctk.CTkEntry(
-            self.inner, width=80, justify="center", fg_color=self.theme_manager.colors["entry_bg"],
+            self.inner, width=110, justify="center", fg_color=self.theme_manager.colors["entry_bg"],
             text_color=self.theme_manager.colors["text"], border_color=self.theme_manager.colors["text_scd"], border_width=2
         )
         self.entry_size.insert(0, "10")
-        self.entry_size.pack(side="left", padx=(0, 20))
+        self.entry_size.pack(side="left", padx=(0, 10))
+        
+        # The size is the total for the whole queue, shared out by length, resolution and complexity
+        self.check_budget = ctk.CTkCheckBox(
+            self.inner, text="Batch total", text_color=self.theme_manager.colors["text_scd"],
+            font=("Roboto", 14), fg_color=self.theme_manager.colors["accent"],
+            hover_color=self.theme_manager.colors["accent_hover"],
+            border_color=self.theme_manager.colors["text_scd"]
+        )
+        self.check_budget.pack(side="left", padx=(0, 20))
         
         # Suffix
         self.label_suffix = ctk.CTkLabel(self.inner, text="Suffix", text_color=self.theme_manager.colors["text_scd"], font=("Roboto", 14))
@@ -41,9 +56,12 @@ class SettingsPanel(ctk.CTkFrame):
         self.label_speed.pack(side="left", padx=(0, 10))
         
         self.seg_speed = ctk.CTkSegmentedButton(
-            self.inner, values=["Fast", "Balanced"], width=140, fg_color=self.theme_manager.colors["entry_bg"],
-            selected_color=self.theme_manager.colors["accent"], selected_hover_color=self.theme_manager.colors["accent_hover"],
-            unselected_color=self.theme_manager.colors["entry_bg"], unselected_hover_color=self.theme_manager.colors["btn_hover"],
+            self.inner, values=["Fast", "Balanced", "Two-Pass", "Quality"], width=280,
+            fg_color=self.theme_manager.colors["entry_bg"],
+            selected_color=self.theme_manager.colors["accent"],
+            selected_hover_color=self.theme_manager.colors["accent_hover"],
+            unselected_color=self.theme_manager.colors["entry_bg"],
+            unselected_hover_color=self.theme_manager.colors["btn_hover"],
             text_color=self.theme_manager.colors["text"], font=("Roboto", 13, "bold")
         )
         self.seg_speed.set("Fast")
@@ -51,12 +69,177 @@ class SettingsPanel(ctk.CTkFrame):
         
         # Output Folder
         self.btn_output_folder = ctk.CTkButton(
-            self.inner, text="Output Folder", command=self.select_output_folder, width=160, height=32,
-            fg_color=self.theme_manager.colors["accent"], text_color="#FFFFFF", hover_color=self.theme_manager.colors["accent_hover"],
+            self.inner, text="Output Folder", command=self.select_output_folder,
+            width=160, height=32,
+            fg_color=self.theme_manager.colors["accent"], text_color="#FFFFFF",
+            hover_color=self.theme_manager.colors["accent_hover"],
             font=("Roboto", 13, "bold"), corner_radius=8
         )
         self.btn_output_folder.pack(side="left")
         
+        # Second row: engine and parallelism
+        self.inner_advanced = ctk.CTkFrame(self, fg_color="transparent")
+        self.inner_advanced.pack(anchor="center", pady=(10, 0))
+        
+        # Engine
+        self.label_engine = ctk.CTkLabel(
+            self.inner_advanced, text="Engine", text_color=self.theme_manager.colors["text_scd"],
+            font=("Roboto", 14)
+        )
+        self.label_engine.pack(side="left", padx=(0, 10))
+        
+        self.seg_engine = ctk.CTkSegmentedButton(
+            self.inner_advanced, values=["FFmpeg", "MoviePy"], width=140,
+            fg_color=self.theme_manager.colors["entry_bg"],
+            selected_color=self.theme_manager.colors["accent"],
+            selected_hover_color=self.theme_manager.colors["accent_hover"],
+            unselected_color=self.theme_manager.colors["entry_bg"],
+            unselected_hover_color=self.theme_manager.colors["btn_hover"],
+            text_color=self.theme_manager.colors["text"], font=("Roboto", 13, "bold")
+        )
+        self.seg_engine.set("FFmpeg")
+        self.seg_engine.pack(side="left", padx=(0, 20))
+        
+        # Workers
+        self.label_workers = ctk.CTkLabel(
+            self.inner_advanced, text="Workers", text_color=self.theme_manager.colors["text_scd"],
+            font=("Roboto", 14)
+        )
+        self.label_workers.pack(side="left", padx=(0, 10))
+        
+        self.entry_workers = ctk.CTkEntry(
+            self.inner_advanced, width=70, justify="center",
+            fg_color=self.theme_manager.colors["entry_bg"],
+            text_color=self.theme_manager.colors["text"],
+            border_color=self.theme_manager.colors["text_scd"], border_width=2,
+            placeholder_text="Auto", font=("Roboto", 13)
+        )
+        self.entry_workers.insert(0, "Auto")
+        self.entry_workers.pack(side="left", padx=(0, 20))
+        
+        # Seconds without encoder progress before a job is stopped as stalled
+        self.label_stall = ctk.CTkLabel(
+            self.inner_advanced, text="Stall (s)", text_color=self.theme_manager.colors["text_scd"],
+            font=("Roboto", 14)
+        )
+        self.label_stall.pack(side="left", padx=(0, 10))
+        
+        self.entry_stall = ctk.CTkEntry(
+            self.inner_advanced, width=70, justify="center",
+            fg_color=self.theme_manager.colors["entry_bg"],
+            text_color=self.theme_manager.colors["text"],
+            border_color=self.theme_manager.colors["text_scd"], border_width=2,
+            placeholder_text=str(DEFAULT_STALL_SECONDS), font=("Roboto", 13)
+        )
+        self.entry_stall.insert(0, str(DEFAULT_STALL_SECONDS))
+        self.entry_stall.pack(side="left", padx=(0, 20))
+        
+        # Segment-parallel encoding of long recordings
+        self.check_segmented = ctk.CTkCheckBox(
+            self.inner_advanced, text="Split long videos",
+            text_color=self.theme_manager.colors["text_scd"], font=("Roboto", 14),
+            fg_color=self.theme_manager.colors["accent"],
+            hover_color=self.theme_manager.colors["accent_hover"],
+            border_color=self.theme_manager.colors["text_scd"]
+        )
+        self.check_segmented.pack(side="left", padx=(0, 20))
+        
+        # Bits-per-pixel driven resolution ladder
+        self.check_downscale = ctk.CTkCheckBox(
+            self.inner_advanced, text="Auto resolution",
+            text_color=self.theme_manager.colors["text_scd"], font=("Roboto", 14),
+            fg_color=self.theme_manager.colors["accent"],
+            hover_color=self.theme_manager.colors["accent_hover"],
+            border_color=self.theme_manager.colors["text_scd"]
+        )
+        self.check_downscale.select()
+        self.check_downscale.pack(side="left")
+        
+        # Third row: codec and frame rate reduction for screen recordings
+        self.inner_frames = ctk.CTkFrame(self, fg_color="transparent")
+        self.inner_frames.pack(anchor="center", pady=(10, 0))
+        
+        self.label_codec = ctk.CTkLabel(
+            self.inner_frames, text="Codec", text_color=self.theme_manager.colors["text_scd"],
+            font=("Roboto", 14)
+        )
+        self.label_codec.pack(side="left", padx=(0, 10))
+        
+        self.seg_codec = ctk.CTkSegmentedButton(
+            self.inner_frames, values=self.codecs, width=70 * len(self.codecs),
+            fg_color=self.theme_manager.colors["entry_bg"],
+            selected_color=self.theme_manager.colors["accent"],
+            selected_hover_color=self.theme_manager.colors["accent_hover"],
+            unselected_color=self.theme_manager.colors["entry_bg"],
+            unselected_hover_color=self.theme_manager.colors["btn_hover"],
+            text_color=self.theme_manager.colors["text"], font=("Roboto", 13, "bold")
+        )
+        self.seg_codec.set(self.codecs[0])
+        self.seg_codec.pack(side="left", padx=(0, 20))
+        
+        self.label_max_fps = ctk.CTkLabel(
+            self.inner_frames, text="Max FPS", text_color=self.theme_manager.colors["text_scd"],
+            font=("Roboto", 14)
+        )
+        self.label_max_fps.pack(side="left", padx=(0, 10))
+        
+        self.entry_max_fps = ctk.CTkEntry(
+            self.inner_frames, width=70, justify="center",
+            fg_color=self.theme_manager.colors["entry_bg"],
+            text_color=self.theme_manager.colors["text"],
+            border_color=self.theme_manager.colors["text_scd"], border_width=2,
+            placeholder_text="Source", font=("Roboto", 13)
+        )
+        self.entry_max_fps.insert(0, "Source")
+        self.entry_max_fps.pack(side="left", padx=(0, 20))
+        
+        # Only compress a time range, e.g. "12:30-13:10" (empty for the whole file)
+        self.label_range = ctk.CTkLabel(
+            self.inner_frames, text="Range", text_color=self.theme_manager.colors["text_scd"],
+            font=("Roboto", 14)
+        )
+        self.label_range.pack(side="left", padx=(0, 10))
+        
+        self.entry_range = ctk.CTkEntry(
+            self.inner_frames, width=110, justify="center",
+            fg_color=self.theme_manager.colors["entry_bg"],
+            text_color=self.theme_manager.colors["text"],
+            border_color=self.theme_manager.colors["text_scd"], border_width=2,
+            placeholder_text="Whole file", font=("Roboto", 13)
+        )
+        self.entry_range.pack(side="left", padx=(0, 20))
+        
+        self.check_dedupe = ctk.CTkCheckBox(
+            self.inner_frames, text="Drop duplicate frames",
+            text_color=self.theme_manager.colors["text_scd"], font=("Roboto", 14),
+            fg_color=self.theme_manager.colors["accent"],
+            hover_color=self.theme_manager.colors["accent_hover"],
+            border_color=self.theme_manager.colors["text_scd"]
+        )
+        self.check_dedupe.pack(side="left", padx=(0, 20))
+        
+        # Crop black bars and dead canvas found by sampling frames
+        self.check_crop = ctk.CTkCheckBox(
+            self.inner_frames, text="Auto crop",
+            text_color=self.theme_manager.colors["text_scd"], font=("Roboto", 14),
+            fg_color=self.theme_manager.colors["accent"],
+            hover_color=self.theme_manager.colors["accent_hover"],
+            border_color=self.theme_manager.colors["text_scd"]
+        )
+        self.check_crop.select()
+        self.check_crop.pack(side="left", padx=(0, 20))
+        
+        # Detect screen recordings and encode them with the screen profile
+        self.check_screen = ctk.CTkCheckBox(
+            self.inner_frames, text="Screen profile",
+            text_color=self.theme_manager.colors["text_scd"], font=("Roboto", 14),
+            fg_color=self.theme_manager.colors["accent"],
+            hover_color=self.theme_manager.colors["accent_hover"],
+            border_color=self.theme_manager.colors["text_scd"]
+        )
+        self.check_screen.select()
+        self.check_screen.pack(side="left")
+        
         self.label_output_folder = ctk.CTkLabel(
             self, text="Output: Same as source", text_color=self.theme_manager.colors["text_scd"], font=("Roboto", 13)
         )
@@ -78,6 +261,18 @@ class SettingsPanel(ctk.CTkFrame):
             'target_size': self.entry_size.get(),
             'suffix': self.entry_suffix.get(),
             'mode': self.seg_speed.get(),
+            'engine': self.seg_engine.get(),
+            'codec': self.seg_codec.get(),
+            'workers': self.entry_workers.get(),
+            'stall': self.entry_stall.get(),
+            'segmented': bool(self.check_segmented.get()),
+            'downscale': bool(self.check_downscale.get()),
+            'max_fps': self.entry_max_fps.get(),
+            'range': self.entry_range.get(),
+            'dedupe': bool(self.check_dedupe.get()),
+            'crop': bool(self.check_crop.get()),
+            'screen': bool(self.check_screen.get()),
+            'budget': bool(self.check_budget.get()),
             'output_folder': self.output_folder
         }
 
@@ -88,6 +283,20 @@ class SettingsPanel(ctk.CTkFrame):
         self.entry_size.insert(0, "10")
         self.entry_suffix.delete(0, "end")
         self.entry_suffix.insert(0, "_compressed")
+        self.entry_workers.delete(0, "end")
+        self.entry_workers.insert(0, "Auto")
+        self.entry_stall.delete(0, "end")
+        self.entry_stall.insert(0, str(DEFAULT_STALL_SECONDS))
+        self.check_segmented.deselect()
+        self.check_downscale.select()
+        self.entry_max_fps.delete(0, "end")
+        self.entry_max_fps.insert(0, "Source")
+        self.entry_range.delete(0, "end")
+        self.check_dedupe.deselect()
+        self.check_crop.select()
+        self.check_screen.select()
+        self.check_budget.deselect()
+        self.seg_codec.set(self.codecs[0])
 
     def update_colors(self):
         self.label_target.configure(text_color=self.theme_manager.colors["text_scd"])
@@ -111,6 +320,42 @@ class SettingsPanel(ctk.CTkFrame):
             unselected_hover_color=self.theme_manager.colors["btn_hover"],
             text_color=self.theme_manager.colors["text"]
         )
+        self.label_engine.configure(text_color=self.theme_manager.colors["text_scd"])
+        self.seg_engine.configure(
+            fg_color=self.theme_manager.colors["entry_bg"],
+            selected_color=self.theme_manager.colors["accent"],
+            selected_hover_color=self.theme_manager.colors["accent_hover"],
+            unselected_color=self.theme_manager.colors["entry_bg"],
+            unselected_hover_color=self.theme_manager.colors["btn_hover"],
+            text_color=self.theme_manager.colors["text"]
+        )
+        self.label_codec.configure(text_color=self.theme_manager.colors["text_scd"])
+        self.seg_codec.configure(
+            fg_color=self.theme_manager.colors["entry_bg"],
+            selected_color=self.theme_manager.colors["accent"],
+            selected_hover_color=self.theme_manager.colors["accent_hover"],
+            unselected_color=self.theme_manager.colors["entry_bg"],
+            unselected_hover_color=self.theme_manager.colors["btn_hover"],
+            text_color=self.theme_manager.colors["text"]
+        )
+        self.label_workers.configure(text_color=self.theme_manager.colors["text_scd"])
+        self.label_stall.configure(text_color=self.theme_manager.colors["text_scd"])
+        self.label_max_fps.configure(text_color=self.theme_manager.colors["text_scd"])
+        self.label_range.configure(text_color=self.theme_manager.colors["text_scd"])
+        for checkbox in (self.check_segmented, self.check_downscale, self.check_dedupe,
+                         self.check_crop, self.check_screen, self.check_budget):
+            checkbox.configure(
+                text_color=self.theme_manager.colors["text_scd"],
+                fg_color=self.theme_manager.colors["accent"],
+                hover_color=self.theme_manager.colors["accent_hover"],
+                border_color=self.theme_manager.colors["text_scd"]
+            )
+        for entry in (self.entry_workers, self.entry_stall, self.entry_max_fps, self.entry_range):
+            entry.configure(
+                fg_color=self.theme_manager.colors["entry_bg"],
+                text_color=self.theme_manager.colors["text"],
+                border_color=self.theme_manager.colors["text_scd"]
+            )
         self.btn_output_folder.configure(
             fg_color=self.theme_manager.colors["accent"],
             hover_color=self.theme_manager.colors["accent_hover"]
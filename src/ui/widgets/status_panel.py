@@ -27,6 +27,16 @@ class StatusPanel(ctk.CTkFrame):
         )
         self.label_status.grid(row=1, column=0)
         
+        # --- Per-file progress (one line per running encode, hidden when idle) ---
+        self.file_progress = {}
+        self.label_file_progress = ctk.CTkLabel(
+            self,
+            text="",
+            text_color=self.theme_manager.colors["text_scd"],
+            font=("Consolas", 12),
+            justify="left"
+        )
+        
         # --- Logs Area ---
         self.logs_frame = ctk.CTkFrame(master, fg_color="transparent") # Placed on master (main container) usually at bottom
         # Wait, in original it's separate row. 
@@ -36,7 +46,7 @@ class StatusPanel(ctk.CTkFrame):
         # Let's put logs inside StatusPanel for better encapsulation.
         
         self.logs_container = ctk.CTkFrame(self, fg_color="transparent")
-        self.logs_container.grid(row=2, column=0, pady=(10, 0))
+        self.logs_container.grid(row=3, column=0, pady=(10, 0))
         
         self.btn_toggle_logs = ctk.CTkButton(
             self.logs_container,
@@ -83,7 +93,7 @@ class StatusPanel(ctk.CTkFrame):
             text_color=self.theme_manager.colors["text_scd"],
             font=("Roboto", 10)
         )
-        self.label_copyright.grid(row=3, column=0, pady=(15, 0))
+        self.label_copyright.grid(row=4, column=0, pady=(15, 0))
 
     def toggle_logs(self):
         if self.logs_visible:
@@ -95,6 +105,35 @@ class StatusPanel(ctk.CTkFrame):
             self.btn_toggle_logs.configure(text="Hide Logs")
             self.logs_visible = True
 
+    def show_file_progress(self, name, stats):
+        """Show percentage, encode speed (x realtime), bytes written and time left of a file."""
+        parts = [f"{stats.get('percent') or 0:5.1f}%"]
+        if stats.get('stage'):
+            parts.append(stats['stage'])
+        if stats.get('speed'):
+            parts.append(f"{stats['speed']:.1f}x")
+        if stats.get('total_size'):
+            parts.append(f"{stats['total_size'] / (1024 * 1024):.1f} MB")
+        if stats.get('eta') is not None:
+            parts.append(f"{int(stats['eta']) // 60}:{int(stats['eta']) % 60:02d} left")
+        self.file_progress[name] = f"{name}: " + " • ".join(parts)
+        self._render_file_progress()
+
+    def clear_file_progress(self, name=None):
+        """Remove one file's progress line, or all of them."""
+        if name is None:
+            self.file_progress.clear()
+        else:
+            self.file_progress.pop(name, None)
+        self._render_file_progress()
+
+    def _render_file_progress(self):
+        if self.file_progress:
+            self.label_file_progress.configure(text="\n".join(self.file_progress.values()))
+            self.label_file_progress.grid(row=2, column=0, pady=(5, 0))
+        else:
+            self.label_file_progress.grid_remove()
+
     def log_message(self, message, level="info"):
         timestamp = datetime.datetime.now().strftime("%I:%M:%S %p")
         single_separator = "─" * 80
@@ -136,6 +175,7 @@ class StatusPanel(ctk.CTkFrame):
 
     def update_colors(self):
         self.label_status.configure(text_color=self.theme_manager.colors["text_scd"])
+        self.label_file_progress.configure(text_color=self.theme_manager.colors["text_scd"])
         self.label_copyright.configure(text_color=self.theme_manager.colors["text_scd"])
         self.progressbar.configure(progress_color=self.theme_manager.colors["accent"])
         self.logs_text.config(bg=self.theme_manager.colors["entry_bg"], fg=self.theme_manager.colors["text"])
@@ -0,0 +1,35 @@
+import os
+import sys
+
+APP_DIR_NAME = "ITG Video Compressor"
+
+
+def get_user_data_dir(*parts):
+    """
+    Return (and create) a per-user data directory for caches and state.
+
+    Honors the ITG_VC_DATA_DIR environment variable (portable installs, tests),
+    otherwise uses the platform convention:
+        Windows: %LOCALAPPDATA%/ITG Video Compressor
+        macOS:   ~/Library/Application Support/ITG Video Compressor
+        Linux:   $XDG_DATA_HOME/ITG Video Compressor (~/.local/share by default)
+
+    Args:
+        *parts: Optional sub-directories to append
+
+    Returns:
+        Absolute path to the directory
+    """
+    base = os.environ.get("ITG_VC_DATA_DIR")
+    if not base:
+        if sys.platform == "win32":
+            root = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        elif sys.platform == "darwin":
+            root = os.path.expanduser("~/Library/Application Support")
+        else:
+            root = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        base = os.path.join(root, APP_DIR_NAME)
+
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,210 @@
+import re
+import subprocess
+
+from utils.ffmpeg_tools import get_ffmpeg_path
+
+# A track whose loudest sample stays below this is treated as silent
+SILENCE_MAX_DB = -60.0
+# Stereo tracks whose left-minus-right signal stays below this carry the same audio twice
+DUAL_MONO_MAX_DB = -50.0
+# Speech has little energy above 4 kHz; music and effects keep much more of it
+SPEECH_HIGHPASS_HZ = 4000
+SPEECH_HF_DROP_DB = 22.0
+# AAC bitrates in kbps by content and output channel count
+AUDIO_BITRATES = {("speech", 1): 48, ("music", 1): 64, ("music", 2): 128}
+MIN_AUDIO_KBPS = 32
+# Audio never takes more than this share of the whole bit budget
+MAX_AUDIO_SHARE = 0.2
+# Containers that accept an AAC track as-is
+AAC_COPY_EXTENSIONS = (".mp4", ".mov", ".m4v", ".mkv")
+# Level scans decode audio only, typically several hundred times faster than realtime
+SCAN_TIMEOUT_MIN_SECONDS = 30
+SCAN_SPEED_FLOOR = 20
+
+_LEVEL_RE = re.compile(
+    r"\[volumedetect@(\w+?)(\d+) @ [^\]]+\]\s*(mean|max)_volume:\s*(-?[\d.]+|-inf) dB")
+
+
+class TrackLevels:
+    """Loudness figures of one audio track from a level scan."""
+
+    def __init__(self, max_db=None, mean_db=None, side_max_db=None, high_mean_db=None):
+        self.max_db = max_db              # loudest sample
+        self.mean_db = mean_db
+        self.side_max_db = side_max_db    # loudest left-minus-right sample (stereo only)
+        self.high_mean_db = high_mean_db  # mean level above SPEECH_HIGHPASS_HZ
+
+    @property
+    def silent(self):
+        return self.max_db is not None and self.max_db <= SILENCE_MAX_DB
+
+    @property
+    def dual_mono(self):
+        return self.side_max_db is not None and self.side_max_db <= DUAL_MONO_MAX_DB
+
+    @property
+    def speech(self):
+        if self.mean_db is None or self.high_mean_db is None:
+            return False
+        return self.mean_db - self.high_mean_db >= SPEECH_HF_DROP_DB
+
+
+def scan_audio_levels(input_path, info):
+    """
+    Measure every audio track of a file in one audio-only decode.
+
+    Args:
+        input_path: Path to the media file
+        info: MediaInfo of the file
+
+    Returns:
+        Dict of audio track number (0-based, as in ``0:a:N``) to TrackLevels,
+        or None if the scan failed
+    """
+    tracks = info.audio_streams
+    if not tracks:
+        return {}
+    graphs, outputs = [], []
+    for n, stream in enumerate(tracks):
+        branches = [f"volumedetect@level{n}",
+                    f"highpass=f={SPEECH_HIGHPASS_HZ},volumedetect@high{n}"]
+        if (stream.channels or 0) >= 2:
+            branches.append(f"pan=mono|c0=c0-c1,volumedetect@side{n}")
+        labels = [f"{kind}{n}" for kind in ("l", "h", "s")[:len(branches)]]
+        graphs.append(f"[0:a:{n}]asplit={len(branches)}"
+                      + "".join(f"[{label}in]" for label in labels))
+        for label, branch in zip(labels, branches):
+            graphs.append(f"[{label}in]{branch}[{label}]")
+            outputs += ["-map", f"[{label}]", "-f", "null", "-"]
+
+    cmd = [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-nostats", "-vn", "-sn", "-dn",
+           "-i", input_path, "-filter_complex", ";".join(graphs)] + outputs
+    timeout = max(SCAN_TIMEOUT_MIN_SECONDS, (info.duration or 0) / SCAN_SPEED_FLOOR)
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, errors="replace",
+                                timeout=timeout)
+    except (subprocess.TimeoutExpired, subprocess.SubprocessError, OSError):
+        return None
+    if result.returncode != 0:
+        return None
+
+    levels = {n: TrackLevels() for n in range(len(tracks))}
+    fields = {("level", "max"): "max_db", ("level", "mean"): "mean_db",
+              ("side", "max"): "side_max_db", ("high", "mean"): "high_mean_db"}
+    for kind, n, measure, value in _LEVEL_RE.findall(result.stderr or ""):
+        field = fields.get((kind, measure))
+        if field and int(n) in levels:
+            setattr(levels[int(n)], field, float("-inf") if value == "-inf" else float(value))
+    return levels
+
+
+class AudioPlan:
+    """
+    How the audio of one file is written: dropped, copied or re-encoded.
+
+    Built by plan_audio(); ``ffmpeg_args()`` turns it into output options.
+    """
+
+    def __init__(self, mode, track=None, channels=None, bitrate_kbps=0, downmix=False, reason="",
+                 codec="aac"):
+        self.mode = mode                  # "none", "copy" or "encode"
+        self.codec = codec                # audio encoder when re-encoding
+        self.track = track                # audio track number (``0:a:N``), None for "first, if any"
+        self.channels = channels          # output channels, None if unknown
+        self.bitrate_kbps = bitrate_kbps  # bits the track takes from the size budget
+        self.downmix = downmix            # whether the source has more channels than the output
+        self.reason = reason
+
+    def ffmpeg_args(self, input_index=0):
+        """Map and codec options for the planned audio track."""
+        if self.mode == "none":
+            return ["-an"]
+        source = f"{input_index}:a:0?"
+        if self.track is not None:
+            source = f"{input_index}:a:{self.track}"
+        if self.mode == "copy":
+            return ["-map", source, "-c:a", "copy"]
+        args = ["-map", source, "-c:a", self.codec, "-b:a", f"{self.bitrate_kbps}k"]
+        if self.downmix:
+            args += ["-ac", str(self.channels)]
+        return args
+
+    def describe(self):
+        if self.mode == "none":
+            return f"dropped ({self.reason})"
+        track = f"track {self.track + 1}" if self.track is not None else "first track"
+        if self.mode == "copy":
+            return f"{track} copied as-is, {self.bitrate_kbps}k ({self.reason})"
+        # None for unknown streams
+        layout = {1: "mono", 2: "stereo"}.get(self.channels, "source layout")
+        codec = {"aac": "AAC", "libopus": "Opus"}.get(self.codec, self.codec)
+        return f"{track} as {layout} {codec} at {self.bitrate_kbps}k ({self.reason})"
+
+
+def plan_audio(info, total_kbps, output_ext, levels=None, audio_codec="aac"):
+    """
+    Decide how to write the audio of a file.
+
+    Silent tracks are dropped, and the first audible track is kept. Speech and
+    dual-mono tracks are downmixed to mono, and the bitrate follows the
+    content and channel count. A compatible AAC track that is already small
+    enough is copied as it is.
+
+    Args:
+        info: MediaInfo of the input
+        total_kbps: Whole bit budget of the output in kbps (video + audio)
+        output_ext: Output container extension, e.g. ".mp4"
+        levels: Result of scan_audio_levels(), None if unavailable
+        audio_codec: Audio encoder for re-encoded tracks ("aac", or "libopus" for WebM)
+
+    Returns:
+        AudioPlan
+    """
+    tracks = info.audio_streams
+    if not tracks:
+        if info.source == "moviepy":
+            # The fallback probe knows nothing about audio; keep the first track if there is one
+            bitrate = _cap_bitrate(AUDIO_BITRATES[("music", 2)], total_kbps)
+            return AudioPlan("encode", bitrate_kbps=bitrate, reason="streams unknown",
+                             codec=audio_codec)
+        return AudioPlan("none", reason="no audio")
+
+    track = 0
+    if levels:
+        audible = [n for n in range(len(tracks)) if not (levels.get(n) and levels[n].silent)]
+        if not audible:
+            return AudioPlan("none", reason="silent")
+        track = audible[0]
+    reasons = [f"{len(tracks) - 1} other track(s) dropped"] if len(tracks) > 1 else []
+    stream = tracks[track]
+    track_levels = (levels or {}).get(track)
+
+    source_channels = stream.channels or 2
+    content = "speech" if track_levels is not None and track_levels.speech else "music"
+    dual_mono = track_levels is not None and track_levels.dual_mono
+    if source_channels == 1 or content == "speech" or dual_mono:
+        channels = 1
+        reasons.insert(0, content if source_channels == 1 else f"{content}, downmixed")
+    else:
+        channels = 2
+        reasons.insert(0, content)
+    bitrate = _cap_bitrate(AUDIO_BITRATES[(content, channels)], total_kbps)
+
+    source_kbps = int(stream.bit_rate / 1000) if stream.bit_rate else None
+    if (stream.codec_name == "aac" and audio_codec == "aac" and source_kbps
+            and source_kbps <= bitrate and channels == source_channels
+            and output_ext.lower() in AAC_COPY_EXTENSIONS):
+        return AudioPlan("copy", track=track, channels=channels, bitrate_kbps=source_kbps,
+                         reason=", ".join(reasons))
+    if source_kbps:
+        bitrate = max(MIN_AUDIO_KBPS, min(bitrate, source_kbps))
+    return AudioPlan("encode", track=track, channels=channels, bitrate_kbps=bitrate,
+                     downmix=channels < source_channels, reason=", ".join(reasons),
+                     codec=audio_codec)
+
+
+def _cap_bitrate(bitrate_kbps, total_kbps):
+    """Keep audio within its share of small budgets."""
+    if total_kbps:
+        bitrate_kbps = min(bitrate_kbps, int(total_kbps * MAX_AUDIO_SHARE))
+    return max(MIN_AUDIO_KBPS, bitrate_kbps)
@@ -0,0 +1,170 @@
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+
+from compressor import VideoCompressor
+from utils.cancellation import CancellationToken
+from utils.probe_cache import ProbeCache
+from utils.rate_history import RateHistory
+from utils.targets import OutputTarget
+
+# Encoder threads assumed per job when sizing the default worker count
+THREADS_PER_JOB = 4
+
+
+def default_worker_count(cpu_count=None):
+    """
+    Sensible number of concurrent compressions for this machine.
+
+    Each encode already uses several threads, so one job per THREADS_PER_JOB
+    cores keeps big workstations busy without oversubscribing laptops. Callers
+    that know the queued files size the pool with ConcurrencyPlanner instead.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(1, cpu_count // THREADS_PER_JOB)
+
+
+def run_compression_job(job_id, job, events, cancel_token=None):
+    """
+    Compress one file inside a worker process.
+
+    Runs in a fresh process per job (the pool uses maxtasksperchild=1), so
+    all MoviePy/ffmpeg memory is returned to the OS when the job ends.
+
+    Args:
+        job_id: Identifier echoed back in events and the result
+        job: Dict with input_path, output_path, preset, compressor (kwargs)
+             and optional threads, cpu_budget, max_processing_time, probe_cache_path and
+             rate_history_path; with "targets" (list of (OutputTarget dict, output path))
+             every target is written from one decode;
+             "trim" ((start, end) or None) limits the job to a time range of the input
+        events: Queue receiving (kind, job_id, *payload) tuples for the UI:
+                ("status", id, text, color), ("log", id, message, level), ("progress", id, stats)
+        cancel_token: Optional CancellationToken shared by the whole batch
+
+    Returns:
+        Dict with job_id, success, status ("done", "failed", "cancelled" or "timeout")
+        and an optional error message
+    """
+    def emit(kind, *payload):
+        try:
+            events.put((kind, job_id) + payload)
+        except Exception:
+            pass
+
+    if cancel_token is not None and cancel_token.cancelled:
+        return {"job_id": job_id, "success": False, "status": "cancelled"}
+    emit("status", "Processing...", "orange")
+    try:
+        probe_cache = ProbeCache(job["probe_cache_path"]) if job.get("probe_cache_path") else None
+        rate_history = None
+        if job.get("rate_history_path"):
+            rate_history = RateHistory(job["rate_history_path"])
+        compressor = VideoCompressor(probe_cache=probe_cache, rate_history=rate_history,
+                                     **job["compressor"])
+        if job.get("targets"):
+            outputs = [(OutputTarget.from_dict(target), output_path)
+                       for target, output_path in job["targets"]]
+            success = compressor.compress_targets(
+                job["input_path"], outputs, preset=job["preset"],
+                progress_callback=lambda stats: emit("progress", stats),
+                threads=job.get("threads"), cpu_budget=job.get("cpu_budget"),
+                cancel_token=cancel_token, trim=job.get("trim"),
+                max_processing_time=job.get("max_processing_time"))
+            return {"job_id": job_id, "success": bool(success), "status": compressor.last_status}
+        success = compressor.compress_video(job["input_path"], job["output_path"],
+                                           preset=job["preset"],
+                                           progress_callback=lambda stats: emit("progress", stats),
+                                           threads=job.get("threads"),
+                                           cpu_budget=job.get("cpu_budget"),
+                                           max_processing_time=job.get("max_processing_time"),
+                                           cancel_token=cancel_token, trim=job.get("trim"))
+        return {"job_id": job_id, "success": bool(success), "status": compressor.last_status}
+    except Exception as e:
+        emit("log", f"Worker error on {os.path.basename(job['input_path'])}: {e}\n"
+                    f"{traceback.format_exc()}", "error")
+        return {"job_id": job_id, "success": False, "status": "failed", "error": str(e)}
+
+
+class BatchExecutor:
+    """
+    Runs compression jobs in parallel worker processes.
+
+    Each job gets its own process, and the process exits when the job
+    finishes. Workers report status/log events through a shared queue that
+    the caller drains on its own thread and forwards to the UI. All jobs
+    share one cancellation token, so cancel() stops every running encoder.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or default_worker_count()
+        ctx = multiprocessing.get_context("spawn")
+        self._manager = ctx.Manager()
+        self.events = self._manager.Queue()
+        self.cancel_token = CancellationToken(self._manager.Event())
+        self._pool = ctx.Pool(processes=self.max_workers, maxtasksperchild=1)
+        self._results = {}
+        self._closed = False
+
+    def submit(self, job_id, job):
+        """Queue a job; it starts as soon as a worker is free."""
+        self._results[job_id] = self._pool.apply_async(
+            run_compression_job, (job_id, job, self.events, self.cancel_token))
+
+    @property
+    def active_jobs(self):
+        return len(self._results)
+
+    def poll_finished(self):
+        """
+        Collect results of jobs that have finished since the last call.
+
+        Returns:
+            List of result dicts
+        """
+        finished = []
+        for job_id, async_result in list(self._results.items()):
+            if not async_result.ready():
+                continue
+            del self._results[job_id]
+            try:
+                finished.append(async_result.get())
+            except Exception as e:
+                finished.append({"job_id": job_id, "success": False, "error": str(e)})
+        return finished
+
+    def cancel(self, wait_seconds=0):
+        """
+        Cancel every queued and running job.
+
+        Args:
+            wait_seconds: Block up to this long for running jobs to kill their encoders
+        """
+        self.cancel_token.cancel()
+        deadline = time.monotonic() + wait_seconds
+        while time.monotonic() < deadline and not all(r.ready()
+                                                      for r in list(self._results.values())):
+            time.sleep(0.05)
+
+    def get_event(self, timeout=0.2):
+        """Return the next worker event, or None if none arrived within timeout."""
+        try:
+            return self.events.get(timeout=timeout)
+        except (queue.Empty, EOFError, OSError):
+            return None
+
+    def shutdown(self, terminate=False):
+        """Stop the pool. terminate=True kills workers instead of waiting for them."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if terminate:
+                self._pool.terminate()
+            else:
+                self._pool.close()
+            self._pool.join()
+        finally:
+            self._manager.shutdown()
@@ -0,0 +1,49 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from utils.codecs import DEFAULT_CODEC
+from utils.constants import ENGINE_MOVIEPY, RATE_ABR
+from utils.watchdog import DEFAULT_STALL_SECONDS
+
+
+@dataclass
+class BatchSettings:
+    """
+    What one batch run was started with, after the app validated its settings panel.
+
+    The batch thread reads everything from here; compressor_kwargs() turns it
+    into the VideoCompressor settings every job of the batch shares.
+    """
+
+    target_sizes: Tuple[float, ...]      # One output per size (a single size with budget)
+    preset: str
+    suffix: str
+    output_folder: Optional[str] = None  # None: next to each input
+    engine: str = ENGINE_MOVIEPY
+    rate_control: str = RATE_ABR
+    workers: Optional[int] = None        # None: planned from the files and cores
+    segmented: bool = False
+    downscale: bool = True
+    dedupe: bool = False
+    max_fps: Optional[float] = None
+    codec: str = DEFAULT_CODEC
+    crop: bool = True
+    screen: bool = True
+    budget: bool = False                 # The size is the total for the whole queue
+    trim: Optional[Tuple[float, Optional[float]]] = None
+    speed_mode: str = "Fast"
+    stall_timeout: float = DEFAULT_STALL_SECONDS
+
+    def compressor_kwargs(self):
+        """
+        VideoCompressor keyword arguments of the batch, for the first target size.
+
+        The app always predicts sizes and allocates bitrate; the other analysis
+        passes follow the settings panel.
+        """
+        return {'target_size_mb': self.target_sizes[0], 'engine': self.engine,
+                'rate_control': self.rate_control, 'segmented': self.segmented,
+                'auto_downscale': self.downscale, 'drop_duplicates': self.dedupe,
+                'max_fps': self.max_fps, 'codec': self.codec, 'auto_crop': self.crop,
+                'content_tuning': self.screen, 'stall_timeout': self.stall_timeout,
+                'predict_size': True, 'allocate_bitrate': True}
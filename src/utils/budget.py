@@ -0,0 +1,237 @@
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import segments
+from utils.complexity import ComplexityCurve, scan_complexity
+from utils.concurrency import ConcurrencyPlanner
+from utils.media_info import probe_media
+from utils.trim import trimmed_duration
+
+# Output size grows slower than the pixel count: a 1080p file needs about 1.5x, not 2.25x, of a
+# 720p one
+REFERENCE_PIXELS = 1280 * 720
+RESOLUTION_EXPONENT = 0.5
+# Harder content gets more, but not in full proportion: easy files would otherwise starve
+COMPLEXITY_EXPONENT = 0.5
+MIN_FACTOR = 0.25
+MAX_FACTOR = 4.0
+# Share of a file that starts after the budget ran out
+MIN_SHARE_MB = 0.1
+# Speed mode -> wall-clock seconds budgeted per second of video; a job whose measured speed
+# predicts a later finish is flagged in the log (only a stall stops it)
+MODE_TIME_FACTORS = {
+    "Fast": 1.0,
+    "Balanced": 2.0,
+    "Two-Pass": 3.0,
+    "Quality": 2.0,
+}
+# Added to every time budget for probing, analysis and process start-up
+BUDGET_OVERHEAD_SECONDS = 180
+
+
+class BudgetEntry:
+    """One file of a batch budget: how much of the budget it should get, and what it got."""
+
+    def __init__(self, duration, width=None, height=None, complexity=None):
+        self.duration = duration  # None if unknown
+        self.width = width
+        self.height = height
+        self.complexity = complexity  # Mean of the file's ComplexityCurve, None if unknown
+        self.weight = 0.0
+        self.reserved_mb = None  # Share handed out when the file started
+        self.actual_mb = None    # Size of the finished output
+
+
+class BatchBudget:
+    """
+    Split one size budget across the files of a batch, and rebalance as they finish.
+
+    Each file weighs duration x resolution factor x complexity factor; a file
+    of unknown duration weighs the average of the others (all weigh the same
+    when none is known). A file gets its share of what is left when it starts;
+    a file that finishes under (or over) its share leaves more (or less) for
+    the files still waiting.
+    Thread-safe: the batch thread reserves while results come in.
+    """
+
+    def __init__(self, total_mb):
+        if total_mb <= 0:
+            raise ValueError("Batch budget must be positive")
+        self.total_mb = total_mb
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, duration, width=None, height=None, complexity=None):
+        """
+        Register a file that will be compressed (duration None if unknown).
+
+        Weights are recomputed for every added file.
+        """
+        with self._lock:
+            self.entries[key] = BudgetEntry(duration, width, height, complexity)
+            self._weigh()
+
+    def spend(self, size_mb):
+        """Take an existing output (e.g. an already finished file) out of the budget."""
+        with self._lock:
+            self.total_mb -= size_mb
+
+    def _weigh(self):
+        known = [entry.complexity for entry in self.entries.values() if entry.complexity]
+        mean_complexity = sum(known) / len(known) if known else None
+        for entry in self.entries.values():
+            factor = 1.0
+            if entry.width and entry.height:
+                factor *= (entry.width * entry.height / REFERENCE_PIXELS) ** RESOLUTION_EXPONENT
+            if entry.complexity and mean_complexity:
+                factor *= min(max((entry.complexity / mean_complexity) ** COMPLEXITY_EXPONENT,
+                                  MIN_FACTOR), MAX_FACTOR)
+            entry.weight = entry.duration * factor if entry.duration is not None else None
+        weights = [entry.weight for entry in self.entries.values() if entry.weight is not None]
+        average = sum(weights) / len(weights) if weights else 1.0
+        for entry in self.entries.values():
+            if entry.weight is None:
+                entry.weight = average
+
+    def remaining_mb(self):
+        """Budget not yet spent by finished files or reserved by running ones."""
+        with self._lock:
+            return self._remaining_mb()
+
+    def _remaining_mb(self):
+        used = sum(entry.actual_mb if entry.actual_mb is not None else entry.reserved_mb or 0.0
+                   for entry in self.entries.values())
+        return self.total_mb - used
+
+    def reserve(self, key):
+        """
+        Hand out the share of a file that is about to start.
+
+        Returns:
+            Size in MB for this file: what is left, split by weight among it and the files not
+            started yet
+        """
+        with self._lock:
+            entry = self.entries[key]
+            waiting = [other for other in self.entries.values()
+                       if other.reserved_mb is None and other.actual_mb is None]
+            waiting_weight = sum(other.weight for other in waiting)
+            remaining = max(self._remaining_mb(), 0.0)
+            if waiting_weight > 0:
+                share = remaining * entry.weight / waiting_weight
+            else:
+                share = remaining / max(len(waiting), 1)
+            entry.reserved_mb = share
+            return share
+
+    def finish(self, key, actual_mb):
+        """
+        Record what a file really used (0 when it failed).
+
+        The difference to its share goes back to the pool.
+        """
+        with self._lock:
+            self.entries[key].actual_mb = actual_mb
+
+    def used_mb(self):
+        """Total size of the finished outputs."""
+        with self._lock:
+            return sum(entry.actual_mb or 0.0 for entry in self.entries.values())
+
+
+def predict_complexity(input_path, info, scratch_dir, probe_cache=None, cancel_token=None):
+    """
+    Mean complexity of a file for its budget share: the cached curve, or a fresh scan.
+
+    Scan values are measured on the same small, low frame rate encode for every
+    file, so they compare across files of any resolution. A new curve is stored
+    with the probe data, where a later split encode of the file finds it too.
+
+    Returns:
+        Mean scan bytes per second, or None if the scan failed
+    """
+    if info.complexity:
+        return ComplexityCurve.from_dict(info.complexity).mean() or None
+    curve, _ = scan_complexity(input_path, info, scratch_dir, cancel_token=cancel_token)
+    if curve is None:
+        return None
+    info.complexity = curve.to_dict()
+    if probe_cache is not None:
+        probe_cache.put(info)
+    return curve.mean() or None
+
+
+def plan_batch_budget(budget, jobs, min_video_kbps, probe_cache=None, trim=None, workers=None,
+                      cancel_token=None):
+    """
+    Register the files of a budget batch with their duration, resolution and predicted
+    complexity.
+
+    Files are probed if the queue has not yet done so; complexity comes from the
+    cached curve or a low-resolution scan of each file. The scans run in parallel,
+    as many at a time as the batch will have workers, and cancel_token stops them.
+    With a range, only its length counts.
+
+    Args:
+        budget: BatchBudget receiving the files
+        jobs: Batch entries (dicts with id, info and job["input_path"]); info, height and
+            duration are filled in for the files that could be probed
+        min_video_kbps: Lowest video bitrate of the batch's engine
+        probe_cache: Optional ProbeCache storing new probes and complexity curves
+        trim: (start, end) range of every file, or None
+        workers: Worker processes of the batch, None to plan from the cores
+        cancel_token: Optional CancellationToken of the batch
+
+    Returns:
+        Smallest total in MB the batch can reach at min_video_kbps
+    """
+    for entry in jobs:
+        if entry['info'] is None:
+            entry['info'] = probe_media(entry['job']['input_path'])
+            if entry['info'] is not None and probe_cache is not None:
+                probe_cache.put(entry['info'])
+    known = [entry for entry in jobs if entry['info'] is not None and entry['info'].duration]
+
+    scratch_dir = segments.make_scratch_dir(prefix="budget_")
+
+    def scan(entry):
+        # One directory per file: the scans write their output under a fixed name
+        file_scratch = os.path.join(scratch_dir, str(entry['id']))
+        os.makedirs(file_scratch, exist_ok=True)
+        return predict_complexity(entry['job']['input_path'], entry['info'], file_scratch,
+                                  probe_cache, cancel_token=cancel_token)
+
+    try:
+        scan_workers = ConcurrencyPlanner(max_workers=workers).plan_workers(
+            [(entry['info'].height, entry['info'].duration) for entry in known])
+        with ThreadPoolExecutor(max_workers=scan_workers) as pool:
+            complexities = list(pool.map(scan, known))
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    floor_mb = 0.0
+    for entry, complexity in zip(known, complexities):
+        info = entry['info']
+        duration = trimmed_duration(trim, info.duration)
+        budget.add(entry['id'], duration, info.width, info.height, complexity)
+        entry['height'], entry['duration'] = info.height, duration
+        floor_mb += min_video_kbps * 1000 / 8 * duration / (1024 * 1024)
+    for entry in jobs:
+        if entry['info'] is None or not entry['info'].duration:
+            budget.add(entry['id'], None)  # Unknown length: weighs like an average file
+    return floor_mb
+
+
+def processing_budget(mode, duration, outputs=1):
+    """
+    Time budget in seconds for encoding duration seconds of video to a number of outputs.
+
+    Returns:
+        Seconds, or None when the duration is not known yet
+    """
+    if not duration:
+        return None
+    factor = MODE_TIME_FACTORS.get(mode, MODE_TIME_FACTORS["Fast"])
+    return duration * factor * outputs + BUDGET_OVERHEAD_SECONDS
@@ -0,0 +1,42 @@
+import threading
+
+
+class EncodeCancelled(Exception):
+    """Raised inside an encode loop (e.g. MoviePy's frame writer) to stop it on cancellation."""
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation flag shared between the UI and running encodes.
+
+    Wraps a threading.Event by default, or a multiprocessing Manager Event
+    when the token must reach worker processes (the proxy pickles cleanly
+    into pool jobs). Encoders poll it several times a second and kill their
+    ffmpeg process as soon as it is set. A token with a parent is also
+    cancelled when the parent is, which lets an encoder stop itself (e.g. on
+    a stall) without cancelling the rest of the batch.
+    """
+
+    def __init__(self, event=None, parent=None):
+        """
+        Args:
+            event: Event-like object with set()/is_set(); a new threading.Event if None
+            parent: Optional CancellationToken whose cancellation also applies to this one
+        """
+        self._event = event if event is not None else threading.Event()
+        self.parent = parent
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        try:
+            return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+        except (EOFError, OSError):
+            # The manager process is gone, which only happens while the app shuts down
+            return True
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise EncodeCancelled()
@@ -0,0 +1,230 @@
+import json
+import os
+import re
+import subprocess
+
+from utils.app_paths import get_user_data_dir
+from utils.ffmpeg_tools import get_ffmpeg_path
+
+# A test encode of a single tiny frame should finish almost instantly
+PROBE_TIMEOUT_SECONDS = 30
+# Containers that need the hvc1 tag for HEVC to play in QuickTime/Safari
+HVC1_EXTENSIONS = (".mp4", ".mov", ".m4v")
+
+_ENCODER_RE = re.compile(r"^\s*V[A-Z.]{5}\s+(\S+)", re.MULTILINE)
+
+
+class CodecBackend:
+    """
+    One video encoder and how to drive it from ffmpeg.
+
+    The defaults describe x264; other encoders override what differs
+    (speed options, constant-quality scale, two-pass handling, containers).
+    """
+
+    name = "h264"             # settings key
+    label = "H.264"           # shown in the UI
+    encoder = "libx264"       # ffmpeg encoder
+    codec_name = "h264"       # codec name ffprobe reports for the output
+    crf = 23                  # constant quality of the "quality" mode
+    efficiency = 1.0          # bits needed for the same quality, relative to x264
+    containers = (".mp4", ".mov", ".m4v", ".mkv")
+    supports_two_pass = True
+    moviepy = True            # understands MoviePy's x264-style "-preset" option
+
+    def speed_args(self, preset):
+        """Encoder speed options for an x264 preset name (ultrafast ... veryslow)."""
+        return ["-preset", preset]
+
+    def rate_args(self, video_bitrate_kbps, quality=False, buffer_seconds=2.0):
+        """Average bitrate, or constant quality capped at video_bitrate_kbps."""
+        if quality:
+            return ["-crf", str(self.crf), "-maxrate", f"{video_bitrate_kbps}k",
+                    "-bufsize", f"{int(video_bitrate_kbps * buffer_seconds)}k"]
+        return ["-b:v", f"{video_bitrate_kbps}k"]
+
+    def stream_args(self, output_ext, pass_number=None, passlog_prefix=None):
+        """Options besides encoder, speed and rate: two-pass stats, container tags, logging."""
+        if pass_number is None:
+            return []
+        return ["-pass", str(pass_number), "-passlogfile", passlog_prefix]
+
+    def container_args(self, output_ext):
+        """Stream tags the container needs; also applied when chunks are joined with -c copy."""
+        return []
+
+    def encoder_args(self, preset, output_ext, pass_number=None, passlog_prefix=None):
+        """Everything codec-specific on the command line except the rate control."""
+        return (["-c:v", self.encoder] + self.speed_args(preset)
+                + self.stream_args(output_ext, pass_number, passlog_prefix))
+
+    def screen_args(self):
+        """Tuning for screen content: large flat areas, sharp text, motion vectors that repeat."""
+        return ["-tune", "animation"]
+
+    def audio_codec(self, output_ext):
+        """Audio encoder for the output container."""
+        return "libopus" if output_ext.lower() == ".webm" else "aac"
+
+
+class X265Backend(CodecBackend):
+    name = "hevc"
+    label = "H.265"
+    encoder = "libx265"
+    codec_name = "hevc"
+    crf = 28
+    efficiency = 0.6
+
+    def stream_args(self, output_ext, pass_number=None, passlog_prefix=None):
+        # libx265 ignores -pass/-passlogfile; stats are named like x264's so passlog finds them
+        params = "log-level=error"
+        if pass_number is not None:
+            params += f":pass={pass_number}:stats={passlog_prefix}-0.log"
+        return ["-x265-params", params] + self.container_args(output_ext)
+
+    def container_args(self, output_ext):
+        return ["-tag:v", "hvc1"] if output_ext.lower() in HVC1_EXTENSIONS else []
+
+
+class SvtAv1Backend(CodecBackend):
+    name = "av1"
+    label = "AV1"
+    encoder = "libsvtav1"
+    codec_name = "av1"
+    crf = 35
+    efficiency = 0.5
+    containers = (".mp4", ".mkv", ".webm")
+    supports_two_pass = False  # ffmpeg's libsvtav1 wrapper has no -pass support
+    moviepy = False
+    # SVT-AV1 presets run 0 (slowest) to 13; higher ones are what makes it fast
+    PRESETS = {"ultrafast": 12, "superfast": 11, "veryfast": 10, "faster": 9, "fast": 8,
+               "medium": 7, "slow": 6, "slower": 5, "veryslow": 4}
+
+    def speed_args(self, preset):
+        return ["-preset", str(self.PRESETS.get(preset, self.PRESETS["medium"]))]
+
+    def rate_args(self, video_bitrate_kbps, quality=False, buffer_seconds=2.0):
+        if quality:
+            # capped CRF, no VBV buffer option
+            return ["-crf", str(self.crf), "-maxrate", f"{video_bitrate_kbps}k"]
+        return ["-b:v", f"{video_bitrate_kbps}k"]
+
+    def screen_args(self):
+        # Screen content mode (palette and intra block copy tools)
+        return ["-svtav1-params", "scm=1"]
+
+
+class Vp9Backend(CodecBackend):
+    name = "vp9"
+    label = "VP9"
+    encoder = "libvpx-vp9"
+    codec_name = "vp9"
+    crf = 33
+    efficiency = 0.65
+    containers = (".webm", ".mkv", ".mp4")
+    moviepy = False
+    # libvpx "good" deadline speeds run 0 (slowest) to 5
+    CPU_USED = {"ultrafast": 5, "superfast": 5, "veryfast": 5, "faster": 4, "fast": 4,
+                "medium": 3, "slow": 2, "slower": 1, "veryslow": 0}
+
+    def speed_args(self, preset):
+        cpu_used = self.CPU_USED.get(preset, self.CPU_USED["medium"])
+        return ["-deadline", "good", "-cpu-used", str(cpu_used), "-row-mt", "1"]
+
+    def rate_args(self, video_bitrate_kbps, quality=False, buffer_seconds=2.0):
+        if quality:
+            # Constrained quality: with -crf, -b:v is the ceiling rather than the average
+            return ["-crf", str(self.crf), "-b:v", f"{video_bitrate_kbps}k",
+                    "-bufsize", f"{int(video_bitrate_kbps * buffer_seconds)}k"]
+        return ["-b:v", f"{video_bitrate_kbps}k"]
+
+    def screen_args(self):
+        return ["-tune-content", "screen"]
+
+
+BACKENDS = {backend.name: backend
+            for backend in (CodecBackend(), X265Backend(), SvtAv1Backend(), Vp9Backend())}
+DEFAULT_CODEC = "h264"
+
+
+def get_backend(name):
+    """
+    Look up a codec backend by its settings key.
+
+    Raises:
+        ValueError: If no backend has that name
+    """
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown codec '{name}'. Expected one of: {', '.join(BACKENDS)}") from None
+
+
+def probe_encoders(ffmpeg_path=None, cache_path=None):
+    """
+    Names of the codec backends the ffmpeg binary can actually encode with.
+
+    An encoder counts as available when the build lists it and a one-frame
+    test encode succeeds. The result is cached on disk, keyed by the binary's
+    path and mtime, so only the first start with a new ffmpeg pays for it.
+
+    Args:
+        ffmpeg_path: ffmpeg binary (the bundled one by default)
+        cache_path: JSON cache file (in the user data directory by default)
+
+    Returns:
+        List of backend names in BACKENDS order
+    """
+    ffmpeg_path = ffmpeg_path or get_ffmpeg_path()
+    cache_path = cache_path or os.path.join(get_user_data_dir(), "encoders.json")
+    try:
+        binary_key = [os.path.abspath(ffmpeg_path), os.stat(ffmpeg_path).st_mtime_ns]
+    except OSError:
+        binary_key = [ffmpeg_path, None]
+
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("binary") == binary_key:
+            return [name for name in BACKENDS if name in cached.get("available", [])]
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        result = subprocess.run([ffmpeg_path, "-hide_banner", "-encoders"], capture_output=True,
+                                text=True, errors="replace", timeout=PROBE_TIMEOUT_SECONDS)
+        listed = set(_ENCODER_RE.findall(result.stdout or ""))
+    except (subprocess.SubprocessError, OSError):
+        # Nothing known; the default encoder is the one the app always needed
+        return [DEFAULT_CODEC]
+    available = [name for name, backend in BACKENDS.items()
+                 if backend.encoder in listed and _test_encode(ffmpeg_path, backend)]
+
+    try:
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"binary": binary_key, "available": available}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    return available
+
+
+def available_backends(ffmpeg_path=None, cache_path=None):
+    """CodecBackend objects this machine can encode with (at least the default one)."""
+    names = probe_encoders(ffmpeg_path, cache_path) or [DEFAULT_CODEC]
+    return [BACKENDS[name] for name in names]
+
+
+def _test_encode(ffmpeg_path, backend):
+    """Encode one small frame to the null muxer; listed encoders can still fail to open."""
+    cmd = ([ffmpeg_path, "-hide_banner", "-nostdin", "-v", "error", "-f", "lavfi",
+            "-i", "color=s=128x128:d=0.1", "-frames:v", "1"]
+           + backend.encoder_args("ultrafast", ".mkv") + backend.rate_args(200)
+           + ["-pix_fmt", "yuv420p", "-f", "null", "-"])
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=PROBE_TIMEOUT_SECONDS)
+        return result.returncode == 0
+    except (subprocess.SubprocessError, OSError):
+        return False
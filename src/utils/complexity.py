@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+
+from colorama import Fore
+
+from utils.cancellation import CancellationToken
+from utils.ffmpeg_tools import get_ffmpeg_path, run_ffmpeg
+
+# Length of one point of the complexity curve
+SEGMENT_SECONDS = 5.0
+# The scan encodes a small, low frame rate copy at constant quality: its frame sizes
+# follow how hard each stretch is to encode, at a fraction of the real encode's cost
+SCAN_WIDTH = 320
+SCAN_FPS = 5
+SCAN_CRF = 30
+# The scan is abandoned (flat allocation) if it runs slower than this share of real time;
+# a real encode also has to decode every frame, so this bounds its share of the job
+SCAN_MAX_REALTIME = 0.25
+MIN_SCAN_SECONDS = 5
+# Bits in proportion to complexity, within these limits of the average (each chunk's
+# encoder still spreads its own share by complexity inside the chunk)
+ALLOCATION_EXPONENT = 1.0
+MIN_FACTOR = 0.25
+MAX_FACTOR = 4.0
+# Near-empty stretches still get a share, relative to the mean complexity
+COMPLEXITY_FLOOR = 0.02
+# Chunk length of split encodes with allocation: short enough to isolate a busy stretch
+ALLOCATION_CHUNK_SECONDS = 30
+
+
+class ComplexityCurve:
+    """
+    How hard an input is to encode over time, in scan bytes per second per SEGMENT_SECONDS.
+
+    Only relative values matter; the curve is stored with the probe data
+    (MediaInfo.complexity) so a file is scanned once.
+    """
+
+    def __init__(self, values, duration, segment_seconds=SEGMENT_SECONDS):
+        self.values = list(values)
+        self.duration = duration
+        self.segment_seconds = segment_seconds
+
+    def mean(self, start=0.0, end=None):
+        """Duration-weighted mean complexity over [start, end)."""
+        end = self.duration if end is None else min(end, self.duration)
+        total = weight = 0.0
+        for index, value in enumerate(self.values):
+            seg_start = index * self.segment_seconds
+            overlap = min(end, seg_start + self.segment_seconds) - max(start, seg_start)
+            if overlap > 0:
+                total += value * overlap
+                weight += overlap
+        return total / weight if weight else 0.0
+
+    def to_dict(self):
+        return {"values": self.values, "duration": self.duration,
+                "segment_seconds": self.segment_seconds}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["values"], data["duration"], data.get("segment_seconds", SEGMENT_SECONDS))
+
+
+def build_scan_command(input_path, output_path):
+    """ffmpeg command that writes per-frame sizes (framecrc) of a small constant-quality encode."""
+    return [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y",
+            # Cheaper decode; the fps filter fills the gaps
+            "-skip_frame", "noref", "-skip_loop_filter", "all",
+            "-i", input_path, "-map", "0:v:0", "-vf", f"fps={SCAN_FPS},scale={SCAN_WIDTH}:-2",
+            "-c:v", "libx264", "-preset", "ultrafast", "-crf", str(SCAN_CRF),
+            # Only the first frame is intra: sizes measure change
+            "-x264-params", "keyint=infinite:scenecut=0",
+            "-f", "framecrc", output_path]
+
+
+def parse_scan(text, duration, segment_seconds=SEGMENT_SECONDS):
+    """
+    Turn framecrc output of the scan into a complexity curve.
+
+    Args:
+        text: framecrc lines ("stream, dts, pts, duration, size, checksum")
+        duration: Input duration in seconds
+        segment_seconds: Curve resolution
+
+    Returns:
+        ComplexityCurve, or None if no frames were listed
+    """
+    segments = max(1, int(-(-duration // segment_seconds)))
+    totals = [0] * segments
+    frames = 0
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        fields = [field.strip() for field in line.split(",")]
+        try:
+            pts, size = int(fields[2]), int(fields[4])
+        except (IndexError, ValueError):
+            continue
+        frames += 1
+        if frames == 1:
+            continue  # The opening intra frame is not the content's fault
+        totals[min(int(pts / SCAN_FPS // segment_seconds), segments - 1)] += size
+    if frames < 2:
+        return None
+    lengths = [min(segment_seconds, duration - index * segment_seconds)
+               for index in range(segments)]
+    values = [total / max(length, 1e-3) for total, length in zip(totals, lengths)]
+    return ComplexityCurve(values, duration, segment_seconds)
+
+
+def scan_complexity(input_path, info, scratch_dir, cancel_token=None):
+    """
+    Run the low-resolution scan over an input.
+
+    Args:
+        input_path: Path to the media file
+        info: MediaInfo of the file
+        scratch_dir: Directory for the scan's output
+        cancel_token: Optional CancellationToken that stops the scan
+
+    Returns:
+        (ComplexityCurve or None, seconds spent); None when the scan failed,
+        was cancelled or ran over its time limit
+    """
+    if not info.duration:
+        return None, 0.0
+    output_path = os.path.join(scratch_dir, "complexity.framecrc")
+    token = CancellationToken(parent=cancel_token)
+    timer = threading.Timer(max(info.duration * SCAN_MAX_REALTIME, MIN_SCAN_SECONDS), token.cancel)
+    start_time = time.time()
+    timer.start()
+    try:
+        returncode, _ = run_ffmpeg(build_scan_command(input_path, output_path), cancel_token=token)
+    finally:
+        timer.cancel()
+    elapsed = time.time() - start_time
+    if returncode != 0 or token.cancelled:
+        return None, elapsed
+    try:
+        with open(output_path, encoding="utf-8", errors="replace") as scan:
+            return parse_scan(scan.read(), info.duration), elapsed
+    except OSError:
+        return None, elapsed
+
+
+def plan_complexity(input_path, info, scratch_dir, cancel_token=None, probe_cache=None):
+    """
+    Complexity curve of the input, for sharing the bit budget across the chunks of a split.
+
+    The curve comes from the probe data when the file was scanned before;
+    otherwise the scan runs now and is cached with the probe result.
+
+    Args:
+        input_path: Path to input video
+        info: MediaInfo of the input (its complexity is filled in)
+        scratch_dir: Directory for the scan's output
+        cancel_token: Optional CancellationToken that stops the scan
+        probe_cache: Optional ProbeCache the curve is stored in
+
+    Returns:
+        ComplexityCurve, or None if the scan failed or was cancelled
+    """
+    if info.complexity:
+        curve = ComplexityCurve.from_dict(info.complexity)
+        print(Fore.CYAN + f"📈 Complexity: {len(curve.values)} points of "
+                          f"{curve.segment_seconds:g}s (from the probe cache)")
+        return curve
+    curve, seconds = scan_complexity(input_path, info, scratch_dir, cancel_token)
+    if curve is None:
+        if cancel_token is None or not cancel_token.cancelled:
+            print(Fore.YELLOW + f"⚠️ Complexity scan failed or took over "
+                                f"{SCAN_MAX_REALTIME:.0%} of the duration; "
+                                f"chunks get equal bitrates")
+        return None
+    print(Fore.CYAN + f"📈 Complexity: {len(curve.values)} points of "
+                      f"{curve.segment_seconds:g}s, scanned in {seconds:.1f}s")
+    info.complexity = curve.to_dict()
+    if probe_cache is not None:
+        probe_cache.put(info)
+    return curve
+
+
+def allocate(curve, spans, exponent=ALLOCATION_EXPONENT, min_factor=MIN_FACTOR,
+             max_factor=MAX_FACTOR):
+    """
+    Bitrate multipliers for spans of an input, following its complexity.
+
+    The duration-weighted mean of the multipliers is 1, so encoding each span
+    at average_kbps * multiplier spends the same total as a flat bitrate.
+
+    Args:
+        curve: ComplexityCurve of the input
+        spans: (start, end) times in seconds, e.g. the chunks of a split encode
+        exponent: How strongly bits follow complexity (0 = flat, 1 = proportional)
+        min_factor: Smallest multiplier before the final normalization
+        max_factor: Largest multiplier before the final normalization
+
+    Returns:
+        List of multipliers, one per span
+    """
+    lengths = [max(end - start, 0.0) for start, end in spans]
+    total_length = sum(lengths)
+    overall = curve.mean()
+    if not total_length or overall <= 0:
+        return [1.0] * len(spans)
+    weights = [max(curve.mean(start, end), overall * COMPLEXITY_FLOOR) ** exponent
+               for start, end in spans]
+    mean_weight = sum(w * length for w, length in zip(weights, lengths)) / total_length
+    factors = [min(max(w / mean_weight, min_factor), max_factor) for w in weights]
+    # Clamping moved the mean; scale back so the total stays exactly on budget
+    mean_factor = sum(f * length for f, length in zip(factors, lengths)) / total_length
+    return [f / mean_factor for f in factors]
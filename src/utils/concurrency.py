@@ -0,0 +1,102 @@
+import os
+
+# x264 stops scaling past a few threads at low resolutions: (max output height, useful threads)
+THREAD_CAPS = ((480, 4), (720, 6), (1080, 8), (1440, 12))
+MAX_THREADS = 16
+# Assumed for files that have not been probed yet
+DEFAULT_HEIGHT = 1080
+# Clips this short are dominated by process start-up and probing, not encoding
+SHORT_CLIP_SECONDS = 30
+
+
+def useful_threads(height=None, duration=None):
+    """
+    Most encoder threads a single job can keep busy.
+
+    Args:
+        height: Output height in pixels (DEFAULT_HEIGHT if unknown)
+        duration: Duration in seconds, if known
+
+    Returns:
+        Thread count
+    """
+    height = height or DEFAULT_HEIGHT
+    threads = MAX_THREADS
+    for max_height, cap in THREAD_CAPS:
+        if height <= max_height:
+            threads = cap
+            break
+    if duration and duration < SHORT_CLIP_SECONDS:
+        threads = max(2, threads // 2)
+    return threads
+
+
+def plan_threads(height=None, duration=None, cpu_count=None):
+    """Encoder threads for a job that has the machine to itself."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(1, min(useful_threads(height, duration), cpu_count))
+
+
+class ConcurrencyPlanner:
+    """
+    Splits the machine's cores between concurrent jobs and encoder threads per job.
+
+    The worker count is chosen so that the useful thread counts of the queued
+    files add up to the core count; each job then gets its share of the cores
+    at submission time, capped at what its resolution can use. Once fewer
+    files remain than workers, the freed cores go to the remaining jobs.
+    """
+
+    def __init__(self, cpu_count=None, max_workers=None):
+        """
+        Args:
+            cpu_count: Cores to plan for (os.cpu_count() by default)
+            max_workers: Fixed worker count chosen by the user, None for automatic
+        """
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.max_workers = max_workers
+
+    def plan_workers(self, jobs):
+        """
+        Number of jobs to run at once.
+
+        Args:
+            jobs: List of (height, duration) tuples, None values for unknown
+
+        Returns:
+            Worker count between 1 and len(jobs)
+        """
+        if not jobs:
+            return 1
+        if self.max_workers:
+            return max(1, min(self.max_workers, len(jobs)))
+        average = sum(useful_threads(height, duration) for height, duration in jobs) / len(jobs)
+        return max(1, min(round(self.cpu_count / average), len(jobs)))
+
+    def core_share(self, workers, jobs_left):
+        """
+        Cores available to one job while the others run.
+
+        Args:
+            workers: Worker count from plan_workers()
+            jobs_left: Jobs running or queued, including this one
+
+        Returns:
+            Core count
+        """
+        return max(1, self.cpu_count // max(1, min(workers, jobs_left)))
+
+    def threads_for(self, height, duration, workers, jobs_left):
+        """
+        Encoder threads for a job about to be submitted.
+
+        Args:
+            height: Output height of the job (None if unknown)
+            duration: Duration of the job in seconds (None if unknown)
+            workers: Worker count from plan_workers()
+            jobs_left: Jobs running or queued, including this one
+
+        Returns:
+            Thread count
+        """
+        return max(1, min(useful_threads(height, duration), self.core_share(workers, jobs_left)))
@@ -0,0 +1,36 @@
+# Encoding engines
+ENGINE_MOVIEPY = "moviepy"  # Decode frames in Python, pipe them back to ffmpeg
+ENGINE_FFMPEG = "ffmpeg"    # Single native ffmpeg process (decode + scale + encode)
+ENGINES = (ENGINE_MOVIEPY, ENGINE_FFMPEG)
+
+# Rate control modes
+RATE_ABR = "abr"            # Single-pass average bitrate
+RATE_TWO_PASS = "two_pass"  # Analysis pass + encode pass (ffmpeg engine only)
+RATE_QUALITY = "quality"    # Single-pass constant quality under a bitrate ceiling
+RATE_CONTROLS = (RATE_ABR, RATE_TWO_PASS, RATE_QUALITY)
+
+# Outcome of the last compress_video() call (VideoCompressor.last_status)
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+STATUS_TIMEOUT = "timeout"
+
+# Share of the size budget held back for container overhead and rate-control overshoot
+SIZE_MARGIN = 0.05
+# Outputs up to this factor over the target are accepted; larger ones are re-encoded
+SIZE_TOLERANCE = 1.1
+# ffmpeg encodes never ask for less video bitrate than this, first attempt and retargets alike
+MIN_RETARGET_KBPS = 100
+# MoviePy encodes keep a higher floor for quality
+MOVIEPY_MIN_VIDEO_KBPS = 400
+MIN_VIDEO_KBPS = {ENGINE_FFMPEG: MIN_RETARGET_KBPS, ENGINE_MOVIEPY: MOVIEPY_MIN_VIDEO_KBPS}
+
+# Screen content profile: a lower frame rate ceiling and longer GOPs (most frames only move
+# a cursor or a line of text), and fewer bits per pixel before downscaling, since flat UI
+# compresses far better than film and downscaled text stops being readable
+SCREEN_MAX_FPS = 15
+SCREEN_KEYFRAME_SECONDS = 20
+SCREEN_BPP_FACTOR = 0.5
+
+# Containers that understand the MP4 "faststart" flag
+FASTSTART_EXTENSIONS = (".mp4", ".mov", ".m4v")
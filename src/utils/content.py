@@ -0,0 +1,138 @@
+import time
+
+import numpy as np
+from colorama import Fore
+
+from utils.constants import SCREEN_KEYFRAME_SECONDS, SCREEN_MAX_FPS
+from utils.frame_sampler import grab_frames, sample_times
+
+SCREEN = "screen"   # Screen recordings, slides, UI and other synthetic content
+CAMERA = "camera"   # Everything filmed (or rendered like film)
+
+# Frames are analysed small: the statistics need structure, not detail
+ANALYSIS_WIDTH = 320
+SAMPLE_POINTS = 8
+# Consecutive frames decoded at each sample point, for the inter-frame difference
+BURST_FRAMES = 3
+# A luma step this large between neighbouring pixels is an edge (text, UI borders)
+EDGE_STEP = 48
+# Screen content: few distinct colors (15-bit) per analysis frame...
+SCREEN_MAX_COLORS = 768
+# ...and either mostly still frames (mean luma change per pixel) or dense sharp edges
+SCREEN_MAX_MOTION = 1.0
+SCREEN_MIN_EDGE_DENSITY = 0.05
+
+_LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class ContentStats:
+    """Statistics of frames sampled across an input, and the content class they suggest."""
+
+    def __init__(self, motion, edge_density, colors, frames, seconds=0.0):
+        self.motion = motion              # Mean absolute luma change between frames (0-255)
+        self.edge_density = edge_density  # Share of pixels on a sharp luma edge
+        self.colors = colors              # Mean number of distinct 15-bit colors per frame
+        self.frames = frames              # Frames analysed
+        self.seconds = seconds            # Time spent sampling and analysing
+
+    @property
+    def kind(self):
+        """SCREEN or CAMERA."""
+        if self.colors <= SCREEN_MAX_COLORS and (self.motion <= SCREEN_MAX_MOTION
+                                                 or self.edge_density >= SCREEN_MIN_EDGE_DENSITY):
+            return SCREEN
+        return CAMERA
+
+    @property
+    def is_screen(self):
+        return self.kind == SCREEN
+
+    def describe(self):
+        return f"motion {self.motion:.2f}, edges {self.edge_density:.1%}, {self.colors:.0f} colors"
+
+
+def frame_statistics(bursts):
+    """
+    Measure motion, edge density and color count of sampled frames.
+
+    Args:
+        bursts: Arrays of consecutive RGB frames, shape (frames, height, width, 3),
+            one per sample point; all of the same frame size
+
+    Returns:
+        ContentStats, or None without any frames
+    """
+    bursts = [burst for burst in bursts if burst is not None and len(burst)]
+    if not bursts:
+        return None
+    frames = np.concatenate(bursts)
+    luma = frames.astype(np.float32) @ _LUMA_WEIGHTS
+
+    # Differences only within a burst: frames of different sample points are unrelated
+    burst_lumas = np.split(luma, np.cumsum([len(burst) for burst in bursts])[:-1])
+    changes = [np.abs(np.diff(burst_luma, axis=0)).mean(axis=(1, 2))
+               for burst_luma in burst_lumas if len(burst_luma) > 1]
+    motion = float(np.concatenate(changes).mean()) if changes else 0.0
+
+    step_x = np.abs(np.diff(luma, axis=2))[:, :-1, :]
+    step_y = np.abs(np.diff(luma, axis=1))[:, :, :-1]
+    edge_density = float((np.maximum(step_x, step_y) > EDGE_STEP).mean())
+
+    quantized = (frames >> 3).astype(np.int32)
+    packed = (quantized[..., 0] << 10) | (quantized[..., 1] << 5) | quantized[..., 2]
+    colors = float(np.mean([np.unique(frame).size for frame in packed]))
+    return ContentStats(motion, edge_density, colors, len(frames))
+
+
+def classify_content(input_path, info, crop=None, points=SAMPLE_POINTS):
+    """
+    Sample short bursts of small frames across an input and classify its content.
+
+    Args:
+        input_path: Path to the media file
+        info: MediaInfo of the file
+        crop: Optional (width, height, x, y) the encode will crop to; only that area is analysed
+        points: Number of sample points
+
+    Returns:
+        ContentStats, or None if no frames could be decoded
+    """
+    width, height = (crop[0], crop[1]) if crop else (info.width, info.height)
+    if not width or not height:
+        return None
+    start_time = time.time()
+    analysis_width = min(ANALYSIS_WIDTH, width)
+    analysis_height = max(2, round(height * analysis_width / width / 2) * 2)
+    bursts = [grab_frames(input_path, timestamp, analysis_width, analysis_height, "rgb24",
+                          count=BURST_FRAMES, crop=crop)
+              for timestamp in sample_times(info.duration, points)]
+    stats = frame_statistics(bursts)
+    if stats is not None:
+        stats.seconds = time.time() - start_time
+    return stats
+
+
+def plan_content(input_path, info, crop=None, codec_label="H.264"):
+    """
+    Classify the input as screen or camera content from short bursts of sampled frames.
+
+    Args:
+        input_path: Path to input video
+        info: MediaInfo of the input
+        crop: Optional crop of the encode (from plan_crop()); only that area is analysed
+        codec_label: Name of the codec in the report of the screen profile
+
+    Returns:
+        ContentStats, or None if no frames decoded
+    """
+    stats = classify_content(input_path, info, crop=crop)
+    if stats is None:
+        return None
+    if stats.is_screen:
+        print(Fore.CYAN + f"🖥️ Content: screen ({stats.describe()}; {stats.frames} frames in "
+                          f"{stats.seconds:.1f}s) → {codec_label} screen tune, "
+                          f"{SCREEN_KEYFRAME_SECONDS}s GOP, at most {SCREEN_MAX_FPS} fps")
+    else:
+        print(Fore.CYAN + f"🎥 Content: camera ({stats.describe()}; {stats.frames} frames in "
+                          f"{stats.seconds:.1f}s)")
+    return stats
@@ -0,0 +1,105 @@
+import time
+
+import numpy as np
+from colorama import Fore
+
+from utils.frame_sampler import sample_frames
+
+# Luma at or below this counts as black (video black is 16; compression noise lifts it a little)
+BLACK_LEVEL = 24
+# A row or column is picture once this share of its pixels is brighter than black
+ACTIVE_PIXEL_SHARE = 0.02
+# Cropped sizes are rounded up to this multiple (macroblock-friendly), never cutting into the
+# picture
+CROP_ALIGN = 16
+# Crops that remove less than this share of the frame are not worth a filter
+MIN_CROP_SAVING = 0.05
+
+
+def active_box(frame, black_level=BLACK_LEVEL):
+    """
+    Bounding box of the non-black area of one luma frame.
+
+    Args:
+        frame: 2-D uint8 luma array
+        black_level: Brightest value still treated as black
+
+    Returns:
+        (left, top, right, bottom) with right/bottom exclusive, or None for an all-black frame
+    """
+    bright = frame > black_level
+    rows = np.flatnonzero(bright.mean(axis=1) > ACTIVE_PIXEL_SHARE)
+    cols = np.flatnonzero(bright.mean(axis=0) > ACTIVE_PIXEL_SHARE)
+    if rows.size == 0 or cols.size == 0:
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def detect_crop(frames, width, height, align=CROP_ALIGN, min_saving=MIN_CROP_SAVING):
+    """
+    Find the area that holds picture in any of the sampled frames.
+
+    The union of the per-frame boxes is used, so content that only
+    occasionally reaches an edge is never cut off; all-black frames (fades)
+    are ignored.
+
+    Args:
+        frames: Luma frames (2-D uint8 arrays) at the display size
+        width: Display width
+        height: Display height
+        align: Multiple the cropped width and height are rounded up to
+        min_saving: Smallest share of the frame a crop must remove
+
+    Returns:
+        (crop_width, crop_height, x, y) for ffmpeg's crop filter, or None to keep the full frame
+    """
+    boxes = [box for box in (active_box(frame) for frame in frames) if box is not None]
+    if not boxes:
+        return None
+    left = min(box[0] for box in boxes)
+    top = min(box[1] for box in boxes)
+    right = max(box[2] for box in boxes)
+    bottom = max(box[3] for box in boxes)
+
+    x, crop_width = _align_span(left, right, width, align)
+    y, crop_height = _align_span(top, bottom, height, align)
+    if crop_width * crop_height > width * height * (1 - min_saving):
+        return None
+    return crop_width, crop_height, x, y
+
+
+def plan_crop(input_path, info):
+    """
+    Find black bars or dead canvas around the picture and report the crop.
+
+    Frames are sampled with one seek each, so the analysis takes seconds
+    whatever the input's length.
+
+    Args:
+        input_path: Path to input video
+        info: MediaInfo of the input
+
+    Returns:
+        (width, height, x, y) of the crop, or None to keep the full frame
+    """
+    if not info.width or not info.height:
+        return None
+    start_time = time.time()
+    frames = [frame for _, frame in sample_frames(input_path, info)]
+    crop = detect_crop(frames, info.width, info.height)
+    if crop is None:
+        return None
+    width, height, x, y = crop
+    saved = 1 - (width * height) / (info.width * info.height)
+    print(Fore.CYAN + f"✂️ Crop: {info.width}x{info.height} → {width}x{height} at ({x},{y}), "
+                      f"{saved:.0%} fewer pixels ({len(frames)} frames analysed in "
+                      f"{time.time() - start_time:.1f}s)")
+    return crop
+
+
+def _align_span(start, end, limit, align):
+    """Grow [start, end) to a multiple of align (even at the frame edge), within [0, limit)."""
+    size = min(-(-(end - start) // align) * align, limit - limit % 2)
+    offset = start - (size - (end - start)) // 2  # Grow on both sides
+    offset = max(0, min(offset, limit - size))
+    return offset - offset % 2, size
@@ -0,0 +1,47 @@
+from utils.constants import MIN_RETARGET_KBPS
+
+
+class EncodePlan:
+    """
+    Bit budget and settings of one output of a file.
+
+    video_kbps and output_size start from the target size and move as the plan
+    is corrected: from sample encodes or earlier files before the encode, and
+    after an output overshoots its target.
+    """
+
+    def __init__(self, output_path, total_kbps, audio_plan, video_kbps, output_size=None,
+                 fps_cap=None):
+        self.output_path = output_path
+        self.total_kbps = total_kbps    # Whole bit budget of the output (audio included)
+        self.audio_plan = audio_plan
+        self.video_kbps = video_kbps    # Requested video bitrate (the ceiling in quality mode)
+        self.output_size = output_size  # (width, height) to scale to, None for the source size
+        self.fps_cap = fps_cap
+        self.prediction = None          # SizePrediction from sample encodes, if any
+        self.predicted_mb = None
+        self.predicted_seconds = None
+
+    def expect(self, prediction, video_kbps, duration):
+        """Keep what sample encodes predict for the full encode at video_kbps."""
+        self.prediction = prediction
+        audio_bytes = self.audio_plan.bitrate_kbps * 1000 / 8 * duration
+        self.predicted_mb = (prediction.predicted_video_bytes(video_kbps, duration)
+                             + audio_bytes) / (1024 * 1024)
+        self.predicted_seconds = prediction.predicted_seconds(duration) or 0
+
+    def retarget_kbps(self, video_kbps, actual_kbps, min_kbps=MIN_RETARGET_KBPS):
+        """
+        Bitrate for a re-encode of an output that came out at actual_kbps for video_kbps.
+
+        Assumes the encoder keeps overshooting by the same factor at a lower
+        bitrate, and aims for the video bitrate that fills the budget exactly.
+
+        Returns:
+            The new bitrate (at least min_kbps), or None if it would not be lower
+        """
+        if actual_kbps <= 0:
+            return None
+        budget_kbps = max(self.total_kbps - self.audio_plan.bitrate_kbps, min_kbps)
+        retarget_kbps = max(int(budget_kbps * video_kbps / actual_kbps), min_kbps)
+        return retarget_kbps if retarget_kbps < video_kbps else None
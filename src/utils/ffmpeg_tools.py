@@ -0,0 +1,170 @@
+import collections
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+# How often a running ffmpeg is checked for cancellation
+POLL_INTERVAL_SECONDS = 0.1
+
+try:
+    import imageio_ffmpeg
+except ImportError:
+    imageio_ffmpeg = None
+
+
+def get_ffmpeg_path():
+    """
+    Locate the ffmpeg binary.
+
+    Prefers the binary bundled with imageio-ffmpeg (the same one MoviePy uses),
+    so both engines run the exact same ffmpeg build. Falls back to PATH.
+    """
+    if imageio_ffmpeg is not None:
+        try:
+            return imageio_ffmpeg.get_ffmpeg_exe()
+        except Exception:
+            pass
+    return shutil.which("ffmpeg") or "ffmpeg"
+
+
+def get_ffprobe_path():
+    """
+    Locate the ffprobe binary.
+
+    Checks PATH first, then looks next to the ffmpeg binary.
+    """
+    found = shutil.which("ffprobe")
+    if found:
+        return found
+
+    ffmpeg_dir = os.path.dirname(get_ffmpeg_path())
+    for name in ("ffprobe.exe", "ffprobe"):
+        candidate = os.path.join(ffmpeg_dir, name)
+        if ffmpeg_dir and os.path.isfile(candidate):
+            return candidate
+    return "ffprobe"
+
+
+def parse_progress(block):
+    """
+    Convert one ``-progress`` block (key=value pairs) into typed values.
+
+    Args:
+        block: Dict of raw strings as printed by ffmpeg
+
+    Returns:
+        Dict with out_time (seconds), fps, speed (x realtime), total_size
+        (bytes) and done (True on the final block); unknown values are None
+    """
+    def number(key, cast=float):
+        value = (block.get(key) or "").strip().rstrip("x")
+        try:
+            return cast(value)
+        except ValueError:
+            return None
+
+    out_time_us = number("out_time_us", int)
+    if out_time_us is None:
+        out_time_us = number("out_time_ms", int)  # microseconds as well, despite the name
+    return {
+        "out_time": max(out_time_us, 0) / 1000000 if out_time_us is not None else None,
+        "fps": number("fps"),
+        "speed": number("speed"),
+        "total_size": number("total_size", int),
+        "done": block.get("progress") == "end",
+    }
+
+
+def _read_progress(stream, on_progress):
+    block = {}
+    for line in stream:
+        key, _, value = line.strip().partition("=")
+        if not key:
+            continue
+        block[key] = value
+        if key == "progress":
+            try:
+                on_progress(parse_progress(block))
+            except Exception:
+                pass  # A faulty listener must never stall the encoder's stdout
+            block = {}
+
+
+def _drain_stderr(stream, tail):
+    for line in stream:
+        line = line.rstrip()
+        if line:
+            tail.append(line)
+
+
+def _kill(process):
+    """Kill an ffmpeg process (it spawns no children of its own) and reap it."""
+    try:
+        process.kill()
+        process.wait(timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        pass
+
+
+def run_ffmpeg(cmd, on_progress=None, cancel_token=None, watchdog=None):
+    """
+    Run an ffmpeg command line to completion.
+
+    ffmpeg reports machine-readable progress (``-progress pipe:1``) which a
+    reader thread parses while a second thread drains stderr, so neither
+    pipe can fill up and block the encoder.
+
+    Args:
+        cmd: Full argument list, starting with the ffmpeg binary
+        on_progress: Optional callable receiving parse_progress() dicts
+                     (about twice a second, from the reader thread)
+        cancel_token: Optional CancellationToken; ffmpeg is killed within
+                      POLL_INTERVAL_SECONDS once it is cancelled
+        watchdog: Optional StallWatchdog fed with the progress; ffmpeg is
+                  killed once it reports a stall (check watchdog.stalled)
+
+    Returns:
+        Tuple of (returncode, stderr_tail) where stderr_tail holds the last
+        lines ffmpeg printed (useful for error messages)
+    """
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats"] + list(cmd[1:])
+    process = subprocess.Popen(
+        cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, errors="replace"
+    )
+    tail = collections.deque(maxlen=10)
+
+    def handle_progress(stats):
+        if watchdog is not None:
+            watchdog.observe(stats)
+        if on_progress is not None:
+            on_progress(stats)
+
+    readers = [
+        threading.Thread(target=_read_progress, args=(process.stdout, handle_progress),
+                         daemon=True),
+        threading.Thread(target=_drain_stderr, args=(process.stderr, tail), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    try:
+        while process.poll() is None:
+            if cancel_token is not None and cancel_token.cancelled:
+                _kill(process)
+                break
+            if watchdog is not None and watchdog.expired():
+                _kill(process)
+                break
+            time.sleep(POLL_INTERVAL_SECONDS)
+    except BaseException:
+        # Never leave an orphaned encoder behind (KeyboardInterrupt, worker shutdown)
+        _kill(process)
+        raise
+    returncode = process.wait()
+    for reader in readers:
+        reader.join()
+    process.stdout.close()
+    process.stderr.close()
+    return returncode, "\n".join(tail)
@@ -0,0 +1,115 @@
+import subprocess
+
+import numpy as np
+
+from utils.ffmpeg_tools import get_ffmpeg_path
+
+DEFAULT_SAMPLE_COUNT = 8
+# The first and last few percent are often title cards, fades or a black frame
+EDGE_MARGIN = 0.05
+# One seek and one decoded frame; anything slower means a broken file
+FRAME_TIMEOUT_SECONDS = 20
+CHANNELS = {"gray": 1, "rgb24": 3}
+
+
+def sample_times(duration, count=DEFAULT_SAMPLE_COUNT):
+    """
+    Timestamps spread evenly across an input, away from its very start and end.
+
+    Args:
+        duration: Input duration in seconds
+        count: Number of timestamps
+
+    Returns:
+        List of timestamps in seconds, empty if the duration is unknown
+    """
+    if not duration or duration <= 0 or count < 1:
+        return []
+    start, end = duration * EDGE_MARGIN, duration * (1 - EDGE_MARGIN)
+    if count == 1:
+        return [(start + end) / 2]
+    return [start + (end - start) * i / (count - 1) for i in range(count)]
+
+
+def grab_frame(input_path, timestamp, width, height, pix_fmt="gray"):
+    """
+    Decode the single frame at a timestamp with a fast (keyframe) seek.
+
+    Args:
+        input_path: Path to the media file
+        timestamp: Position in seconds
+        width: Frame width to decode at (the display width, or a smaller size to scale to)
+        height: Frame height to decode at
+        pix_fmt: "gray" (luma only) or "rgb24"
+
+    Returns:
+        uint8 array of shape (height, width) for gray or (height, width, 3) for rgb24,
+        or None if no frame could be decoded there
+    """
+    frames = grab_frames(input_path, timestamp, width, height, pix_fmt)
+    return frames[0] if frames is not None else None
+
+
+def grab_frames(input_path, timestamp, width, height, pix_fmt="gray", count=1, crop=None):
+    """
+    Decode consecutive frames from a timestamp on, in one ffmpeg run.
+
+    Args:
+        input_path: Path to the media file
+        timestamp: Position in seconds
+        width: Frame width to decode at (after cropping)
+        height: Frame height to decode at
+        pix_fmt: "gray" (luma only) or "rgb24"
+        count: Number of consecutive frames
+        crop: Optional (width, height, x, y) to crop the display frame to before scaling
+
+    Returns:
+        uint8 array of shape (frames, height, width[, 3]) holding the frames that decoded
+        (fewer than count near the end), or None if none did
+    """
+    channels = CHANNELS[pix_fmt]
+    video_filter = f"scale={width}:{height}"
+    if crop:
+        video_filter = "crop={}:{}:{}:{},".format(*crop) + video_filter
+    cmd = [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-v", "error",
+           "-ss", f"{timestamp:.3f}", "-i", input_path,
+           "-map", "0:v:0", "-frames:v", str(count), "-vf", video_filter,
+           "-f", "rawvideo", "-pix_fmt", pix_fmt, "pipe:1"]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=FRAME_TIMEOUT_SECONDS * count)
+    except (subprocess.SubprocessError, OSError):
+        return None
+    frame_bytes = width * height * channels
+    decoded = min(len(result.stdout) // frame_bytes, count)
+    if result.returncode != 0 or decoded == 0:
+        return None
+    frames = np.frombuffer(result.stdout[:decoded * frame_bytes], dtype=np.uint8)
+    shape = (decoded, height, width) if channels == 1 else (decoded, height, width, channels)
+    return frames.reshape(shape)
+
+
+def sample_frames(input_path, info, count=DEFAULT_SAMPLE_COUNT, pix_fmt="gray", size=None):
+    """
+    Decode frames spread across an input, one seek each, for content analysis.
+
+    Costs one short ffmpeg run per frame, independent of the input's length.
+
+    Args:
+        input_path: Path to the media file
+        info: MediaInfo of the file
+        count: Number of frames
+        pix_fmt: "gray" or "rgb24"
+        size: (width, height) to scale the frames to, None for the display size
+
+    Returns:
+        List of (timestamp, frame) tuples for the frames that decoded
+    """
+    width, height = size or (info.width, info.height)
+    if not width or not height:
+        return []
+    frames = []
+    for timestamp in sample_times(info.duration, count):
+        frame = grab_frame(input_path, timestamp, width, height, pix_fmt)
+        if frame is not None:
+            frames.append((timestamp, frame))
+    return frames
@@ -0,0 +1,343 @@
+import json
+import os
+import re
+import subprocess
+
+from utils.ffmpeg_tools import get_ffmpeg_path, get_ffprobe_path
+
+PROBE_TIMEOUT_SECONDS = 10
+# Packets read from the start of the file to estimate keyframe spacing (demux only, no decode)
+KEYFRAME_SCAN_SECONDS = 20
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_rate(value):
+    """Parse an ffprobe rate such as '30000/1001' into frames per second."""
+    if not value:
+        return None
+    if "/" in str(value):
+        num, den = str(value).split("/", 1)
+        num, den = _to_float(num), _to_float(den)
+        if not num or not den:
+            return None
+        return num / den
+    return _to_float(value)
+
+
+class StreamInfo:
+    """Metadata for a single stream inside a media file."""
+
+    def __init__(self, index, codec_type, codec_name=None, bit_rate=None, width=None, height=None,
+                 fps=None, rotation=0, channels=None, sample_rate=None):
+        self.index = index
+        self.codec_type = codec_type
+        self.codec_name = codec_name
+        self.bit_rate = bit_rate        # bits per second, None if the container does not say
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.rotation = rotation        # degrees, as stored in the display matrix
+        self.channels = channels
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_ffprobe(cls, data):
+        rotation = 0
+        for side_data in data.get("side_data_list") or []:
+            if "rotation" in side_data:
+                rotation = _to_int(side_data.get("rotation")) or 0
+        if not rotation:
+            rotation = _to_int((data.get("tags") or {}).get("rotate")) or 0
+
+        fps = _parse_rate(data.get("avg_frame_rate")) or _parse_rate(data.get("r_frame_rate"))
+        return cls(
+            index=_to_int(data.get("index")),
+            codec_type=data.get("codec_type"),
+            codec_name=data.get("codec_name"),
+            bit_rate=_to_int(data.get("bit_rate")),
+            width=_to_int(data.get("width")),
+            height=_to_int(data.get("height")),
+            fps=fps if data.get("codec_type") == "video" else None,
+            rotation=rotation,
+            channels=_to_int(data.get("channels")),
+            sample_rate=_to_int(data.get("sample_rate")),
+        )
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class MediaInfo:
+    """
+    Everything the compressor needs to know about an input, gathered by one probe.
+
+    Built from a single ``ffprobe -show_streams -show_format -of json`` call
+    (which also reads the first packets for keyframe hints). When ffprobe is
+    not available, ``ffmpeg -i`` output is parsed instead (``source="ffmpeg"``).
+    """
+
+    def __init__(self, path, size_bytes=None, duration=None, format_name=None, bit_rate=None,
+                 streams=None, keyframe_times=None, source="ffprobe", complexity=None):
+        self.path = path
+        self.size_bytes = size_bytes
+        self.duration = duration          # seconds
+        self.format_name = format_name
+        self.bit_rate = bit_rate          # overall bits per second
+        self.streams = streams or []
+        self.keyframe_times = keyframe_times or []  # video keyframes in the scanned window
+        self.source = source
+        self.complexity = complexity      # ComplexityCurve.to_dict() once scanned (cached)
+
+    # --- Streams ---
+
+    @property
+    def video_streams(self):
+        return [s for s in self.streams if s.codec_type == "video"]
+
+    @property
+    def audio_streams(self):
+        return [s for s in self.streams if s.codec_type == "audio"]
+
+    @property
+    def video(self):
+        streams = self.video_streams
+        return streams[0] if streams else None
+
+    @property
+    def has_audio(self):
+        return bool(self.audio_streams)
+
+    # --- Video shortcuts ---
+
+    @property
+    def video_codec(self):
+        return self.video.codec_name if self.video else None
+
+    @property
+    def audio_codec(self):
+        return self.audio_streams[0].codec_name if self.audio_streams else None
+
+    @property
+    def rotation(self):
+        return self.video.rotation if self.video else 0
+
+    @property
+    def width(self):
+        """Display width (after rotation)."""
+        if not self.video:
+            return None
+        return self.video.height if abs(self.rotation) % 180 == 90 else self.video.width
+
+    @property
+    def height(self):
+        """Display height (after rotation)."""
+        if not self.video:
+            return None
+        return self.video.width if abs(self.rotation) % 180 == 90 else self.video.height
+
+    @property
+    def fps(self):
+        return self.video.fps if self.video else None
+
+    @property
+    def audio_channels(self):
+        return self.audio_streams[0].channels if self.audio_streams else None
+
+    @property
+    def video_bit_rate(self):
+        """Video bitrate in bits per second, from the container when the stream does not say."""
+        if not self.video:
+            return None
+        if self.video.bit_rate:
+            return self.video.bit_rate
+        total = self.bit_rate
+        if not total and self.size_bytes and self.duration:
+            total = int(self.size_bytes * 8 / self.duration)
+        if not total:
+            return None
+        audio = sum(s.bit_rate or 0 for s in self.audio_streams)
+        return max(total - audio, 0) or None
+
+    @property
+    def keyframe_interval(self):
+        """Average keyframe spacing in seconds from the scanned window, None if unknown."""
+        times = sorted(self.keyframe_times)
+        if len(times) < 2:
+            return None
+        return (times[-1] - times[0]) / (len(times) - 1)
+
+    # --- Serialization ---
+
+    def to_dict(self):
+        data = dict(self.__dict__)
+        data["streams"] = [s.to_dict() for s in self.streams]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data["streams"] = [StreamInfo.from_dict(s) for s in data.get("streams") or []]
+        return cls(**data)
+
+    @classmethod
+    def from_clip(cls, path, clip, size_bytes=None):
+        """Minimal info from an already opened MoviePy clip (last-resort fallback)."""
+        width, height = (list(getattr(clip, "size", None) or []) + [None, None])[:2]
+        streams = [StreamInfo(0, "video", width=_to_int(width), height=_to_int(height),
+                              fps=_to_float(getattr(clip, "fps", None)))]
+        return cls(path, size_bytes=size_bytes, duration=_to_float(clip.duration), streams=streams,
+                   source="moviepy")
+
+
+def probe_media(path):
+    """
+    Probe a media file once.
+
+    Args:
+        path: Path to the media file
+
+    Returns:
+        MediaInfo, or None if neither ffprobe nor ffmpeg could read the file
+    """
+    info = _probe_with_ffprobe(path)
+    if info is None:
+        info = _probe_with_ffmpeg(path)
+    return info
+
+
+def _probe_with_ffprobe(path):
+    cmd = [
+        get_ffprobe_path(), "-v", "error",
+        "-show_format", "-show_streams",
+        "-show_entries", "packet=stream_index,pts_time,flags",
+        "-read_intervals", f"%+{KEYFRAME_SCAN_SECONDS}",
+        "-of", "json", path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, errors="replace",
+                                timeout=PROBE_TIMEOUT_SECONDS)
+        if result.returncode != 0:
+            return None
+        data = json.loads(result.stdout)
+    except (subprocess.TimeoutExpired, subprocess.SubprocessError, OSError, ValueError):
+        return None
+
+    fmt = data.get("format") or {}
+    streams = [StreamInfo.from_ffprobe(s) for s in data.get("streams") or []]
+    video_indexes = {s.index for s in streams if s.codec_type == "video"}
+    first_video = min(video_indexes) if video_indexes else None
+    keyframe_times = [
+        t for t in (
+            _to_float(p.get("pts_time")) for p in data.get("packets") or []
+            if p.get("stream_index") == first_video and "K" in (p.get("flags") or "")
+        ) if t is not None
+    ]
+
+    try:
+        size_bytes = _to_int(fmt.get("size")) or os.path.getsize(path)
+    except OSError:
+        size_bytes = None
+
+    return MediaInfo(
+        path,
+        size_bytes=size_bytes,
+        duration=_to_float(fmt.get("duration")),
+        format_name=fmt.get("format_name"),
+        bit_rate=_to_int(fmt.get("bit_rate")),
+        streams=streams,
+        keyframe_times=keyframe_times,
+        source="ffprobe",
+    )
+
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_BITRATE_RE = re.compile(r"bitrate:\s*(\d+)\s*kb/s")
+_INPUT_RE = re.compile(r"Input #0,\s*([^,]+(?:,[^,\s]+)*),\s*from")
+_STREAM_RE = re.compile(
+    r"Stream #0:(\d+)[^:]*:\s*(Video|Audio|Data|Subtitle|Attachment):\s*(\w+)(.*)")
+_ROTATION_RE = re.compile(r"(?:rotation of\s*(-?[\d.]+)\s*degrees|rotate\s*:\s*(-?\d+))")
+_CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2, "2.1": 3, "quad": 4,
+                    "5.0": 5, "5.1": 6, "6.1": 7, "7.1": 8}
+
+
+def _probe_with_ffmpeg(path):
+    """Fallback when ffprobe is missing: parse the stream summary ``ffmpeg -i`` prints."""
+    try:
+        result = subprocess.run(
+            [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-i", path],
+            capture_output=True, text=True, errors="replace", timeout=PROBE_TIMEOUT_SECONDS
+        )
+    except (subprocess.TimeoutExpired, subprocess.SubprocessError, OSError):
+        return None
+
+    output = result.stderr or ""
+    if "Invalid data" in output or "No such file" in output:
+        return None
+
+    duration = None
+    match = _DURATION_RE.search(output)
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    match = _BITRATE_RE.search(output)
+    bit_rate = int(match.group(1)) * 1000 if match else None
+    match = _INPUT_RE.search(output)
+    format_name = match.group(1) if match else None
+
+    streams = []
+    for line in output.splitlines():
+        match = _STREAM_RE.search(line)
+        if match:
+            index, kind, codec, details = match.groups()
+            stream = StreamInfo(int(index), kind.lower(), codec_name=codec)
+            rate = re.search(r"(\d+)\s*kb/s", details)
+            stream.bit_rate = int(rate.group(1)) * 1000 if rate else None
+            if stream.codec_type == "video":
+                size = re.search(r"(\d{2,5})x(\d{2,5})", details)
+                if size:
+                    stream.width, stream.height = int(size.group(1)), int(size.group(2))
+                fps = re.search(r"([\d.]+)\s*fps", details)
+                stream.fps = float(fps.group(1)) if fps else None
+            elif stream.codec_type == "audio":
+                sample_rate = re.search(r"(\d+)\s*Hz", details)
+                stream.sample_rate = int(sample_rate.group(1)) if sample_rate else None
+                channels = re.search(r"(\d+)\s*channels", details)
+                if channels:
+                    stream.channels = int(channels.group(1))
+                else:
+                    layout = re.search(r"Hz,\s*([\w.]+)", details)
+                    if layout:
+                        stream.channels = _CHANNEL_LAYOUTS.get(layout.group(1).split("(")[0])
+            streams.append(stream)
+            continue
+        match = _ROTATION_RE.search(line)
+        if match and streams and streams[-1].codec_type == "video":
+            streams[-1].rotation = int(float(match.group(1) or match.group(2)))
+
+    if not streams:
+        return None
+
+    try:
+        size_bytes = os.path.getsize(path)
+    except OSError:
+        size_bytes = None
+
+    return MediaInfo(path, size_bytes=size_bytes, duration=duration, format_name=format_name,
+                     bit_rate=bit_rate, streams=streams, source="ffmpeg")
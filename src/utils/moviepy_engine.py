@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+
+from colorama import Fore
+
+from utils.cancellation import CancellationToken
+from utils.constants import RATE_QUALITY
+from utils.progress import MoviePyProgressLogger
+from utils.watchdog import StallWatchdog
+
+
+def watch_moviepy(clip, watchdog, stop_token, finished):
+    """
+    Stop a MoviePy write whose decoder hangs (runs on a helper thread).
+
+    A hung reader blocks MoviePy inside a pipe read where no callback
+    fires, so the reader processes are killed from here; the progress
+    logger then sees stop_token and aborts the write.
+    """
+    while not finished.wait(0.5):
+        if watchdog.expired():
+            stop_token.cancel()
+            audio = getattr(clip, "audio", None)
+            for reader in (getattr(clip, "reader", None), getattr(audio, "reader", None)):
+                proc = getattr(reader, "proc", None)
+                if proc is not None:
+                    try:
+                        proc.kill()
+                    except OSError:
+                        pass
+            return
+
+
+def encode_with_moviepy(compressor, clip, input_path, output_path, video_bitrate_kbps,
+                        audio_plan, preset, threads=4, output_size=None, fps_cap=None):
+    """
+    Encode through MoviePy's frame pipeline, watched for stalls and cancellation.
+
+    Args:
+        compressor: VideoCompressor whose filters, codec and progress are used
+        (the other arguments are those of a single encode)
+
+    Returns:
+        True if the write completed
+    """
+    video_name = compressor.name_of(input_path)
+    start_time = time.time()
+    on_progress = compressor.progress.step("encode")
+    watchdog = StallWatchdog(compressor.stall_timeout)
+    stop_token = CancellationToken(parent=compressor.cancel_token)
+    logger = MoviePyProgressLogger(on_progress, clip.duration, output_path,
+                                   cancel_token=stop_token, watchdog=watchdog)
+    finished = threading.Event()
+    threading.Thread(target=watch_moviepy, args=(clip, watchdog, stop_token, finished),
+                     daemon=True).start()
+    # The frame-rate cap is applied by MoviePy's frame sampling, the rest by the writer's
+    # ffmpeg.
+    # Audio is read straight from the input by that same ffmpeg (no temporary audio file).
+    ffmpeg_params = ["-map", "0:v:0"] + audio_plan.ffmpeg_args(input_index=1)
+    if output_size or compressor.crop_box or compressor.drop_duplicates:
+        ffmpeg_params += ["-vf", compressor.video_filter(output_size)]
+    ffmpeg_params += compressor.content_args(fps_cap or getattr(clip, "fps", None))
+    ffmpeg_params += compressor.frame_rate_args(fps_cap, getattr(clip, "fps", None))
+    ffmpeg_params += compressor.backend.stream_args(os.path.splitext(output_path)[1])
+    if compressor.rate_control == RATE_QUALITY:
+        ffmpeg_params += compressor.rate_args(video_bitrate_kbps)
+    try:
+        clip.write_videofile(
+            output_path,
+            codec=compressor.backend.encoder,
+            audio=input_path if audio_plan.mode != "none" else False,
+            audio_codec="aac",
+            bitrate=f"{video_bitrate_kbps}k" if compressor.rate_control != RATE_QUALITY else None,
+            threads=threads,
+            preset=preset,  # Use user-selected preset
+            fps=fps_cap,  # MoviePy then only decodes the frames that are kept
+            ffmpeg_params=ffmpeg_params,
+            verbose=False,  # Suppress moviepy output
+            logger=logger
+        )
+    except Exception as write_error:
+        if watchdog.stalled:
+            return compressor.report_stall(video_name, watchdog, time.time() - start_time)
+        if compressor.is_cancelled():
+            # EncodeCancelled from our logger, or a broken pipe from the writer it killed
+            return False
+        elapsed = time.time() - start_time
+        print(Fore.RED + f"⚠️ Error: {video_name} - Write failed after {elapsed:.0f}s: "
+                         f"{write_error}")
+        return False
+    finally:
+        finished.set()
+    return True
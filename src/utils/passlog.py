@@ -0,0 +1,111 @@
+import glob
+import hashlib
+import os
+import time
+
+from colorama import Fore
+
+from utils.app_paths import get_user_data_dir
+
+# Stats older than this are pruned whenever a new analysis pass is written
+PASSLOG_MAX_AGE_SECONDS = 7 * 24 * 3600
+# Share of a two-pass job spent in the (faster) analysis pass, for progress reporting
+PASS1_PROGRESS_WEIGHT = 0.35
+
+
+def get_passlog_prefix(input_path, settings_key):
+    """
+    Return the ffmpeg -passlogfile prefix for an input and its pass-1 settings.
+
+    The prefix changes whenever the input file (path, size, mtime) or anything
+    that affects the pass-1 frame decisions (encoder, preset, filters) changes,
+    so stale stats are never fed into a second pass. The target bitrate is not
+    part of the key: the encoder rescales pass-1 stats to any bitrate, which
+    lets a retry at a different target size skip the analysis pass.
+
+    Args:
+        input_path: Path to input video
+        settings_key: String describing the pass-1 settings
+
+    Returns:
+        Path prefix inside the user data directory
+    """
+    stat = os.stat(input_path)
+    key = f"{os.path.abspath(input_path)}|{stat.st_size}|{int(stat.st_mtime)}|{settings_key}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+    return os.path.join(get_user_data_dir("passlogs"), digest)
+
+
+def has_stats(prefix):
+    """Check whether a complete pass-1 stats file exists for this prefix."""
+    log_path = f"{prefix}-0.log"
+    return os.path.isfile(log_path) and os.path.getsize(log_path) > 0
+
+
+def discard_stats(prefix):
+    """Remove all stats files written for this prefix."""
+    for path in glob.glob(f"{glob.escape(prefix)}-*"):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def prune_stats(max_age_seconds=PASSLOG_MAX_AGE_SECONDS):
+    """Remove stats files that have not been touched for max_age_seconds."""
+    cutoff = time.time() - max_age_seconds
+    for path in glob.glob(os.path.join(get_user_data_dir("passlogs"), "*")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def encode_two_pass(compressor, input_path, output_path, video_bitrate_kbps, audio_plan, preset,
+                    threads=4, output_size=None, fps_cap=None, source_fps=None):
+    """
+    Run the analysis pass (unless cached stats exist) followed by the encode pass.
+
+    Pass-1 stats are kept after a successful encode, so a retry of the same
+    input at a different target size only runs pass 2.
+
+    Args:
+        compressor: VideoCompressor whose command builder, progress and ffmpeg steps are used
+        (the other arguments are those of a single encode)
+
+    Returns:
+        True if both passes succeeded
+    """
+    video_name = compressor.name_of(input_path)
+    # Pass-1 stats only fit encodes at the same preset, resolution and frames
+    video_filter = compressor.video_filter(output_size, fps_cap)
+    prefix = get_passlog_prefix(input_path,
+                                f"{compressor.backend.encoder}|{preset}|{video_filter}")
+
+    if has_stats(prefix):
+        print(Fore.CYAN + f"♻️ Reusing pass-1 stats for {video_name}")
+        pass2_progress = compressor.progress.step("pass2", stage="Pass 2/2")
+    else:
+        pass1_progress = compressor.progress.step("pass1", weight=PASS1_PROGRESS_WEIGHT,
+                                                  stage="Pass 1/2", writes_output=False)
+        pass2_progress = compressor.progress.step("pass2", weight=1 - PASS1_PROGRESS_WEIGHT,
+                                                  stage="Pass 2/2")
+        prune_stats()
+        print(Fore.CYAN + f"🔍 Pass 1/2: analysing {video_name}...")
+        cmd = compressor.build_ffmpeg_command(input_path, output_path, video_bitrate_kbps,
+                                              audio_plan.bitrate_kbps, preset=preset,
+                                              threads=threads, pass_number=1, passlog_prefix=prefix,
+                                              output_size=output_size, fps_cap=fps_cap,
+                                              source_fps=source_fps)
+        if not compressor.run_ffmpeg_step(cmd, input_path, pass1_progress):
+            discard_stats(prefix)
+            return False
+
+    print(Fore.CYAN + f"🎞️ Pass 2/2: encoding {video_name} at {video_bitrate_kbps}k...")
+    cmd = compressor.build_ffmpeg_command(input_path, output_path, video_bitrate_kbps,
+                                          audio_plan.bitrate_kbps, preset=preset, threads=threads,
+                                          pass_number=2, passlog_prefix=prefix,
+                                          output_size=output_size, fps_cap=fps_cap,
+                                          source_fps=source_fps, audio_plan=audio_plan)
+    return compressor.run_ffmpeg_step(cmd, input_path, pass2_progress)
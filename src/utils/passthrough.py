@@ -0,0 +1,74 @@
+import os
+import shutil
+
+from colorama import Fore
+
+from utils.constants import FASTSTART_EXTENSIONS
+from utils.ffmpeg_tools import get_ffmpeg_path
+
+# Streams that can be handed over without re-encoding when an input already fits
+PASSTHROUGH_VIDEO_CODECS = ("h264",)
+PASSTHROUGH_AUDIO_CODECS = ("aac", "mp3")
+REMUX_EXTENSIONS = (".mp4", ".mov", ".m4v", ".mkv")
+
+
+def try_passthrough(compressor, input_path, output_path, info):
+    """
+    Skip the encode entirely when the input already fits the target.
+
+    Same container: the file is copied as-is. Different container: the
+    streams are remuxed with ``-c copy``. Only H.264 video with AAC/MP3
+    (or no) audio qualifies, so the output is what an encode would produce;
+    an encode to another codec or under a lower height limit never does,
+    and neither does one that would change the frames: a frame rate cap,
+    dropped duplicates or a crop. The crop and content plans of the file
+    must be made first.
+
+    Args:
+        compressor: VideoCompressor with the target size, codec, height limit and file plans
+        input_path: Path to input video
+        output_path: Path to save the output
+        info: MediaInfo of the input
+
+    Returns:
+        True if the output was produced without encoding, False to fall back to an encode
+    """
+    file_size = info.size_bytes
+    if not compressor.allow_passthrough or not file_size or file_size > compressor.max_size_bytes:
+        return False
+    if (info.video_codec not in PASSTHROUGH_VIDEO_CODECS
+            or info.video_codec != compressor.backend.name):
+        return False
+    width, height = info.width or 0, info.height or 0
+    if compressor.max_height and min(width, height) > compressor.max_height:
+        return False
+    if info.has_audio and info.audio_codec not in PASSTHROUGH_AUDIO_CODECS:
+        return False
+    if compressor.plan_fps_cap(info) or compressor.drop_duplicates or compressor.crop_box:
+        return False
+
+    video_name = compressor.name_of(input_path)
+    size_mb = file_size / (1024 * 1024)
+    fits = f"already fits ({size_mb:.2f} MB / {compressor.target_size_mb} MB target)"
+    in_ext = os.path.splitext(input_path)[1].lower()
+    out_ext = os.path.splitext(output_path)[1].lower()
+
+    if in_ext == out_ext:
+        if os.path.abspath(input_path) != os.path.abspath(output_path):
+            shutil.copyfile(input_path, output_path)
+        print(Fore.GREEN + f"⚡ Passthrough: {video_name} {fits}, copied as-is")
+        return True
+
+    if out_ext not in REMUX_EXTENSIONS:
+        return False
+    cmd = [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y", "-i", input_path,
+           "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy"]
+    if out_ext in FASTSTART_EXTENSIONS:
+        cmd += ["-movflags", "+faststart"]
+    cmd.append(output_path)
+    if not compressor.run_ffmpeg_step(cmd, input_path):
+        return False
+    if not os.path.exists(output_path) or os.path.getsize(output_path) > compressor.max_size_bytes:
+        return False
+    print(Fore.GREEN + f"⚡ Passthrough: {video_name} {fits}, remuxed to {out_ext}")
+    return True
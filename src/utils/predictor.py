@@ -0,0 +1,187 @@
+import os
+import shutil
+import time
+
+from utils.ffmpeg_tools import run_ffmpeg
+from utils.segments import make_scratch_dir
+
+# Inputs shorter than this are cheap to retry and too short to sample meaningfully
+MIN_PREDICT_DURATION = 120
+SAMPLE_COUNT = 3
+SAMPLE_SECONDS = 4.0
+# Samples never cover more than this share of the input, which bounds the cost
+MAX_SAMPLE_FRACTION = 0.05
+# Limits for the bitrate correction taken from a prediction (raising is riskier than lowering)
+MIN_CORRECTION = 0.5
+MAX_CORRECTION = 1.15
+# Samples only ever lower the bitrate: a few seconds of ABR are dominated by the encoder's
+# warm-up, which undershoots on some content (345k for 400k over 4 s, 399k over 20 s)
+SAMPLE_MAX_CORRECTION = 1.0
+# Corrections smaller than this are not worth applying
+CORRECTION_THRESHOLD = 0.05
+# Samples this far over the request mean the plan does not suit the content: the bitrate is
+# corrected in full, past MIN_CORRECTION, and the output size re-planned for it
+REPLAN_RATIO = 2.0
+
+
+def sample_windows(duration, count=SAMPLE_COUNT, seconds=SAMPLE_SECONDS):
+    """
+    Sample positions spread evenly across an input.
+
+    Args:
+        duration: Input duration in seconds
+        count: Number of samples
+        seconds: Length of each sample
+
+    Returns:
+        List of (start, length) tuples, empty if the input is too short to sample
+    """
+    if not duration or duration < MIN_PREDICT_DURATION:
+        return []
+    seconds = min(seconds, duration * MAX_SAMPLE_FRACTION / count)
+    return [((i + 0.5) * duration / count - seconds / 2, seconds) for i in range(count)]
+
+
+class SizePrediction:
+    """
+    What the sample encodes say about the full encode.
+
+    ratio is the bitrate the encoder actually produced divided by the one it
+    was asked for; speed is seconds of content encoded per second of encoding
+    (process start-up and seeking excluded, as they do not scale with duration).
+    An undershoot in the samples is taken for encoder warm-up: the full encode
+    is expected to land on the requested bitrate then.
+    """
+
+    def __init__(self, requested_kbps, sampled_seconds, sampled_bytes, encode_seconds,
+                 wall_seconds=None):
+        self.requested_kbps = requested_kbps
+        self.sampled_seconds = sampled_seconds
+        self.sampled_bytes = sampled_bytes
+        self.encode_seconds = encode_seconds
+        # What sampling cost
+        self.wall_seconds = wall_seconds if wall_seconds is not None else encode_seconds
+
+    @property
+    def ratio(self):
+        return self.sampled_bytes * 8 / (self.requested_kbps * 1000 * self.sampled_seconds)
+
+    @property
+    def trusted_ratio(self):
+        return max(self.ratio, 1 / SAMPLE_MAX_CORRECTION)
+
+    @property
+    def speed(self):
+        return self.sampled_seconds / self.encode_seconds if self.encode_seconds > 0 else None
+
+    def predicted_video_bytes(self, video_kbps, duration):
+        """Video bytes a full encode at video_kbps is expected to produce."""
+        return self.trusted_ratio * video_kbps * 1000 / 8 * duration
+
+    def predicted_seconds(self, duration):
+        """Expected wall time of the full encode."""
+        return duration / self.speed if self.speed else None
+
+    @property
+    def needs_replan(self):
+        return self.ratio > REPLAN_RATIO
+
+    def corrected_kbps(self, video_kbps, min_kbps=0):
+        """
+        Bitrate to request so the encoder lands on video_kbps.
+
+        Above REPLAN_RATIO the correction is not limited to MIN_CORRECTION,
+        only to min_kbps.
+
+        Returns:
+            The corrected bitrate (never above video_kbps), or video_kbps when the
+            correction is too small to matter
+        """
+        if self.needs_replan:
+            return max(int(video_kbps / self.ratio), min(min_kbps, video_kbps))
+        return correct_bitrate(video_kbps, self.ratio, max_correction=SAMPLE_MAX_CORRECTION)
+
+
+def correct_bitrate(video_kbps, ratio, max_correction=MAX_CORRECTION):
+    """
+    Bitrate to request from an encoder known to produce ratio times what it is asked for.
+
+    The correction is limited to MIN_CORRECTION..max_correction and skipped
+    when it is smaller than CORRECTION_THRESHOLD.
+
+    Args:
+        video_kbps: Video bitrate the output should have
+        ratio: Produced/requested bitrate ratio (from samples or earlier encodes)
+        max_correction: Largest factor the bitrate may be raised by
+
+    Returns:
+        The corrected bitrate, or video_kbps when the correction is too small to matter
+    """
+    correction = min(max(1 / ratio, MIN_CORRECTION), max_correction)
+    if abs(correction - 1) < CORRECTION_THRESHOLD:
+        return video_kbps
+    return int(video_kbps * correction)
+
+
+def predict(build_command, duration, requested_kbps, scratch_dir, cancel_token=None,
+            watchdog_factory=None):
+    """
+    Encode short samples spread across an input and measure the result.
+
+    Args:
+        build_command: Callable (start, seconds, output_path) returning the sample's ffmpeg command
+        duration: Input duration in seconds
+        requested_kbps: Video bitrate the samples are encoded at
+        scratch_dir: Directory for the sample outputs
+        cancel_token: Optional CancellationToken that stops the sampling
+        watchdog_factory: Optional callable returning a StallWatchdog for each sample
+
+    Returns:
+        SizePrediction, or None if the input is too short or a sample failed
+    """
+    windows = sample_windows(duration)
+    if not windows:
+        return None
+    sampled_seconds = sampled_bytes = encode_seconds = 0
+    start_time = time.monotonic()
+    for index, (start, seconds) in enumerate(windows):
+        sample_path = os.path.join(scratch_dir, f"sample_{index}.mkv")
+        watchdog = watchdog_factory() if watchdog_factory else None
+        speeds = []
+        sample_start = time.monotonic()
+        try:
+            returncode, _ = run_ffmpeg(
+                build_command(start, seconds, sample_path), cancel_token=cancel_token,
+                watchdog=watchdog,
+                on_progress=lambda stats: stats.get("speed") and speeds.append(stats["speed"]))
+            size = os.path.getsize(sample_path)
+        except OSError:
+            return None
+        if returncode != 0 or not size:
+            return None
+        sampled_seconds += seconds
+        sampled_bytes += size
+        # ffmpeg's own speed figure leaves out process start-up; fall back to the wall clock
+        encode_seconds += seconds / speeds[-1] if speeds else time.monotonic() - sample_start
+    return SizePrediction(requested_kbps, sampled_seconds, sampled_bytes, encode_seconds,
+                          time.monotonic() - start_time)
+
+
+def predict_output(build_command, duration, requested_kbps, cancel_token=None,
+                   watchdog_factory=None):
+    """
+    Encode a few short samples at the planned settings to predict the full encode.
+
+    Like predict(), with the samples written to a scratch directory that is removed afterwards.
+
+    Returns:
+        SizePrediction, or None for short inputs or when sampling failed
+    """
+    if not sample_windows(duration):
+        return None
+    scratch_dir = make_scratch_dir(prefix="samples_")
+    try:
+        return predict(build_command, duration, requested_kbps, scratch_dir,
+                       cancel_token=cancel_token, watchdog_factory=watchdog_factory)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
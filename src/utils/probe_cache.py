@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.app_paths import get_user_data_dir
+from utils.media_info import MediaInfo, probe_media
+
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+class ProbeCache:
+    """
+    Persistent SQLite cache of MediaInfo probe results.
+
+    Entries are keyed on absolute path and only returned while the file's
+    size and mtime still match, so an edited or re-downloaded file is probed
+    again. Old entries are evicted by age and by total count.
+    The database is opened lazily on first use.
+    """
+
+    def __init__(self, db_path=None, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self._db_path = db_path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @property
+    def db_path(self):
+        if self._db_path is None:
+            self._db_path = os.path.join(get_user_data_dir(), "probe_cache.sqlite3")
+        return self._db_path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        if not self._initialized:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+                " info TEXT NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS probes_accessed ON probes (accessed)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    @staticmethod
+    def _file_key(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def get(self, path):
+        """
+        Return the cached MediaInfo for an unchanged file, or None.
+        """
+        try:
+            key, size, mtime_ns = self._file_key(path)
+            with self._lock:
+                conn = self._connect()
+                try:
+                    row = conn.execute(
+                        "SELECT info FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                        (key, size, mtime_ns)
+                    ).fetchone()
+                    if row is None:
+                        return None
+                    conn.execute("UPDATE probes SET accessed = ? WHERE path = ?",
+                                 (time.time(), key))
+                    conn.commit()
+                finally:
+                    conn.close()
+            return MediaInfo.from_dict(json.loads(row[0]))
+        except (OSError, sqlite3.Error, ValueError, TypeError):
+            return None
+
+    def put(self, info):
+        """
+        Store a probe result for the file at info.path and evict stale entries.
+        """
+        try:
+            key, size, mtime_ns = self._file_key(info.path)
+            with self._lock:
+                conn = self._connect()
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO probes (path, size, mtime_ns, info, accessed) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, size, mtime_ns, json.dumps(info.to_dict()), time.time())
+                    )
+                    self._evict(conn)
+                    conn.commit()
+                finally:
+                    conn.close()
+        except (OSError, sqlite3.Error, TypeError, ValueError):
+            pass
+
+    def probe(self, path):
+        """
+        Return MediaInfo for a file, running ffprobe only on a cache miss.
+        """
+        info = self.get(path)
+        if info is None:
+            info = probe_media(path)
+            if info is not None:
+                self.put(info)
+        return info
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM probes")
+                conn.commit()
+            finally:
+                conn.close()
+
+    def __len__(self):
+        with self._lock:
+            conn = self._connect()
+            try:
+                return conn.execute("SELECT COUNT(*) FROM probes").fetchone()[0]
+            finally:
+                conn.close()
+
+    def _evict(self, conn):
+        conn.execute("DELETE FROM probes WHERE accessed < ?", (time.time() - self.max_age_seconds,))
+        conn.execute(
+            "DELETE FROM probes WHERE path NOT IN "
+            "(SELECT path FROM probes ORDER BY accessed DESC LIMIT ?)",
+            (self.max_entries,)
+        )
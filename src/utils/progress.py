@@ -0,0 +1,193 @@
+import inspect
+import os
+import threading
+import time
+
+from proglog import ProgressBarLogger
+
+# Minimum seconds between two progress events of the same job
+PROGRESS_INTERVAL_SECONDS = 0.5
+# The finish time is only predicted once the encode has run this long and made this much progress
+ETA_MIN_ELAPSED_SECONDS = 10
+ETA_MIN_FRACTION = 0.02
+
+
+class ProgressTracker:
+    """
+    Turns raw ffmpeg progress from one or more encode steps into job-level events.
+
+    A job may run several ffmpeg steps (two passes, parallel chunks); each is
+    registered with a weight (its share of the job) and the duration it
+    covers. Events are throttled and delivered as dicts with percent,
+    out_time, fps, speed (x realtime, summed over parallel steps),
+    total_size (bytes written so far), eta (seconds left, from the measured
+    rate), over_budget and stage.
+
+    With a time budget, on_overrun is called once as soon as the measured
+    rate predicts the job will finish after the budget.
+    """
+
+    def __init__(self, callback, duration, interval=PROGRESS_INTERVAL_SECONDS, budget_seconds=None,
+                 on_overrun=None):
+        """
+        Args:
+            callback: Callable receiving progress dicts, or None
+            duration: Duration of the whole job in seconds
+            interval: Minimum seconds between two events
+            budget_seconds: Optional wall-clock budget for the whole job
+            on_overrun: Called with the predicted total seconds when the budget will be exceeded
+        """
+        self.callback = callback
+        self.duration = duration
+        self.interval = interval
+        self.budget_seconds = budget_seconds
+        self.on_overrun = on_overrun
+        self.overrun_flagged = False
+        self._started = time.monotonic()
+        self._steps = {}
+        self._lock = threading.Lock()
+        self._last_emit = 0.0
+
+    def step(self, key, weight=1.0, duration=None, stage="Encoding", writes_output=True):
+        """
+        Register an encode step.
+
+        Args:
+            key: Unique name of the step
+            weight: Share of the whole job this step represents
+            duration: Media duration the step processes (the job's duration by default)
+            stage: Label shown while this step reports progress
+            writes_output: False for steps whose bytes are not part of the result (e.g. pass 1)
+
+        Returns:
+            on_progress callable for run_ffmpeg, or None when there is nothing to report to
+        """
+        if self.callback is None and self.budget_seconds is None:
+            return None
+        with self._lock:
+            self._steps[key] = {
+                "weight": weight, "duration": duration or self.duration, "stage": stage,
+                "writes_output": writes_output, "fraction": 0.0, "stats": None,
+            }
+        return lambda stats: self.update(key, stats)
+
+    def reset(self):
+        """Forget all steps, e.g. before the job re-encodes from the start (the budget runs on)."""
+        with self._lock:
+            self._steps = {}
+
+    def update(self, key, stats):
+        """Record a parse_progress() dict for a step and emit an event unless throttled."""
+        with self._lock:
+            step = self._steps[key]
+            if stats.get("done"):
+                step["fraction"] = 1.0
+            elif stats.get("out_time") is not None and step["duration"]:
+                step["fraction"] = min(stats["out_time"] / step["duration"], 1.0)
+            step["stats"] = stats
+            now = time.monotonic()
+            if now - self._last_emit < self.interval and not stats.get("done"):
+                return
+            self._last_emit = now
+            event = self._snapshot(step["stage"])
+            overrun = event["over_budget"] and not self.overrun_flagged
+            if overrun:
+                self.overrun_flagged = True
+        if overrun and self.on_overrun is not None:
+            self.on_overrun(time.monotonic() - self._started + event["eta"])
+        if self.callback is not None:
+            self.callback(event)
+
+    def _snapshot(self, stage):
+        steps = list(self._steps.values())
+        total_weight = sum(s["weight"] for s in steps) or 1.0
+        fraction = sum(s["weight"] * s["fraction"] for s in steps) / total_weight
+        running = [s["stats"] for s in steps if s["stats"] and s["fraction"] < 1.0]
+        speeds = [stats["speed"] for stats in running if stats.get("speed")]
+        fps = [stats["fps"] for stats in running if stats.get("fps")]
+        elapsed = time.monotonic() - self._started
+        eta = None
+        if elapsed >= ETA_MIN_ELAPSED_SECONDS and fraction >= ETA_MIN_FRACTION:
+            eta = elapsed * (1 - fraction) / fraction
+        total_size = sum(s["stats"].get("total_size") or 0 for s in steps
+                         if s["stats"] and s["writes_output"])
+        return {
+            "percent": round(fraction * 100, 1),
+            "out_time": fraction * self.duration if self.duration else None,
+            "fps": sum(fps) if fps else None,
+            "speed": sum(speeds) if speeds else None,
+            "total_size": total_size,
+            "eta": eta,
+            "over_budget": bool(self.budget_seconds and eta is not None
+                                and elapsed + eta > self.budget_seconds),
+            "stage": stage,
+        }
+
+
+class MoviePyProgressLogger(ProgressBarLogger):
+    """
+    proglog logger that forwards MoviePy's frame counter to a ProgressTracker step.
+
+    MoviePy calls it for every audio chunk and video frame, which also makes
+    it the place to stop a write: a cancelled token kills MoviePy's ffmpeg
+    writer and raises EncodeCancelled out of write_videofile.
+    """
+
+    def __init__(self, on_progress, duration, output_path=None, cancel_token=None, watchdog=None):
+        super().__init__()
+        self.on_progress = on_progress
+        self.duration = duration
+        self.output_path = output_path
+        self.cancel_token = cancel_token
+        self.watchdog = watchdog
+        self._start = time.monotonic()
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if self.cancel_token is not None and self.cancel_token.cancelled:
+            self._kill_writer()
+            self.cancel_token.raise_if_cancelled()
+        if self.watchdog is not None and attr == "index":
+            self.watchdog.touch()
+        if self.on_progress is None or bar != "t" or attr != "index" or not self.duration:
+            return
+        total = self.bars[bar].get("total") or 0
+        if not total:
+            return
+        out_time = self.duration * min(value / total, 1.0)
+        elapsed = time.monotonic() - self._start
+        try:
+            total_size = os.stat(self.output_path).st_size if self.output_path else None
+        except OSError:
+            total_size = None
+        self.on_progress({
+            "out_time": out_time,
+            "fps": value / elapsed if elapsed > 0 else None,
+            "speed": out_time / elapsed if elapsed > 0 else None,
+            "total_size": total_size,
+            "done": value >= total - 1,
+        })
+
+    @staticmethod
+    def _kill_writer():
+        """
+        Kill the ffmpeg process of the MoviePy writer that is calling us.
+
+        Closing the writer normally lets ffmpeg flush every buffered frame
+        first, which takes several seconds with slow presets. MoviePy does not
+        hand its writer to the logger, so it is looked up in the caller frames.
+        """
+        frame = inspect.currentframe()
+        try:
+            for _ in range(10):
+                frame = frame.f_back if frame is not None else None
+                if frame is None:
+                    return
+                proc = getattr(frame.f_locals.get("writer"), "proc", None)
+                if proc is not None:
+                    try:
+                        proc.kill()
+                    except OSError:
+                        pass
+                    return
+        finally:
+            del frame
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+from utils.app_paths import get_user_data_dir
+
+# Only the most recent attempts of a profile are used for an estimate
+HISTORY_WINDOW = 8
+# A single outlier file is not enough to move the next file's bitrate
+MIN_HISTORY_ATTEMPTS = 2
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_MAX_AGE_DAYS = 90
+
+
+def rate_profile(engine, rate_control, preset, video_codec, height, fps, encoder="libx264",
+                 content=None):
+    """
+    Key grouping encodes whose bitrate overshoot behaves alike.
+
+    Args:
+        engine: Encoding engine
+        rate_control: Rate control mode
+        preset: Encoder preset
+        video_codec: Source video codec
+        height: Output height (None if unknown)
+        fps: Output frame rate (None if unknown)
+        encoder: Video encoder
+        content: Content class ("screen" or "camera"), None if not classified
+
+    Returns:
+        String key
+    """
+    fps_bucket = f"{round(fps / 5) * 5:g}fps" if fps else "?fps"
+    key = (f"{engine}|{encoder}|{rate_control}|{preset}|{video_codec or '?'}|"
+           f"{height or '?'}p|{fps_bucket}")
+    return f"{key}|{content}" if content else key
+
+
+class RateHistory:
+    """
+    Persistent SQLite log of requested vs produced video bitrates.
+
+    Every encode attempt records the ratio of the video bitrate it produced
+    to the one it asked for, under a rate_profile() key. The median of the
+    recent attempts of a profile is the starting correction for the next
+    file with the same profile. Old entries are evicted by age and by total
+    count. The database is opened lazily on first use.
+    """
+
+    def __init__(self, db_path=None, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self._db_path = db_path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @property
+    def db_path(self):
+        if self._db_path is None:
+            self._db_path = os.path.join(get_user_data_dir(), "rate_history.sqlite3")
+        return self._db_path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        if not self._initialized:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS attempts ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, profile TEXT NOT NULL,"
+                " requested_kbps REAL NOT NULL, actual_kbps REAL NOT NULL, recorded REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS attempts_profile ON attempts (profile, recorded)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def record(self, profile, requested_kbps, actual_kbps):
+        """
+        Store one attempt and evict stale entries.
+
+        Args:
+            profile: rate_profile() key
+            requested_kbps: Video bitrate the encoder was asked for
+            actual_kbps: Video bitrate it produced
+        """
+        if not requested_kbps or requested_kbps <= 0 or actual_kbps <= 0:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                try:
+                    conn.execute(
+                        "INSERT INTO attempts (profile, requested_kbps, actual_kbps, recorded) "
+                        "VALUES (?, ?, ?, ?)",
+                        (profile, requested_kbps, actual_kbps, time.time())
+                    )
+                    self._evict(conn)
+                    conn.commit()
+                finally:
+                    conn.close()
+        except (OSError, sqlite3.Error):
+            pass
+
+    def estimate(self, profile):
+        """
+        Expected produced/requested bitrate ratio for a profile.
+
+        Returns:
+            Median ratio of the recent attempts, or None with too little history
+        """
+        try:
+            with self._lock:
+                conn = self._connect()
+                try:
+                    rows = conn.execute(
+                        "SELECT actual_kbps / requested_kbps FROM attempts WHERE profile = ? "
+                        "ORDER BY recorded DESC LIMIT ?",
+                        (profile, HISTORY_WINDOW)
+                    ).fetchall()
+                finally:
+                    conn.close()
+        except (OSError, sqlite3.Error):
+            return None
+        if len(rows) < MIN_HISTORY_ATTEMPTS:
+            return None
+        return statistics.median(row[0] for row in rows)
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM attempts")
+                conn.commit()
+            finally:
+                conn.close()
+
+    def __len__(self):
+        with self._lock:
+            conn = self._connect()
+            try:
+                return conn.execute("SELECT COUNT(*) FROM attempts").fetchone()[0]
+            finally:
+                conn.close()
+
+    def _evict(self, conn):
+        conn.execute("DELETE FROM attempts WHERE recorded < ?",
+                     (time.time() - self.max_age_seconds,))
+        conn.execute(
+            "DELETE FROM attempts WHERE id NOT IN "
+            "(SELECT id FROM attempts ORDER BY recorded DESC LIMIT ?)",
+            (self.max_entries,)
+        )
@@ -0,0 +1,117 @@
+from colorama import Fore
+
+# Output heights tried from the top, for landscape video (portrait video uses the width)
+RESOLUTION_LADDER = (1080, 720, 540, 480)
+# Below this many bits per pixel per frame, x264 output at the bitrate looks blocky
+MIN_BITS_PER_PIXEL = 0.05
+# Assumed when the probe did not report a frame rate
+DEFAULT_FPS = 30.0
+
+
+def bits_per_pixel(video_bitrate_kbps, width, height, fps=None):
+    """
+    Bits available per pixel of every frame at a bitrate.
+
+    Args:
+        video_bitrate_kbps: Video bitrate in kbps
+        width: Frame width in pixels
+        height: Frame height in pixels
+        fps: Frame rate (DEFAULT_FPS if unknown)
+
+    Returns:
+        Bits per pixel per frame
+    """
+    return video_bitrate_kbps * 1000 / (width * height * (fps or DEFAULT_FPS))
+
+
+def scaled_size(width, height, short_side):
+    """Frame size with the shorter side scaled to short_side, keeping aspect and even sizes."""
+    if width >= height:
+        return _even(width * short_side / height), _even(short_side)
+    return _even(short_side), _even(height * short_side / width)
+
+
+def plan_resolution(width, height, fps, video_bitrate_kbps, min_bits_per_pixel=MIN_BITS_PER_PIXEL):
+    """
+    Pick the output size for an encode from the bits-per-pixel budget.
+
+    The source size is kept if the bitrate gives it enough bits per pixel;
+    otherwise the ladder is walked down until a rung does, stopping at the
+    lowest rung. Sources are never upscaled.
+
+    Args:
+        width: Display width of the source
+        height: Display height of the source
+        fps: Source frame rate (None if unknown)
+        video_bitrate_kbps: Video bitrate the encode will use
+        min_bits_per_pixel: Quality floor
+
+    Returns:
+        Tuple of (width, height, bits_per_pixel) for the chosen size, or None
+        if the source dimensions are unknown
+    """
+    if not width or not height:
+        return None
+    source_short = min(width, height)
+    candidates = [(width, height)]
+    for rung in RESOLUTION_LADDER:
+        if rung < source_short:
+            candidates.append(scaled_size(width, height, rung))
+
+    for size in candidates:
+        bpp = bits_per_pixel(video_bitrate_kbps, size[0], size[1], fps)
+        if bpp >= min_bits_per_pixel:
+            return size[0], size[1], bpp
+    size = candidates[-1]
+    return size[0], size[1], bits_per_pixel(video_bitrate_kbps, size[0], size[1], fps)
+
+
+def plan_output_size(source_size, fps, video_bitrate_kbps, min_bits_per_pixel=MIN_BITS_PER_PIXEL,
+                     max_height=None, auto_downscale=True, report=True):
+    """
+    Choose the output resolution for an encode and report it.
+
+    Args:
+        source_size: (width, height) of the input after cropping
+        fps: Output frame rate (None if unknown)
+        video_bitrate_kbps: Video bitrate the encode will use
+        min_bits_per_pixel: Quality floor of the codec and content
+        max_height: Largest output as a "p" number (the short side), None for no limit
+        auto_downscale: Scale down when the bitrate is too low for the source size
+        report: Print the decision (off for sizes that only key a lookup)
+
+    Returns:
+        (width, height) to scale to, or None to keep the source size
+    """
+    source_width, source_height = source_size
+    plan = plan_resolution(source_width, source_height, fps, video_bitrate_kbps,
+                           min_bits_per_pixel=min_bits_per_pixel)
+    if plan is None:
+        return None
+    width, height, bpp = plan
+    if max_height and min(width, height) > max_height:
+        output_size = scaled_size(source_width, source_height, max_height)
+        message = (Fore.CYAN + f"📐 Output resolution: {output_size[0]}x{output_size[1]} "
+                               f"(limited to {max_height}p from "
+                               f"{source_width}x{source_height})")
+    elif (width, height) == (source_width, source_height):
+        output_size = None
+        message = (Fore.CYAN + f"📐 Output resolution: {width}x{height} "
+                               f"(source, {bpp:.3f} bits/pixel)")
+    elif not auto_downscale:
+        output_size = None
+        message = (Fore.YELLOW + f"⚠️ Warning: Keeping {source_width}x{source_height}, "
+                                 f"{width}x{height} would suit the bitrate better "
+                                 f"(auto downscale is off)")
+    else:
+        output_size = (width, height)
+        message = (Fore.CYAN + f"📐 Output resolution: {width}x{height} (downscaled from "
+                               f"{source_width}x{source_height} for {bpp:.3f} bits/pixel)")
+    if report:
+        print(message)
+    return output_size
+
+
+def _even(value):
+    """yuv420p needs even dimensions."""
+    return max(2, int(round(value / 2)) * 2)
@@ -0,0 +1,184 @@
+import hashlib
+import mmap
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from utils.app_paths import get_user_data_dir
+
+# Bytes hashed from the head, middle and tail of a file
+FINGERPRINT_SAMPLE_BYTES = 1024 * 1024
+DEFAULT_MAX_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+
+def fingerprint(path, sample_bytes=FINGERPRINT_SAMPLE_BYTES):
+    """
+    Fast content fingerprint: file size plus a hash of the head, middle and tail.
+
+    Identical recordings match regardless of file name or location (e.g. the
+    same Drive file downloaded twice), while reading at most 3 * sample_bytes.
+
+    Args:
+        path: Path to the file
+        sample_bytes: Bytes read from each of the three regions
+
+    Returns:
+        Hex digest string
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode("ascii"))
+    if size == 0:
+        return digest.hexdigest()
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if size <= sample_bytes * 3:
+                digest.update(mapped[:])
+            else:
+                middle = (size - sample_bytes) // 2
+                digest.update(mapped[:sample_bytes])
+                digest.update(mapped[middle:middle + sample_bytes])
+                digest.update(mapped[size - sample_bytes:])
+    return digest.hexdigest()
+
+
+def _link_or_copy(src, dst):
+    """Hardlink src to dst when the filesystem allows it, otherwise copy."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of finished outputs.
+
+    Keyed by the input fingerprint plus the effective compression settings,
+    so re-queuing the same recording (re-download, refresh, rename) reuses
+    the previous output instead of encoding again. Stored outputs live in
+    the user data directory and are evicted least-recently-used once their
+    total size exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self._cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @property
+    def cache_dir(self):
+        if self._cache_dir is None:
+            self._cache_dir = get_user_data_dir("result_cache")
+        os.makedirs(self._cache_dir, exist_ok=True)
+        return self._cache_dir
+
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.cache_dir, "index.sqlite3"), timeout=5)
+        if not self._initialized:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, file TEXT NOT NULL, size INTEGER NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def make_key(self, input_path, settings_key):
+        """
+        Build the cache key for an input and its effective settings,
+        or None if the input is unreadable.
+        """
+        try:
+            content = fingerprint(input_path)
+        except (OSError, ValueError):
+            return None
+        return hashlib.sha256(f"{content}|{settings_key}".encode("utf-8")).hexdigest()
+
+    def restore(self, key, output_path):
+        """
+        Place a cached output at output_path.
+
+        Returns:
+            True on a cache hit, False otherwise
+        """
+        if key is None:
+            return False
+        with self._lock:
+            try:
+                conn = self._connect()
+                try:
+                    row = conn.execute("SELECT file, size FROM results WHERE key = ?",
+                                       (key,)).fetchone()
+                    if row is None:
+                        return False
+                    cached_path = os.path.join(self.cache_dir, row[0])
+                    if not os.path.isfile(cached_path) or os.path.getsize(cached_path) != row[1]:
+                        # Missing or modified behind our back: drop the entry
+                        conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                        conn.commit()
+                        return False
+                    if os.path.abspath(cached_path) != os.path.abspath(output_path):
+                        _link_or_copy(cached_path, output_path)
+                    conn.execute("UPDATE results SET accessed = ? WHERE key = ?",
+                                 (time.time(), key))
+                    conn.commit()
+                    return True
+                finally:
+                    conn.close()
+            except (OSError, sqlite3.Error):
+                return False
+
+    def store(self, key, output_path):
+        """
+        Keep a finished output for future hits and evict least-recently-used entries over max_bytes.
+        """
+        if key is None or not os.path.isfile(output_path):
+            return
+        size = os.path.getsize(output_path)
+        if size > self.max_bytes:
+            return
+        file_name = key + os.path.splitext(output_path)[1].lower()
+        with self._lock:
+            try:
+                _link_or_copy(output_path, os.path.join(self.cache_dir, file_name))
+                conn = self._connect()
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO results (key, file, size, accessed) "
+                        "VALUES (?, ?, ?, ?)",
+                        (key, file_name, size, time.time())
+                    )
+                    self._evict(conn)
+                    conn.commit()
+                finally:
+                    conn.close()
+            except (OSError, sqlite3.Error):
+                pass
+
+    def total_bytes(self):
+        with self._lock:
+            conn = self._connect()
+            try:
+                return conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            finally:
+                conn.close()
+
+    def _evict(self, conn):
+        total = 0
+        rows = conn.execute("SELECT key, file, size FROM results ORDER BY accessed DESC").fetchall()
+        for key, file_name, size in rows:
+            total += size
+            if total <= self.max_bytes:
+                continue
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except OSError:
+                pass
@@ -0,0 +1,233 @@
+import csv
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from colorama import Fore
+
+from utils import complexity
+from utils.app_paths import get_user_data_dir
+from utils.audio import AudioPlan
+from utils.concurrency import useful_threads
+from utils.constants import FASTSTART_EXTENSIONS
+from utils.ffmpeg_tools import get_ffmpeg_path, run_ffmpeg
+from utils.watchdog import StallWatchdog
+
+# Inputs shorter than this are encoded in one piece
+MIN_SEGMENTED_DURATION = 600
+MIN_CHUNK_SECONDS = 30
+MAX_CHUNK_SECONDS = 300
+# More chunks than encoders keeps every core busy while the last long chunk finishes
+CHUNKS_PER_ENCODER = 2
+# Scratch directories left behind by a crash or kill are removed after this long
+SCRATCH_MAX_AGE_SECONDS = 24 * 3600
+
+
+def plan_chunk_seconds(duration, encoders, keyframe_interval=None):
+    """
+    Chunk length for splitting an input between parallel encoders.
+
+    Args:
+        duration: Input duration in seconds
+        encoders: Number of chunk encodes running at once
+        keyframe_interval: Average keyframe spacing of the input, if known
+
+    Returns:
+        Chunk length in seconds
+    """
+    seconds = duration / max(1, encoders * CHUNKS_PER_ENCODER)
+    seconds = min(max(seconds, MIN_CHUNK_SECONDS), MAX_CHUNK_SECONDS)
+    # Cuts can only land on keyframes; shorter requests just produce uneven chunks
+    if keyframe_interval:
+        seconds = max(seconds, keyframe_interval)
+    return seconds
+
+
+def make_scratch_dir(prefix="segments_"):
+    """Create a fresh scratch directory for a split or sample encode (pruning stale ones first)."""
+    root = get_user_data_dir("scratch")
+    cutoff = time.time() - SCRATCH_MAX_AGE_SECONDS
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+    return tempfile.mkdtemp(prefix=prefix, dir=root)
+
+
+def is_scratch_path(path):
+    """Whether a path lies in the scratch area (see make_scratch_dir())."""
+    root = os.path.abspath(get_user_data_dir("scratch"))
+    return os.path.abspath(path).startswith(root + os.sep)
+
+
+def split_at_keyframes(input_path, scratch_dir, chunk_seconds, cancel_token=None, watchdog=None):
+    """
+    Cut the video stream into chunks at keyframes without re-encoding.
+
+    Args:
+        input_path: Path to input video
+        scratch_dir: Directory receiving the chunks
+        chunk_seconds: Requested chunk length (each cut moves to the next keyframe)
+        cancel_token: Optional CancellationToken that stops the split
+        watchdog: Optional StallWatchdog that stops a hung split
+
+    Returns:
+        Tuple of (chunks, stderr_tail) where chunks is a list of
+        (path, start, end) tuples in playback order, or None on failure
+    """
+    list_path = os.path.join(scratch_dir, "chunks.csv")
+    cmd = [
+        get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y", "-i", input_path,
+        "-map", "0:v:0", "-c", "copy", "-an",
+        "-f", "segment", "-segment_time", f"{chunk_seconds:.3f}", "-reset_timestamps", "1",
+        "-segment_list", list_path, "-segment_list_type", "csv",
+        os.path.join(scratch_dir, "source_%04d.mkv"),
+    ]
+    returncode, stderr_tail = run_ffmpeg(cmd, cancel_token=cancel_token, watchdog=watchdog)
+    if returncode != 0 or not os.path.isfile(list_path):
+        return None, stderr_tail
+
+    chunks = []
+    with open(list_path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            chunks.append((os.path.join(scratch_dir, row[0]), float(row[1]), float(row[2])))
+    return chunks or None, stderr_tail
+
+
+def build_audio_command(input_path, audio_path, audio_plan):
+    """Write the planned audio track once, separately from the video chunks."""
+    return ([get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y", "-i", input_path, "-vn"]
+            + audio_plan.ffmpeg_args() + [audio_path])
+
+
+def build_concat_command(chunk_paths, list_path, output_path, audio_path=None, faststart=False,
+                         stream_args=None):
+    """
+    Join encoded chunks (and the separately encoded audio) without re-encoding.
+
+    Writes the concat demuxer list to list_path and returns the command line.
+    stream_args are extra output options such as container tags.
+    """
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in chunk_paths:
+            escaped = path.replace("\\", "/").replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    cmd = [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y", "-f", "concat", "-safe", "0",
+           "-i", list_path]
+    if audio_path:
+        cmd += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0"]
+    cmd += ["-c", "copy"] + (stream_args or [])
+    if faststart:
+        cmd += ["-movflags", "+faststart"]
+    cmd.append(output_path)
+    return cmd
+
+
+def encode_segmented(compressor, input_path, output_path, info, video_bitrate_kbps, audio_plan,
+                     preset, cpu_budget, output_size=None, fps_cap=None):
+    """
+    Split at keyframes, encode the chunks in parallel ffmpeg processes and join them losslessly.
+
+    Each chunk's share of the bit budget is its duration times a multiplier
+    from the complexity curve (1 for all with allocation off); the multipliers
+    average to 1 over the file, so the shares add up to the overall target.
+    Audio is encoded once for the whole file. All intermediate files live in
+    a scratch directory that is removed however the encode ends.
+
+    Args:
+        compressor: VideoCompressor whose settings, progress and ffmpeg steps are used
+        (the other arguments are those of a single encode)
+
+    Returns:
+        True on success, False on failure, None if the input could not be
+        split (the caller then falls back to a single encode)
+    """
+    video_name = compressor.name_of(input_path)
+    height = output_size[1] if output_size else compressor.frame_size(info)[1]
+    encoders = max(2, cpu_budget // useful_threads(height))
+    threads = max(1, cpu_budget // encoders)
+    chunk_seconds = plan_chunk_seconds(info.duration, encoders, info.keyframe_interval)
+
+    scratch_dir = make_scratch_dir()
+    try:
+        curve = compressor.plan_complexity(input_path, info, scratch_dir)
+        if compressor.is_cancelled():
+            return False
+        if curve is not None:
+            # Shorter chunks let the bitrates follow the curve more closely
+            chunk_seconds = min(chunk_seconds, max(complexity.ALLOCATION_CHUNK_SECONDS,
+                                                   info.keyframe_interval or 0))
+        chunks, stderr_tail = split_at_keyframes(
+            input_path, scratch_dir, chunk_seconds, cancel_token=compressor.cancel_token,
+            watchdog=StallWatchdog(compressor.stall_timeout))
+        if compressor.is_cancelled():
+            return False
+        if chunks is None:
+            print(Fore.YELLOW + f"⚠️ Could not split {video_name} at keyframes, "
+                                f"encoding in one piece:\n{stderr_tail}")
+            return None
+        if len(chunks) < 2:
+            print(Fore.YELLOW + f"⚠️ {video_name} has no keyframes to split at, "
+                                "encoding in one piece")
+            return None
+        print(Fore.CYAN + f"🧩 Split {video_name} into {len(chunks)} chunks of "
+                          f"~{chunk_seconds:.0f}s, encoding {encoders} at a time "
+                          f"with {threads} threads each")
+        factors = [1.0] * len(chunks)
+        if curve is not None:
+            factors = complexity.allocate(curve, [(start, end) for _, start, end in chunks])
+            low, high = min(factors), max(factors)
+            print(Fore.CYAN + f"📈 Chunk bitrates follow the complexity curve: "
+                              f"{low:.2f}x–{high:.2f}x of the average "
+                              f"({int(video_bitrate_kbps * low)}k–"
+                              f"{int(video_bitrate_kbps * high)}k)")
+
+        # Audio first: it is cheap and then runs alongside the first video chunks
+        steps = []
+        audio_path = None
+        if audio_plan.mode != "none":
+            # Matroska holds AAC and Opus alike
+            audio_path = os.path.join(scratch_dir, "audio.mka")
+            steps.append((build_audio_command(input_path, audio_path, audio_plan),
+                          compressor.progress.step("audio", weight=0, stage="Encoding chunks")))
+        encoded_paths = []
+        for index, (chunk_path, start, end) in enumerate(chunks):
+            encoded_path = os.path.join(scratch_dir, f"encoded_{index:04d}.mkv")
+            encoded_paths.append(encoded_path)
+            chunk_kbps = max(int(video_bitrate_kbps * factors[index]), 1)
+            cmd = compressor.build_ffmpeg_command(chunk_path, encoded_path, chunk_kbps, 0,
+                                                  preset=preset, threads=threads,
+                                                  output_size=output_size, fps_cap=fps_cap,
+                                                  source_fps=info.fps,
+                                                  audio_plan=AudioPlan("none"))
+            step = compressor.progress.step(f"chunk{index}", weight=end - start,
+                                            duration=end - start, stage="Encoding chunks")
+            steps.append((cmd, step))
+
+        pool = ThreadPoolExecutor(max_workers=encoders)
+        try:
+            results = pool.map(
+                lambda step: compressor.run_ffmpeg_step(step[0], input_path, step[1]), steps)
+            if not all(results):
+                return False
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        print(Fore.CYAN + f"🔗 Joining {len(chunks)} chunks of {video_name}...")
+        faststart = os.path.splitext(output_path)[1].lower() in FASTSTART_EXTENSIONS
+        stream_args = compressor.backend.container_args(os.path.splitext(output_path)[1])
+        list_path = os.path.join(scratch_dir, "concat.txt")
+        cmd = build_concat_command(encoded_paths, list_path, output_path,
+                                   audio_path=audio_path, faststart=faststart,
+                                   stream_args=stream_args)
+        return compressor.run_ffmpeg_step(cmd, input_path)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
@@ -0,0 +1,255 @@
+import os
+import re
+import time
+
+from colorama import Fore
+
+from utils import trim as trimming
+from utils.audio import scan_audio_levels
+from utils.concurrency import plan_threads
+from utils.constants import (ENGINE_FFMPEG, RATE_TWO_PASS, STATUS_DONE, STATUS_FAILED,
+                             STATUS_CANCELLED, STATUS_TIMEOUT, SIZE_TOLERANCE)
+from utils.ffmpeg_tools import get_ffmpeg_path
+
+
+class OutputTarget:
+    """
+    One output of a multi-target encode: a size limit and optional codec, height and name suffix.
+
+    Targets travel to worker processes as plain dicts (to_dict/from_dict).
+    """
+
+    def __init__(self, size_mb, codec=None, height=None, suffix=None):
+        if size_mb <= 0:
+            raise ValueError("Target size must be positive")
+        if height is not None and height <= 0:
+            raise ValueError("Target height must be positive")
+        self.size_mb = size_mb
+        self.codec = codec      # None: the compressor's codec
+        self.height = height    # None: planned from the bitrate like a single encode
+        self.suffix = suffix    # None: target_suffix() of the size
+
+    def describe(self):
+        parts = [f"{self.size_mb:g} MB"]
+        if self.codec:
+            parts.append(self.codec)
+        if self.height:
+            parts.append(f"{self.height}p")
+        return " ".join(parts)
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def parse_target_sizes(text):
+    """
+    Read one or more target sizes in MB from text like "10", "10, 25, 50" or "10 25 50".
+
+    Raises:
+        ValueError: If a size is not a positive number or none is given
+    """
+    sizes = [float(part) for part in re.split(r"[,;\s]+", text.strip()) if part]
+    if not sizes or any(size <= 0 for size in sizes):
+        raise ValueError(f"Invalid target sizes: {text!r}")
+    return list(dict.fromkeys(sizes))  # Duplicates would write the same file twice
+
+
+def target_suffix(suffix, size_mb):
+    """Output name suffix of one target, e.g. "_compressed_25MB"."""
+    return f"{suffix}_{size_mb:g}MB"
+
+
+def build_multi_command(compressor, input_path, outputs, preset="medium", threads=4, fps_cap=None,
+                        source_fps=None):
+    """
+    Build one ffmpeg command that decodes the input once and writes several outputs.
+
+    The shared part of the filter chain (frame-rate cap, crop, duplicate
+    dropping) runs once; ``split`` then feeds one scaler and encoder per output.
+
+    Args:
+        compressor: VideoCompressor whose shared filters (frame-rate cap, crop) are used
+        input_path: Path to input video
+        outputs: List of (compressor, output_path, video_bitrate_kbps, audio_plan,
+            output_size); each compressor supplies its output's codec and rate control
+        preset: FFmpeg preset
+        threads: Encoder threads shared by all outputs
+        fps_cap: Output frame rate to reduce to, None to keep the source rate
+        source_fps: Frame rate of the input
+
+    Returns:
+        List of command line arguments
+    """
+    shared = compressor.video_filters(fps_cap) + [f"split={len(outputs)}"]
+    graph = ("[0:v:0]" + ",".join(shared)
+             + "".join(f"[split{index}]" for index in range(len(outputs))))
+    for index, (_, _, _, _, output_size) in enumerate(outputs):
+        graph += f";[split{index}]{compressor.scale_filter(output_size)}[out{index}]"
+    cmd = [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y", "-i", input_path,
+           "-filter_complex", graph]
+    encoder_threads = max(1, threads // len(outputs))
+    for index, (child, output_path, video_kbps, audio_plan, _) in enumerate(outputs):
+        output_ext = os.path.splitext(output_path)[1]
+        cmd += ["-map", f"[out{index}]"]
+        cmd += child.video_output_args(output_ext, video_kbps, preset, encoder_threads,
+                                       fps_cap, source_fps)
+        cmd += audio_plan.ffmpeg_args() + child.container_args(output_ext) + [output_path]
+    return cmd
+
+
+def compress_targets(compressor, input_path, outputs, progress_callback=None, preset="medium",
+                     threads=None, cpu_budget=None, cancel_token=None, trim=None,
+                     max_processing_time=None):
+    """
+    Compress one input to several targets (sizes, codecs, resolutions) from a single decode.
+
+    With the ffmpeg engine and a single-pass rate control, one ffmpeg process
+    decodes the input and runs the shared filters once, then ``split`` feeds
+    one encoder per target. Crop, content and audio analysis also run once;
+    each target is then planned, corrected and, if it overshoots, re-encoded
+    on its own by the same VideoCompressor steps compress_video() uses
+    (plan_encode(), correct_plan(), encode_until_fits()). Otherwise (MoviePy,
+    two-pass, a single target, an input long enough for a split encode) the
+    targets are compressed one after another with compress_video().
+
+    Args:
+        compressor: VideoCompressor with the settings every target starts from
+        input_path: Path to input video
+        outputs: List of (OutputTarget, output_path)
+        progress_callback: Optional callable receiving throttled progress dicts
+        preset: FFmpeg preset (e.g. 'medium', 'faster', 'veryfast')
+        threads: Encoder threads shared by all targets (planned if None)
+        cpu_budget: Cores this job may use for segmented encodes (all cores if None)
+        cancel_token: Optional CancellationToken
+        trim: Optional (start, end) range, cut once for all targets (as for compress_video())
+        max_processing_time: Optional time budget in seconds for all targets together
+            (as for compress_video(); targets encoded one by one get an equal share each)
+
+    Returns:
+        True if every output was written, False otherwise (see last_status)
+    """
+    if trim is not None:
+        def compress(cut_path):
+            return compress_targets(compressor, cut_path, outputs, progress_callback, preset,
+                                    threads, cpu_budget, cancel_token,
+                                    max_processing_time=max_processing_time)
+        return trimming.compress_range(compressor, input_path, trim, cancel_token, compress)
+    video_name = compressor.name_of(input_path)
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    one_by_one = None
+    if compressor.engine != ENGINE_FFMPEG or compressor.rate_control == RATE_TWO_PASS:
+        one_by_one = "a shared decode needs the ffmpeg engine and a single-pass mode"
+    elif len(outputs) > 1 and compressor.segmented and os.path.exists(input_path):
+        info = compressor.probe(input_path)
+        if info is not None and compressor.should_segment(info.duration or 0, cpu_budget):
+            one_by_one = "each is split into chunks that are encoded in parallel"
+    if len(outputs) == 1 or one_by_one:
+        if len(outputs) > 1:
+            print(Fore.YELLOW + f"🔁 {video_name}: {len(outputs)} targets are encoded one "
+                                f"after another ({one_by_one})")
+        share = max_processing_time / len(outputs) if max_processing_time else None
+        for target, output_path in outputs:
+            child = compressor.for_target(target)
+            written = child.compress_video(input_path, output_path, progress_callback,
+                                           max_processing_time=share, preset=preset,
+                                           threads=threads, cpu_budget=cpu_budget,
+                                           cancel_token=cancel_token)
+            compressor.last_status = child.last_status
+            if not written:
+                return False
+        return True
+
+    described = ", ".join(target.describe() for target, _ in outputs)
+    print(Fore.CYAN + f"\n🎬 Compressing: {video_name} to {len(outputs)} targets "
+                      f"({described}) from one decode")
+    compressor.begin_file(cancel_token)
+    if not os.path.exists(input_path):
+        print(Fore.RED + f"⚠️ Error: {video_name} - File not found.")
+        return False
+    info = compressor.probe(input_path)
+    if info is None or not compressor.check_duration(info.duration, video_name):
+        return False
+    duration = info.duration
+    compressor.track_progress(progress_callback, duration, max_processing_time, video_name)
+
+    # Everything that depends only on the input is decided once for all targets
+    compressor.plan_crop(input_path, info)
+    compressor.plan_content(input_path, info)
+    fps_cap = compressor.plan_fps_cap(info)
+    levels = scan_audio_levels(input_path, info) if info.audio_streams else None
+
+    plans = []
+    for target, output_path in outputs:
+        child = compressor.for_target(target)
+        # Hardlinked from the result cache; never overwrite in place
+        if os.path.isfile(output_path) and os.stat(output_path).st_nlink > 1:
+            os.remove(output_path)
+        if child.try_passthrough(input_path, output_path, info):
+            continue
+        plan = child.plan_encode(input_path, output_path, info, fps_cap, levels, report=False)
+        # Corrected like a single encode: from samples of this target, else from history
+        output_height = (plan.output_size or compressor.frame_size(info))[1]
+        child.correct_plan(plan, input_path, info, preset,
+                           threads or plan_threads(output_height, duration))
+        if compressor.is_cancelled():
+            compressor.last_status = STATUS_CANCELLED
+            print(Fore.YELLOW + f"🚫 Cancelled: {video_name}")
+            return False
+        print(Fore.CYAN + f"🎯 {target.describe()}: {plan.video_kbps}k "
+                          f"{child.backend.label} | audio: {plan.audio_plan.describe()}")
+        plan.output_size = child.plan_output_size(info, plan.video_kbps)
+        plans.append((child, plan))
+    if not plans:
+        compressor.last_status = STATUS_DONE
+        return True
+
+    if threads is None:
+        output_height = max((plan.output_size or compressor.frame_size(info))[1] or 0
+                            for _, plan in plans)
+        threads = plan_threads(output_height, duration)
+    print(Fore.CYAN + f"🧵 {len(plans)} encoders share one decode, "
+                      f"{max(1, threads // len(plans))} threads each")
+    encode_start = time.time()
+    cmd = build_multi_command(compressor, input_path,
+                              [(child, plan.output_path, plan.video_kbps, plan.audio_plan,
+                                plan.output_size) for child, plan in plans],
+                              preset, threads, fps_cap, info.fps)
+    written = compressor.run_ffmpeg_step(cmd, input_path, compressor.progress.step("encode"))
+    if compressor.is_cancelled() or compressor.timed_out or not written:
+        for _, plan in plans:
+            compressor.discard_partial_output(plan.output_path, None)
+        if compressor.is_cancelled():
+            compressor.last_status = STATUS_CANCELLED
+            print(Fore.YELLOW + f"🚫 Cancelled: {video_name}")
+        else:
+            compressor.last_status = STATUS_TIMEOUT if compressor.timed_out else STATUS_FAILED
+        return False
+    print(Fore.CYAN + f"⏱️ {len(plans)} outputs encoded in {time.time() - encode_start:.1f}s")
+
+    # An output that missed its target is re-encoded on its own, as compress_video() would
+    all_written = True
+    for child, plan in plans:
+        output_name = os.path.basename(plan.output_path)
+        if not os.path.exists(plan.output_path):
+            print(Fore.RED + f"⚠️ Error: Output file was not created: {plan.output_path}")
+            all_written = False
+            continue
+        kept = child.encode_until_fits(input_path, info, plan, preset, threads, cpu_budget)
+        if kept is None:
+            compressor.last_status = STATUS_CANCELLED
+            print(Fore.YELLOW + f"🚫 Cancelled: {video_name}")
+            return False
+        size_mb, attempts = kept
+        retries = f" after {attempts} attempts" if attempts > 1 else ""
+        if size_mb > child.target_size_mb * SIZE_TOLERANCE:
+            print(Fore.YELLOW + f"⚠️ Warning: {output_name} is {size_mb:.2f} MB "
+                                f"(target was {child.target_size_mb} MB){retries}")
+        else:
+            print(Fore.GREEN + f"✅ Done: {output_name} ({size_mb:.2f} MB / "
+                               f"{child.target_size_mb} MB target){retries}")
+    compressor.last_status = STATUS_DONE if all_written else STATUS_FAILED
+    return all_written
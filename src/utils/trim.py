@@ -0,0 +1,339 @@
+import os
+import re
+import shutil
+import time
+
+from colorama import Fore
+
+from utils import segments
+from utils.constants import STATUS_FAILED, STATUS_CANCELLED, STATUS_TIMEOUT
+from utils.ffmpeg_tools import get_ffmpeg_path
+
+# The re-encoded edges of a smart cut are close to transparent; they are a small part of the range
+EDGE_CRF = 16
+EDGE_PRESET = "veryfast"
+# Video codecs whose keyframe-aligned middle can be copied and joined to x264-encoded edges
+SMART_CUT_CODECS = ("h264",)
+# Copying less than this is not worth the extra steps; the whole range is re-encoded instead
+MIN_COPY_SECONDS = 1.0
+
+
+def parse_time(text):
+    """
+    Read a time like "95", "1:35" or "1:01:35.5" in seconds.
+
+    Raises:
+        ValueError: If the text is not a time
+    """
+    parts = text.strip().split(":")
+    if not 1 <= len(parts) <= 3 or not all(re.fullmatch(r"\d+(\.\d*)?", part) for part in parts):
+        raise ValueError(f"Invalid time: {text!r}")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def format_time(seconds):
+    """Short display of a time, e.g. "12:30" or "1:02:03.5"."""
+    minutes, secs = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    text = f"{minutes:02d}:{secs:04.1f}" if hours else f"{minutes}:{secs:04.1f}"
+    text = text[:-2] if text.endswith(".0") else text
+    return f"{hours}:{text}" if hours else text
+
+
+def parse_range(text):
+    """
+    Read a time range like "12:30-13:10", "-1:00" (from the start) or "45:00-" (to the end).
+
+    Returns:
+        (start, end) in seconds with end None for "to the end", or None for an empty text
+
+    Raises:
+        ValueError: If a time is invalid or the range is empty
+    """
+    text = text.strip()
+    if not text:
+        return None
+    if text.count("-") != 1:
+        raise ValueError(f"Invalid range: {text!r}")
+    start_text, end_text = text.split("-")
+    start = parse_time(start_text) if start_text.strip() else 0.0
+    end = parse_time(end_text) if end_text.strip() else None
+    if end is not None and end <= start:
+        raise ValueError(f"Range ends before it starts: {text!r}")
+    return start, end
+
+
+def trimmed_duration(trim, duration):
+    """Length of a range within an input of the given duration (the whole duration without one)."""
+    if trim is None or not duration:
+        return duration
+    start, end = trim
+    return max(min(end if end is not None else duration, duration) - start, 0.0)
+
+
+def build_keyframe_command(input_path, output_path, start, end):
+    """
+    List the packets of the first video stream around [start, end] as framecrc, demuxing only.
+
+    The listing goes to a file: the runner keeps stdout for ffmpeg's progress.
+    """
+    # One second past the end, so a keyframe right at the end counts
+    return [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y", "-copyts",
+            "-ss", f"{start:.3f}", "-t", f"{end - start + 1:.3f}", "-i", input_path,
+            "-map", "0:v:0", "-c", "copy", "-f", "framecrc", output_path]
+
+
+def parse_packets(text):
+    """
+    Packets from framecrc lines ("stream, dts, pts, duration, size, hash[, F=flags]").
+
+    Returns:
+        (pts in seconds, is keyframe) per packet, in decode order
+    """
+    time_base = None
+    packets = []
+    for line in text.splitlines():
+        match = re.match(r"#tb 0: (\d+)/(\d+)", line)
+        if match:
+            time_base = int(match.group(1)) / int(match.group(2))
+            continue
+        if line.startswith("#") or time_base is None:
+            continue
+        fields = [field.strip() for field in line.split(",")]
+        try:
+            pts = int(fields[2])
+            has_flags = len(fields) > 6 and fields[6].startswith("F=")
+            flags = int(fields[6][2:], 16) if has_flags else 1  # Omitted: keyframe only
+        except (IndexError, ValueError):
+            continue
+        packets.append((pts * time_base, bool(flags & 1)))
+    return packets
+
+
+def parse_keyframes(text):
+    """Keyframe times from framecrc lines ("stream, dts, pts, duration, size, hash[, F=flags]")."""
+    return sorted(pts for pts, keyframe in parse_packets(text) if keyframe)
+
+
+def count_copied_frames(packets, copy_start, copy_end):
+    """
+    Number of packets a copy of [copy_start, copy_end) takes, from the keyframe at copy_start.
+
+    A copy limited by time stops on decode timestamps, which run behind the
+    presentation timestamps when there are B-frames: it would also take the
+    keyframe at copy_end, which the next part re-encodes. Counting packets in
+    decode order up to that keyframe takes exactly the GOPs in between.
+
+    Returns:
+        The packet count, or None when either keyframe is missing from the listing
+    """
+    def keyframe_index(seconds):
+        return next((index for index, (pts, keyframe) in enumerate(packets)
+                     if keyframe and abs(pts - seconds) < 1e-3), None)
+
+    first, last = keyframe_index(copy_start), keyframe_index(copy_end)
+    if first is None or last is None or last <= first:
+        return None
+    return last - first
+
+
+def plan_smart_cut(keyframes, start, end, min_copy_seconds=MIN_COPY_SECONDS):
+    """
+    The keyframe-aligned middle of [start, end] that can be copied without re-encoding.
+
+    Returns:
+        (copy_start, copy_end) between the first and last keyframe inside the
+        range, or None when that span is shorter than min_copy_seconds
+    """
+    inside = [time for time in keyframes if start - 1e-3 <= time <= end + 1e-3]
+    if len(inside) < 2 or inside[-1] - inside[0] < min_copy_seconds:
+        return None
+    return max(inside[0], start), min(inside[-1], end)
+
+
+def build_edge_command(input_path, output_path, start, seconds):
+    """Re-encode the video of a partial GOP at a range's edge (or a whole range), near-lossless."""
+    return [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y",
+            "-ss", f"{start:.6f}", "-t", f"{seconds:.6f}", "-i", input_path, "-map", "0:v:0", "-an",
+            "-c:v", "libx264", "-preset", EDGE_PRESET, "-crf", str(EDGE_CRF),
+            "-pix_fmt", "yuv420p", "-fps_mode", "passthrough", output_path]
+
+
+def build_copy_command(input_path, output_path, start, frames):
+    """Copy the video of whole GOPs: frames packets in decode order, starting on a keyframe."""
+    return [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y",
+            "-ss", f"{start:.6f}", "-i", input_path,
+            "-map", "0:v:0", "-an", "-c", "copy", "-frames:v", str(frames), output_path]
+
+
+def build_audio_command(input_path, audio_path, start, seconds):
+    """
+    Copy the first audio track of a range (Matroska audio takes any codec).
+
+    The input seek lands on the video keyframe before start; the output-side
+    "-ss 0" drops the audio packets of that lead-in.
+    """
+    return [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y",
+            "-ss", f"{start:.6f}", "-i", input_path, "-map", "0:a:0", "-vn", "-c", "copy",
+            "-ss", "0", "-t", f"{seconds:.6f}", audio_path]
+
+
+def build_join_command(list_path, parts, output_path, audio_path=None):
+    """
+    Join the video parts of a smart cut, adding the range's audio when there is any.
+
+    The concat demuxer converts the parts to Annex B, so every part keeps its own
+    parameter sets even though the edges and the copied middle come from different
+    encoders. Each part is listed with its planned duration: the next part starts
+    exactly there rather than where the part's container says it ends. The audio
+    comes from its own file: a seek on an input of this command would shift the video.
+
+    Args:
+        list_path: Path receiving the concat list
+        parts: (path, seconds) of each part, in order
+        output_path: Path of the joined cut
+        audio_path: Audio of the whole range, or None
+    """
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path, seconds in parts:
+            escaped = os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+            f.write(f"file '{escaped}'\nduration {seconds:.6f}\n")
+    cmd = [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-y",
+           "-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_path:
+        cmd += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0"]
+    return cmd + ["-c", "copy", output_path]
+
+
+def list_packets(compressor, input_path, start, end, scratch_dir):
+    """
+    Packets of the first video stream around [start, end], from demuxing only.
+
+    Runs through the compressor's ffmpeg runner, so a cancel or a stall stops it.
+
+    Returns:
+        (pts in seconds, is keyframe) per packet in decode order (empty if the listing failed)
+    """
+    listing_path = os.path.join(scratch_dir, "keyframes.crc")
+    if not compressor.run_ffmpeg_step(build_keyframe_command(input_path, listing_path, start, end),
+                                      input_path):
+        return []
+    with open(listing_path, encoding="utf-8", errors="replace") as f:
+        return parse_packets(f.read())
+
+
+def list_keyframes(compressor, input_path, start, end, scratch_dir):
+    """Sorted keyframe times of the first video stream around [start, end] (see list_packets())."""
+    packets = list_packets(compressor, input_path, start, end, scratch_dir)
+    return sorted(pts for pts, keyframe in packets if keyframe)
+
+
+def cut_range(compressor, input_path, trim, scratch_dir):
+    """
+    Cut a time range out of the input with as little encoding as possible.
+
+    The input is only read from the range onwards (seek before decode). For
+    H.264 inputs the whole GOPs inside the range are copied and only the
+    partial GOPs at each edge are re-encoded (smart rendering); other inputs,
+    and ranges without a whole GOP, are re-encoded at near-source quality.
+    Audio is copied.
+
+    Args:
+        compressor: VideoCompressor running the ffmpeg steps
+        input_path: Path to input video
+        trim: (start, end) in seconds, end None for the end of the file
+        scratch_dir: Directory receiving the cut and its parts
+
+    Returns:
+        Path of the cut, or None on failure
+    """
+    video_name = os.path.basename(input_path)
+    info = compressor.probe(input_path)
+    if info is None or not info.duration:
+        print(Fore.RED + f"⚠️ Error: {video_name} - Could not read its duration, "
+                         f"cannot cut a range.")
+        return None
+    start, end = trim[0], min(trim[1] or info.duration, info.duration)
+    seconds = end - start
+    if seconds < 0.1:
+        print(Fore.RED + f"⚠️ Error: {video_name} - Range {format_time(start)}-{format_time(end)} "
+                         f"is outside the {format_time(info.duration)} file.")
+        return None
+
+    start_time = time.time()
+    cut_path = os.path.join(scratch_dir, "cut.mkv")
+    copy_span = copy_frames = None
+    if info.video_codec in SMART_CUT_CODECS and not info.rotation:
+        packets = list_packets(compressor, input_path, start, end, scratch_dir)
+        if compressor.is_cancelled() or compressor.timed_out:
+            return None
+        copy_span = plan_smart_cut(sorted(pts for pts, keyframe in packets if keyframe), start, end)
+        if copy_span is not None:
+            copy_frames = count_copied_frames(packets, *copy_span)
+            copy_span = copy_span if copy_frames else None
+    if copy_span is None:
+        spans = [(start, end, False)]
+        method = f"{seconds:.1f}s re-encoded (no whole GOP that can be copied)"
+    else:
+        copy_start, copy_end = copy_span
+        copied = copy_end - copy_start
+        spans = [(start, copy_start, False), (copy_start, copy_end, True), (copy_end, end, False)]
+        method = f"{copied:.1f}s copied, {seconds - copied:.1f}s re-encoded at the edges"
+    parts = []
+    for part_start, part_end, copy in spans:
+        if part_end - part_start < 0.001:
+            continue  # The range starts or ends right on a keyframe
+        part_path = os.path.join(scratch_dir, f"part{len(parts)}.mp4")
+        if copy:
+            cmd = build_copy_command(input_path, part_path, part_start, copy_frames)
+        else:
+            cmd = build_edge_command(input_path, part_path, part_start, part_end - part_start)
+        if not compressor.run_ffmpeg_step(cmd, input_path):
+            return None
+        parts.append((part_path, part_end - part_start))
+    audio_path = None
+    if info.has_audio:
+        audio_path = os.path.join(scratch_dir, "audio.mka")
+        cmd = build_audio_command(input_path, audio_path, start, seconds)
+        if not compressor.run_ffmpeg_step(cmd, input_path):
+            return None
+    join = build_join_command(os.path.join(scratch_dir, "parts.txt"), parts, cut_path, audio_path)
+    if not compressor.run_ffmpeg_step(join, input_path):
+        return None
+    print(Fore.CYAN + f"⏩ Range {format_time(start)}-{format_time(end)} of {video_name} "
+                      f"({seconds:.1f}s of {info.duration:.0f}s): {method}, "
+                      f"in {time.time() - start_time:.1f}s")
+    return cut_path
+
+
+def compress_range(compressor, input_path, trim, cancel_token, compress):
+    """
+    Cut the range into a scratch directory, run compress(cut_path) on it, and clean up.
+
+    While compress() runs, the compressor's messages name input_path rather than the cut.
+
+    Returns:
+        The result of compress(), or False when the cut failed (see last_status)
+    """
+    compressor.cancel_token = cancel_token
+    compressor.timed_out = False
+    compressor.last_status = STATUS_FAILED
+    video_name = os.path.basename(input_path)
+    scratch_dir = segments.make_scratch_dir(prefix="range_")
+    try:
+        cut_path = cut_range(compressor, input_path, trim, scratch_dir)
+        if cut_path is None:
+            if compressor.is_cancelled():
+                compressor.last_status = STATUS_CANCELLED
+                print(Fore.YELLOW + f"🚫 Cancelled: {video_name}")
+            elif compressor.timed_out:
+                compressor.last_status = STATUS_TIMEOUT
+            return False
+        compressor.display_name = video_name
+        return compress(cut_path)
+    finally:
+        compressor.display_name = None
+        shutil.rmtree(scratch_dir, ignore_errors=True)
@@ -0,0 +1,64 @@
+import time
+
+# An encode whose output stops advancing for this long is considered hung
+DEFAULT_STALL_SECONDS = 20
+# Grace period before the first progress (probing, encoder lookahead, pass-1 warm-up)
+DEFAULT_STARTUP_SECONDS = 60
+
+
+class StallWatchdog:
+    """
+    Detects encodes that stopped making progress.
+
+    Fed with parse_progress() dicts; the encode counts as alive while its
+    output timestamp or output size keeps advancing. Healthy encodes are
+    never cut off however long they take, while a decoder hung on a corrupt
+    file is caught after stall_seconds without progress.
+    """
+
+    def __init__(self, stall_seconds=DEFAULT_STALL_SECONDS, startup_seconds=DEFAULT_STARTUP_SECONDS,
+                 clock=time.monotonic):
+        """
+        Args:
+            stall_seconds: Seconds without progress after which the encode is hung
+            startup_seconds: Seconds allowed before the first progress is seen
+            clock: Monotonic time source (injectable for tests)
+        """
+        self.stall_seconds = stall_seconds
+        self.startup_seconds = max(startup_seconds, stall_seconds)
+        self._clock = clock
+        self._started = clock()
+        self._last_advance = None
+        self._last_mark = None
+        self.stalled = False
+        self.reason = None
+
+    def observe(self, stats):
+        """Record a progress update; only an advancing timestamp or size counts as progress."""
+        mark = (stats.get("out_time"), stats.get("total_size"))
+        if mark != self._last_mark and any(mark):
+            self._last_mark = mark
+            self.touch()
+
+    def touch(self):
+        """Record progress that has no timestamp (e.g. MoviePy's frame and audio chunk counters)."""
+        self._last_advance = self._clock()
+
+    def expired(self):
+        """
+        Check whether the encode has stalled (stays True once tripped).
+
+        Returns:
+            True if no progress was seen within the allowed window
+        """
+        if self.stalled:
+            return True
+        now = self._clock()
+        if self._last_advance is None:
+            if now - self._started > self.startup_seconds:
+                self.stalled = True
+                self.reason = f"no progress within {self.startup_seconds:.0f}s of starting"
+        elif now - self._last_advance > self.stall_seconds:
+            self.stalled = True
+            self.reason = f"no progress for {self.stall_seconds:.0f}s"
+        return self.stalled
@@ -152,6 +152,28 @@ class TestAppLogic:
             if index == total_files - 1:
                 assert progress == 1.0
     
+    def test_batch_settings_build_compressor(self):
+        """Test that the batch settings give every job the app's compressor settings"""
+        from utils.batch_settings import BatchSettings
+        
+        batch = BatchSettings(target_sizes=(25.0,), preset="faster", suffix="_c", engine="ffmpeg",
+                              crop=False, max_fps=24.0)
+        compressor = VideoCompressor(**batch.compressor_kwargs())
+        assert compressor.target_size_mb == 25.0 and compressor.max_fps == 24.0
+        assert compressor.predict_size and compressor.allocate_bitrate and compressor.auto_downscale
+        assert not compressor.auto_crop
+    
+    def test_processing_budget_follows_mode_and_outputs(self):
+        """Test that the time budget scales with duration, mode and output count"""
+        from utils.budget import processing_budget, BUDGET_OVERHEAD_SECONDS
+        
+        assert processing_budget("Fast", None) is None
+        fast = processing_budget("Fast", 600)
+        assert fast == 600 + BUDGET_OVERHEAD_SECONDS
+        assert processing_budget("Two-Pass", 600) > processing_budget("Balanced", 600) > fast
+        assert processing_budget("Fast", 600, outputs=2) == 1200 + BUDGET_OVERHEAD_SECONDS
+        assert processing_budget("Unknown", 600) == fast
+    
     def test_suffix_default_value(self):
         """Test suffix default value handling"""
         suffix = "" or "_compressed"
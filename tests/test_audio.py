@@ -0,0 +1,124 @@
+import pytest
+import os
+import sys
+import subprocess
+import tempfile
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from compressor import VideoCompressor, ENGINE_FFMPEG
+from utils.audio import AudioPlan, TrackLevels, plan_audio, scan_audio_levels
+from utils.ffmpeg_tools import get_ffmpeg_path
+from utils.media_info import MediaInfo, StreamInfo
+
+
+def media_info(*tracks, duration=60.0):
+    """MediaInfo with one video stream and the given (codec, channels, bit_rate) audio tracks."""
+    streams = [StreamInfo(0, "video", codec_name="h264", width=1280, height=720, fps=30.0)]
+    for index, (codec, channels, bit_rate) in enumerate(tracks, start=1):
+        streams.append(StreamInfo(index, "audio", codec_name=codec, channels=channels, bit_rate=bit_rate, sample_rate=48000))
+    return MediaInfo("input.mp4", size_bytes=50 * 1024 * 1024, duration=duration, streams=streams)
+
+
+MUSIC = TrackLevels(max_db=-3.0, mean_db=-18.0, side_max_db=-12.0, high_mean_db=-30.0)
+SPEECH = TrackLevels(max_db=-6.0, mean_db=-24.0, high_mean_db=-55.0)
+SILENT = TrackLevels(max_db=-91.0, mean_db=-91.0, side_max_db=-91.0, high_mean_db=-91.0)
+
+
+class TestAudioPlanner:
+    """Test suite for per-file audio decisions"""
+
+    def test_no_audio(self):
+        """Test that files without audio get -an and no audio budget"""
+        plan = plan_audio(media_info(), 1000, ".mp4")
+        assert plan.mode == "none"
+        assert plan.bitrate_kbps == 0
+        assert plan.ffmpeg_args() == ["-an"]
+
+    def test_silent_track_dropped(self):
+        """Test that a silent screen-recording track is dropped"""
+        plan = plan_audio(media_info(("aac", 2, 128000)), 1000, ".mp4", levels={0: SILENT})
+        assert plan.mode == "none"
+
+    def test_first_audible_track_kept(self):
+        """Test that a silent first track is skipped in favour of the microphone track"""
+        plan = plan_audio(media_info(("aac", 2, 128000), ("opus", 1, 96000)), 1000, ".mp4", levels={0: SILENT, 1: SPEECH})
+        assert plan.mode == "encode"
+        assert plan.ffmpeg_args()[:2] == ["-map", "0:a:1"]
+        assert plan.bitrate_kbps == 48
+
+    def test_speech_downmixed_to_mono(self):
+        """Test that stereo speech is encoded as mono at a speech bitrate"""
+        plan = plan_audio(media_info(("opus", 2, None)), 1000, ".mp4", levels={0: SPEECH})
+        args = plan.ffmpeg_args()
+        assert args[args.index("-ac") + 1] == "1"
+        assert args[args.index("-b:a") + 1] == "48k"
+
+    def test_dual_mono_downmixed(self):
+        """Test that music with identical channels is downmixed"""
+        levels = TrackLevels(max_db=-3.0, mean_db=-18.0, side_max_db=-91.0, high_mean_db=-30.0)
+        plan = plan_audio(media_info(("mp3", 2, 192000)), 1000, ".mp4", levels={0: levels})
+        assert plan.channels == 1
+        assert plan.bitrate_kbps == 64
+
+    def test_compatible_aac_copied(self):
+        """Test that small stereo AAC is copied instead of re-encoded"""
+        plan = plan_audio(media_info(("aac", 2, 96000)), 1000, ".mp4", levels={0: MUSIC})
+        assert plan.mode == "copy"
+        assert plan.bitrate_kbps == 96
+        assert plan.ffmpeg_args() == ["-map", "0:a:0", "-c:a", "copy"]
+        # WebM cannot hold AAC
+        assert plan_audio(media_info(("aac", 2, 96000)), 1000, ".webm", levels={0: MUSIC}).mode == "encode"
+
+    def test_small_budget_caps_audio(self):
+        """Test that audio never takes more than its share of a tiny budget"""
+        plan = plan_audio(media_info(("flac", 2, 900000)), 200, ".mp4", levels={0: MUSIC})
+        assert plan.bitrate_kbps == 40
+
+    def test_scan_audio_levels(self):
+        """Test a real level scan of a stereo tone and a silent second track"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "tracks.mkv")
+            cmd = [get_ffmpeg_path(), "-v", "error", "-y",
+                   "-f", "lavfi", "-i", "sine=frequency=440:duration=2", "-f", "lavfi", "-i", "anullsrc=duration=2",
+                   "-filter_complex", "[0:a]pan=stereo|c0=c0|c1=c0[tone]", "-map", "[tone]", "-map", "1:a",
+                   "-c:a", "pcm_s16le", path]
+            try:
+                subprocess.run(cmd, check=True, capture_output=True)
+            except (OSError, subprocess.CalledProcessError):
+                pytest.skip("ffmpeg not available")
+
+            levels = scan_audio_levels(path, media_info(("pcm_s16le", 2, None), ("pcm_s16le", 2, None), duration=2.0))
+        assert levels[0].silent == False
+        assert levels[0].dual_mono == True
+        assert levels[1].silent == True
+
+    @patch('compressor.scan_audio_levels')
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    def test_saved_audio_bits_go_to_video(self, mock_probe, mock_run_ffmpeg, mock_scan):
+        """Test that dropping a silent track raises the video bitrate"""
+        mock_run_ffmpeg.return_value = (0, "")
+        mock_probe.return_value = media_info(("aac", 2, 128000))
+        bitrates = {}
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            for path in (input_path, output_path):
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 4096)
+
+            for name, levels in (("music", {0: MUSIC}), ("silent", {0: SILENT})):
+                mock_scan.return_value = levels
+                VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG).compress_video(input_path, output_path)
+                cmd = mock_run_ffmpeg.call_args[0][0]
+                bitrates[name] = int(cmd[cmd.index("-b:v") + 1].rstrip("k"))
+                assert ("-an" in cmd) == (name == "silent")
+
+        assert bitrates["silent"] - bitrates["music"] == 128
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,114 @@
+import pytest
+import os
+import sys
+import time
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from utils.batch_executor import BatchExecutor, default_worker_count
+from utils.concurrency import ConcurrencyPlanner, plan_threads, useful_threads
+
+
+class TestConcurrencyPlanner:
+    """Test suite for splitting cores between jobs and encoder threads"""
+
+    def test_useful_threads_by_resolution(self):
+        """Test that low resolutions get fewer threads"""
+        assert useful_threads(360, 600) == 4
+        assert useful_threads(720, 600) == 6
+        assert useful_threads(1080, 600) == 8
+        assert useful_threads(2160, 600) == 16
+        # Unknown files are planned as 1080p, short clips get half
+        assert useful_threads(None, None) == 8
+        assert useful_threads(1080, 10) == 4
+
+    def test_plan_threads_bounded_by_cores(self):
+        """Test that a single job never asks for more threads than cores"""
+        assert plan_threads(2160, 600, cpu_count=2) == 2
+        assert plan_threads(480, 600, cpu_count=32) == 4
+
+    def test_plan_workers_saturates_cores(self):
+        """Test that workers times useful threads matches the core count"""
+        planner = ConcurrencyPlanner(cpu_count=16)
+        assert planner.plan_workers([(480, 600)] * 10) == 4
+        assert planner.plan_workers([(1080, 600)] * 10) == 2
+        assert planner.plan_workers([(1080, 600)]) == 1
+        assert ConcurrencyPlanner(cpu_count=2).plan_workers([(1080, 600)] * 5) == 1
+
+    def test_plan_workers_respects_user_choice(self):
+        """Test that a fixed worker count overrides the plan"""
+        planner = ConcurrencyPlanner(cpu_count=16, max_workers=3)
+        assert planner.plan_workers([(1080, 600)] * 10) == 3
+        assert planner.plan_workers([(1080, 600)] * 2) == 2
+
+    def test_threads_for_uses_freed_cores(self):
+        """Test that the last jobs of a batch get the cores of finished workers"""
+        planner = ConcurrencyPlanner(cpu_count=16)
+        assert planner.threads_for(480, 600, workers=4, jobs_left=10) == 4
+        assert planner.threads_for(2160, 600, workers=4, jobs_left=10) == 4
+        assert planner.threads_for(2160, 600, workers=4, jobs_left=1) == 16
+        assert planner.threads_for(480, 600, workers=4, jobs_left=1) == 4
+
+
+class TestBatchExecutor:
+    """Test suite for process-pool batch compression"""
+
+    def test_default_worker_count_scales_with_cores(self):
+        """Test that the default pool size follows the core count"""
+        assert default_worker_count(16) == 4
+        assert default_worker_count(2) == 1
+        assert default_worker_count(None) >= 1
+
+    def test_jobs_run_in_worker_processes(self, tmp_path):
+        """Test that jobs run in parallel workers and report events and results"""
+        executor = BatchExecutor(max_workers=2)
+        try:
+            for job_id in range(2):
+                executor.submit(job_id, {
+                    'input_path': str(tmp_path / f"missing{job_id}.mp4"),
+                    'output_path': str(tmp_path / f"out{job_id}.mp4"),
+                    'preset': "faster",
+                    'compressor': {'target_size_mb': 10},
+                })
+            assert executor.active_jobs == 2
+
+            results, events = [], []
+            deadline = time.time() + 60
+            while len(results) < 2 and time.time() < deadline:
+                event = executor.get_event(timeout=0.2)
+                if event is not None:
+                    events.append(event)
+                results += executor.poll_finished()
+        finally:
+            executor.shutdown()
+
+        assert sorted(r['job_id'] for r in results) == [0, 1]
+        assert all(r['success'] == False for r in results)
+        assert ("status", results[0]['job_id'], "Processing...", "orange") in events or len(events) < 2
+
+
+    def test_cancelled_jobs_do_not_start(self, tmp_path):
+        """Test that jobs picked up after cancel() report cancelled without encoding"""
+        executor = BatchExecutor(max_workers=1)
+        try:
+            executor.cancel()
+            executor.submit(0, {
+                'input_path': str(tmp_path / "missing.mp4"),
+                'output_path': str(tmp_path / "out.mp4"),
+                'preset': "faster",
+                'compressor': {'target_size_mb': 10},
+            })
+            results = []
+            deadline = time.time() + 60
+            while not results and time.time() < deadline:
+                results = executor.poll_finished()
+                time.sleep(0.05)
+        finally:
+            executor.shutdown()
+
+        assert results[0]['status'] == "cancelled"
+        assert results[0]['success'] == False
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
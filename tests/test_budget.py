@@ -0,0 +1,112 @@
+import pytest
+import os
+import sys
+import subprocess
+import tempfile
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from utils.budget import BatchBudget, plan_batch_budget, predict_complexity
+from utils.cancellation import CancellationToken
+from utils.complexity import ComplexityCurve
+from utils.ffmpeg_tools import get_ffmpeg_path
+from utils.media_info import MediaInfo, StreamInfo, probe_media
+
+
+class TestBatchBudget:
+    """Test suite for splitting one size budget across a batch"""
+
+    def test_shares_follow_duration_resolution_and_complexity(self):
+        """Test that longer, larger and harder files get bigger shares of the same budget"""
+        budget = BatchBudget(100)
+        budget.add("short", 10, 1280, 720)
+        budget.add("long", 30, 1280, 720)
+        budget.add("big", 10, 1920, 1080)
+        weights = {key: entry.weight for key, entry in budget.entries.items()}
+        assert weights["long"] == pytest.approx(3 * weights["short"])
+        assert weights["big"] == pytest.approx(1.5 * weights["short"])
+
+        hard = BatchBudget(100)
+        hard.add("easy", 10, complexity=100)
+        hard.add("hard", 10, complexity=400)
+        assert hard.reserve("hard") == pytest.approx(100 * 2 / 3)
+        with pytest.raises(ValueError):
+            BatchBudget(0)
+
+    def test_rebalances_as_files_finish(self):
+        """Test that an undershoot goes to the files still waiting, and an overshoot comes out of them"""
+        budget = BatchBudget(30)
+        for key in ("a", "b", "c"):
+            budget.add(key, 10)
+        assert budget.reserve("a") == pytest.approx(10)
+        budget.finish("a", 4)  # 6 MB under its share
+        assert budget.reserve("b") == pytest.approx(13)
+        budget.finish("b", 16)  # 3 MB over
+        assert budget.reserve("c") == pytest.approx(10)
+        budget.finish("c", 9.5)
+        assert budget.used_mb() == pytest.approx(29.5)
+
+        spent = BatchBudget(30)
+        spent.spend(10)  # An output finished in an earlier run
+        spent.add("a", 10)
+        assert spent.reserve("a") == pytest.approx(20)
+
+    def test_unknown_duration_weighs_like_an_average_file(self):
+        """Test that a file of unknown length gets an average share instead of nothing"""
+        budget = BatchBudget(40)
+        budget.add("short", 10)
+        budget.add("long", 30)
+        budget.add("unknown", None)
+        assert budget.entries["unknown"].weight == pytest.approx(20)
+        assert budget.reserve("unknown") == pytest.approx(40 / 3)
+
+        none_known = BatchBudget(30)
+        for key in ("a", "b", "c"):
+            none_known.add(key, None)
+        assert none_known.reserve("a") == pytest.approx(10)
+
+    def test_cancelled_scan_returns_nothing(self):
+        """Test that a cancelled token stops the complexity scan (Abort before the batch starts)"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "in.mp4")
+            cmd = [get_ffmpeg_path(), "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=s=320x180:r=25:d=5",
+                   "-c:v", "libx264", "-preset", "ultrafast", path]
+            try:
+                subprocess.run(cmd, check=True, capture_output=True)
+            except (OSError, subprocess.CalledProcessError):
+                pytest.skip("ffmpeg not available")
+            info = probe_media(path)
+            token = CancellationToken()
+            token.cancel()
+            assert predict_complexity(path, info, tmpdir, cancel_token=token) is None
+            assert info.complexity is None
+            assert predict_complexity(path, info, tmpdir) is not None
+
+    def test_complexity_from_cached_curve(self):
+        """Test that a curve stored with the probe data is used without scanning"""
+        info = MediaInfo("missing.mp4", size_bytes=1, duration=10.0,
+                         streams=[StreamInfo(0, "video", codec_name="h264", width=640, height=360, fps=30.0)],
+                         complexity=ComplexityCurve([100, 300], duration=10.0).to_dict())
+        assert predict_complexity("missing.mp4", info, tempfile.gettempdir()) == pytest.approx(200)
+
+
+    def test_plan_batch_budget_registers_files_and_floor(self):
+        """Test that planning weighs known files by their range, keeps unknown ones, and reports the floor"""
+        def entry(key, duration, curve):
+            info = MediaInfo(f"missing_{key}.mp4", size_bytes=1, duration=duration,
+                             streams=[StreamInfo(0, "video", codec_name="h264", width=640, height=360, fps=30.0)],
+                             complexity=ComplexityCurve(curve, duration=duration).to_dict())
+            return {'id': key, 'info': info, 'job': {'input_path': info.path}}
+
+        jobs = [entry("a", 100.0, [100, 100]), entry("b", 100.0, [400, 400]),
+                {'id': "c", 'info': None, 'job': {'input_path': "missing_c.mp4"}}]
+        budget = BatchBudget(30)
+        floor_mb = plan_batch_budget(budget, jobs, 100, trim=(0.0, 60.0), workers=1)
+        assert floor_mb == pytest.approx(2 * 100 * 1000 / 8 * 60 / (1024 * 1024))
+        assert jobs[0]['duration'] == 60.0 and jobs[0]['height'] == 360
+        assert budget.entries["b"].weight > budget.entries["a"].weight
+        assert budget.entries["c"].duration is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,101 @@
+import pytest
+import os
+import sys
+import subprocess
+from unittest.mock import patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from compressor import VideoCompressor, ENGINE_FFMPEG, RATE_TWO_PASS, RATE_QUALITY
+from utils.codecs import BACKENDS, available_backends, get_backend, probe_encoders
+
+ENCODER_LIST = """Encoders:
+ V..... = Video
+ ------
+ V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10 (codec h264)
+ V....D libx265              libx265 H.265 / HEVC (codec hevc)
+ A....D aac                  AAC (Advanced Audio Coding)
+"""
+
+
+class TestCodecBackends:
+    """Test suite for codec backends and the encoder capability probe"""
+
+    def test_unknown_codec(self):
+        """Test that unknown codecs and impossible combinations are rejected"""
+        with pytest.raises(ValueError):
+            get_backend("mpeg2")
+        with pytest.raises(ValueError):
+            VideoCompressor(codec="vp9")  # MoviePy engine
+        with pytest.raises(ValueError):
+            VideoCompressor(engine=ENGINE_FFMPEG, rate_control=RATE_TWO_PASS, codec="av1")
+
+    def test_hevc_command(self):
+        """Test that HEVC gets its encoder, the hvc1 tag in MP4 and x265-style two-pass stats"""
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG, rate_control=RATE_TWO_PASS, codec="hevc")
+        cmd = compressor.build_ffmpeg_command("in.mp4", "out.mp4", 900, 128, pass_number=2, passlog_prefix="stats")
+        assert cmd[cmd.index("-c:v") + 1] == "libx265"
+        assert cmd[cmd.index("-tag:v") + 1] == "hvc1"
+        assert "pass=2:stats=stats-0.log" in cmd[cmd.index("-x265-params") + 1]
+        assert "-pass" not in cmd
+        assert "-tag:v" not in compressor.build_ffmpeg_command("in.mp4", "out.mkv", 900, 128)
+
+    def test_vp9_webm_command(self):
+        """Test that VP9 maps presets to libvpx speeds, uses constrained quality and Opus in WebM"""
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG, rate_control=RATE_QUALITY, codec="vp9")
+        cmd = compressor.build_ffmpeg_command("in.mp4", "out.webm", 900, 64, preset="veryfast")
+        assert cmd[cmd.index("-cpu-used") + 1] == "5"
+        assert "-preset" not in cmd
+        assert cmd[cmd.index("-b:v") + 1] == "900k" and "-crf" in cmd
+        assert cmd[cmd.index("-c:a") + 1] == "libopus"
+        assert "-movflags" not in cmd
+
+    def test_av1_presets(self):
+        """Test that x264 preset names map onto SVT-AV1's numeric presets"""
+        backend = get_backend("av1")
+        assert backend.speed_args("veryfast") == ["-preset", "10"]
+        assert backend.speed_args("medium") == ["-preset", "7"]
+        assert "-bufsize" not in backend.rate_args(1000, quality=True)
+
+    def test_efficient_codecs_keep_resolution(self):
+        """Test that codecs needing fewer bits per pixel are downscaled less"""
+        from utils.media_info import MediaInfo, StreamInfo
+        info = MediaInfo("in.mp4", size_bytes=1, duration=60.0,
+                         streams=[StreamInfo(0, "video", codec_name="h264", width=1920, height=1080, fps=30.0)])
+        h264 = VideoCompressor(engine=ENGINE_FFMPEG, auto_downscale=True).plan_output_size(info, 2000)
+        hevc = VideoCompressor(engine=ENGINE_FFMPEG, codec="hevc", auto_downscale=True).plan_output_size(info, 2000)
+        assert h264[1] < 1080
+        assert hevc is None or hevc[1] > h264[1]
+
+    def test_probe_is_cached_per_binary(self, tmp_path):
+        """Test that the probe runs once per ffmpeg binary and again after it changes"""
+        ffmpeg_path = tmp_path / "ffmpeg"
+        ffmpeg_path.write_text("")
+        cache_path = str(tmp_path / "encoders.json")
+
+        def fake_run(cmd, **kwargs):
+            stdout = ENCODER_LIST if "-encoders" in cmd else ""
+            # libx265 is listed but cannot open (e.g. a broken build)
+            return subprocess.CompletedProcess(cmd, 1 if "libx265" in cmd else 0, stdout=stdout, stderr="")
+
+        with patch('utils.codecs.subprocess.run', side_effect=fake_run) as mock_run:
+            assert probe_encoders(str(ffmpeg_path), cache_path) == ["h264"]
+            calls = mock_run.call_count
+            assert probe_encoders(str(ffmpeg_path), cache_path) == ["h264"]
+            assert mock_run.call_count == calls
+
+            os.utime(ffmpeg_path, ns=(0, 0))
+            probe_encoders(str(ffmpeg_path), cache_path)
+            assert mock_run.call_count > calls
+
+    def test_probe_bundled_ffmpeg(self, tmp_path):
+        """Test a real probe: H.264 is always there and every result is a known backend"""
+        available = available_backends(cache_path=str(tmp_path / "encoders.json"))
+        if [backend.name for backend in available] == ["h264"] and not os.path.exists(str(tmp_path / "encoders.json")):
+            pytest.skip("ffmpeg not available")
+        assert available[0].name == "h264"
+        assert all(backend.name in BACKENDS for backend in available)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
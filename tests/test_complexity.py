@@ -0,0 +1,78 @@
+import pytest
+import os
+import sys
+import subprocess
+import tempfile
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from compressor import VideoCompressor, ENGINE_FFMPEG
+from utils.complexity import ComplexityCurve, allocate, parse_scan, scan_complexity
+from utils.ffmpeg_tools import get_ffmpeg_path
+from utils.media_info import MediaInfo, StreamInfo
+
+
+def framecrc(sizes, fps=5):
+    """framecrc text for one frame per entry of sizes, at the scan frame rate."""
+    lines = ["#tb 0: 1/{}".format(fps)]
+    lines += ["0, {0}, {0}, 1, {1}, 0x00000000".format(index, size) for index, size in enumerate(sizes)]
+    return "\n".join(lines)
+
+
+class TestComplexityAllocation:
+    """Test suite for the complexity scan and complexity-aware bitrate allocation"""
+
+    def test_parse_scan(self):
+        """Test that frame sizes are summed per segment, skipping the opening intra frame"""
+        curve = parse_scan(framecrc([50000] + [100] * 24 + [1000] * 25 + [100] * 10), duration=12.0)
+        assert len(curve.values) == 3
+        assert curve.values[0] == pytest.approx(100 * 24 / 5)
+        assert curve.values[1] == pytest.approx(1000 * 25 / 5)
+        assert curve.values[2] == pytest.approx(100 * 10 / 2)  # The last segment is 2 s long
+        assert parse_scan("#tb 0: 1/5", duration=10.0) is None
+
+    def test_allocation_follows_complexity_and_keeps_total(self):
+        """Test that busy spans get more, idle spans less, and the total budget is unchanged"""
+        curve = ComplexityCurve([10, 10, 1000, 10, 10, 10], duration=30.0)
+        spans = [(0, 10), (10, 15), (15, 30)]
+        factors = allocate(curve, spans)
+        assert factors[1] > 2 and factors[0] < 1 and factors[2] < 1
+        assert sum(f * (end - start) for f, (start, end) in zip(factors, spans)) == pytest.approx(30.0)
+
+        flat = allocate(ComplexityCurve([5, 5, 5], duration=15.0), [(0, 7), (7, 15)])
+        assert flat == pytest.approx([1.0, 1.0])
+        assert allocate(ComplexityCurve([0, 0], duration=10.0), [(0, 5), (5, 10)]) == [1.0, 1.0]
+
+    def test_curve_cached_with_probe(self):
+        """Test that a curve already in the probe data is used without a scan, and allocation can be off"""
+        info = MediaInfo("in.mp4", size_bytes=1, duration=20.0,
+                         streams=[StreamInfo(0, "video", codec_name="h264", width=640, height=360, fps=30.0)],
+                         complexity=ComplexityCurve([1, 1, 40, 1], duration=20.0).to_dict())
+        restored = MediaInfo.from_dict(info.to_dict())
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG, segmented=True, allocate_bitrate=True)
+        curve = compressor.plan_complexity("missing.mp4", restored, tempfile.gettempdir())
+        factors = allocate(curve, [(0, 10), (10, 20)])
+        assert factors[1] > factors[0]
+        off = VideoCompressor(engine=ENGINE_FFMPEG, segmented=True)
+        assert off.plan_complexity("missing.mp4", restored, tempfile.gettempdir()) is None
+
+    def test_real_scan(self):
+        """Test a real scan: a still first half and a noisy second half"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "qa.mp4")
+            cmd = [get_ffmpeg_path(), "-v", "error", "-y", "-f", "lavfi", "-i", "color=gray:s=320x180:r=10:d=10",
+                   "-vf", "noise=alls=60:allf=t:enable='gte(t,5)'", "-c:v", "libx264", "-preset", "ultrafast", path]
+            try:
+                subprocess.run(cmd, check=True, capture_output=True)
+            except (OSError, subprocess.CalledProcessError):
+                pytest.skip("ffmpeg not available")
+            info = MediaInfo(path, size_bytes=os.path.getsize(path), duration=10.0,
+                             streams=[StreamInfo(0, "video", codec_name="h264", width=320, height=180, fps=10.0)])
+            curve, seconds = scan_complexity(path, info, tmpdir)
+        assert len(curve.values) == 2
+        assert curve.values[1] > 10 * curve.values[0]
+        assert seconds < 10
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
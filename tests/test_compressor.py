@@ -3,11 +3,23 @@ import os
 import sys
 import tempfile
 import shutil
+import subprocess
 from unittest.mock import Mock, patch, MagicMock, call
 
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
-from compressor import VideoCompressor
+from compressor import VideoCompressor, ENGINE_FFMPEG, ENGINE_MOVIEPY, RATE_TWO_PASS, RATE_QUALITY
+from utils import passlog
+from utils.media_info import MediaInfo, StreamInfo
+from utils.segments import plan_chunk_seconds
+from utils.resolution import plan_resolution
+from utils.predictor import SizePrediction, sample_windows
+from utils.rate_history import RateHistory, rate_profile
+from utils.audio import AudioPlan
+from utils.constants import MIN_RETARGET_KBPS
+from utils.cancellation import CancellationToken
+from utils.ffmpeg_tools import get_ffmpeg_path
+from utils.media_info import probe_media
 
 
 class TestVideoCompressor:
@@ -109,7 +121,7 @@ class TestVideoCompressor:
             # Mock output file creation
             with patch('os.path.exists') as mock_output_exists:
                 mock_output_exists.side_effect = lambda p: p == input_path or p == output_path
-                result = compressor.compress_video(input_path, output_path)
+                result = compressor.compress_video(input_path, output_path, threads=4)
             
             assert result == True
             mock_videofileclip.assert_called()
@@ -290,6 +302,759 @@ class TestVideoCompressor:
         # Should handle gracefully (may fail or overwrite)
         assert isinstance(result, bool)
 
+    
+    # ========== FFmpeg Engine Tests ==========
+    
+    def test_init_default_engine(self):
+        """Test that the MoviePy engine stays the default"""
+        compressor = VideoCompressor()
+        assert compressor.engine == ENGINE_MOVIEPY
+    
+    def test_init_invalid_engine(self):
+        """Test that an unknown engine is rejected"""
+        with pytest.raises(ValueError):
+            VideoCompressor(engine="gstreamer")
+    
+    def test_build_ffmpeg_command(self):
+        """Test the single-process ffmpeg command line"""
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG)
+        cmd = compressor.build_ffmpeg_command("in.mov", "out.mp4", 1200, 128, preset="faster", threads=2)
+        
+        assert cmd[cmd.index("-i") + 1] == "in.mov"
+        assert cmd[cmd.index("-c:v") + 1] == "libx264"
+        assert cmd[cmd.index("-b:v") + 1] == "1200k"
+        assert cmd[cmd.index("-b:a") + 1] == "128k"
+        assert cmd[cmd.index("-preset") + 1] == "faster"
+        assert cmd[cmd.index("-threads") + 1] == "2"
+        assert "+faststart" in cmd
+        assert cmd[-1] == "out.mp4"
+    
+    def test_build_ffmpeg_command_no_faststart_for_mkv(self):
+        """Test that MP4-only muxer flags are not passed to other containers"""
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG)
+        cmd = compressor.build_ffmpeg_command("in.mkv", "out.mkv", 1200, 128)
+        assert "-movflags" not in cmd
+    
+    @staticmethod
+    def _media_info(path="input.mp4", duration=60.0, size_bytes=50 * 1024 * 1024, video="h264", audio="aac",
+                    width=1920, height=1080, fps=30.0):
+        streams = [StreamInfo(0, "video", codec_name=video, width=width, height=height, fps=fps)]
+        if audio:
+            streams.append(StreamInfo(1, "audio", codec_name=audio, channels=2, sample_rate=48000))
+        return MediaInfo(path, size_bytes=size_bytes, duration=duration, streams=streams)
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    @patch('compressor.VideoFileClip')
+    def test_compress_video_ffmpeg_engine(self, mock_videofileclip, mock_probe, mock_run_ffmpeg):
+        """Test that the ffmpeg engine encodes without MoviePy's frame pipeline"""
+        mock_probe.return_value = self._media_info()
+        mock_run_ffmpeg.return_value = (0, "")
+        
+        compressor = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            with open(input_path, 'wb') as f:
+                f.write(b"x" * 4096)
+            with open(output_path, 'wb') as f:
+                f.write(b"x" * 4096)
+            
+            result = compressor.compress_video(input_path, output_path)
+        
+        assert result == True
+        mock_videofileclip.assert_not_called()
+        cmd = mock_run_ffmpeg.call_args[0][0]
+        assert cmd[cmd.index("-i") + 1] == input_path
+        assert cmd[-1] == output_path
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    def test_compress_video_ffmpeg_engine_failure(self, mock_probe, mock_run_ffmpeg):
+        """Test that a non-zero ffmpeg exit code is reported as failure"""
+        mock_probe.return_value = self._media_info()
+        mock_run_ffmpeg.return_value = (1, "Invalid data found when processing input")
+        
+        compressor = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            with open(input_path, 'wb') as f:
+                f.write(b"x" * 4096)
+            result = compressor.compress_video(input_path, os.path.join(tmpdir, "output.mp4"))
+        
+        assert result == False
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    def test_compress_video_plans_threads(self, mock_probe, mock_run_ffmpeg):
+        """Test that encoder threads follow resolution and core count instead of a fixed 4"""
+        mock_probe.return_value = self._media_info(width=854, height=480)
+        mock_run_ffmpeg.return_value = (0, "")
+        
+        compressor = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            for path in (input_path, output_path):
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 4096)
+            
+            with patch('utils.concurrency.os.cpu_count', return_value=32):
+                compressor.compress_video(input_path, output_path)
+            cmd = mock_run_ffmpeg.call_args[0][0]
+            assert cmd[cmd.index("-threads") + 1] == "4"
+            
+            compressor.compress_video(input_path, output_path, threads=3)
+            cmd = mock_run_ffmpeg.call_args[0][0]
+            assert cmd[cmd.index("-threads") + 1] == "3"
+
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    def test_cancel_removes_partial_output(self, mock_probe, mock_run_ffmpeg):
+        """Test that a cancelled encode reports Cancelled and deletes what it wrote"""
+        mock_probe.return_value = self._media_info()
+        token = CancellationToken()
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            with open(input_path, 'wb') as f:
+                f.write(b"x" * 4096)
+            
+            def interrupted_encode(cmd, **kwargs):
+                with open(output_path, 'wb') as f:
+                    f.write(b"partial")
+                token.cancel()
+                return -9, ""
+            mock_run_ffmpeg.side_effect = interrupted_encode
+            
+            compressor = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG)
+            assert compressor.compress_video(input_path, output_path, cancel_token=token) == False
+            assert compressor.last_status == "cancelled"
+            assert not os.path.exists(output_path)
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    def test_cancel_before_start_keeps_previous_output(self, mock_probe, mock_run_ffmpeg):
+        """Test that cancelling before the encode starts leaves an existing output alone"""
+        mock_probe.return_value = self._media_info()
+        token = CancellationToken()
+        token.cancel()
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            for path in (input_path, output_path):
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 4096)
+            
+            compressor = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG)
+            assert compressor.compress_video(input_path, output_path, cancel_token=token) == False
+            assert compressor.last_status == "cancelled"
+            assert os.path.exists(output_path)
+        mock_run_ffmpeg.assert_not_called()
+
+    @patch('compressor.StallWatchdog')
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    def test_stalled_encode_reports_timeout(self, mock_probe, mock_run_ffmpeg, mock_watchdog):
+        """Test that an encode killed by the watchdog reports Timeout and deletes what it wrote"""
+        mock_probe.return_value = self._media_info()
+        mock_watchdog.return_value.stalled = True
+        mock_watchdog.return_value.reason = "no progress for 20s"
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            with open(input_path, 'wb') as f:
+                f.write(b"x" * 4096)
+            
+            def hung_encode(cmd, **kwargs):
+                with open(output_path, 'wb') as f:
+                    f.write(b"partial")
+                return -9, ""
+            mock_run_ffmpeg.side_effect = hung_encode
+            
+            compressor = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG)
+            assert compressor.compress_video(input_path, output_path) == False
+            assert compressor.last_status == "timeout"
+            assert not os.path.exists(output_path)
+    
+    # ========== Two-Pass Tests ==========
+    
+    def test_two_pass_requires_ffmpeg_engine(self):
+        """Test that two-pass is rejected for the MoviePy engine"""
+        with pytest.raises(ValueError):
+            VideoCompressor(rate_control=RATE_TWO_PASS)
+    
+    def test_build_ffmpeg_command_two_pass(self):
+        """Test pass 1 writes only stats and pass 2 reuses them"""
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG, rate_control=RATE_TWO_PASS)
+        pass1 = compressor.build_ffmpeg_command("in.mp4", "out.mp4", 900, 128, pass_number=1, passlog_prefix="stats")
+        pass2 = compressor.build_ffmpeg_command("in.mp4", "out.mp4", 900, 128, pass_number=2, passlog_prefix="stats")
+        
+        assert pass1[pass1.index("-pass") + 1] == "1"
+        assert "-an" in pass1
+        assert pass1[-3:] == ["-f", "null", "-"]
+        assert pass2[pass2.index("-pass") + 1] == "2"
+        assert pass2[pass2.index("-passlogfile") + 1] == "stats"
+        assert pass2[-1] == "out.mp4"
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    def test_two_pass_reuses_stats_on_retry(self, mock_probe, mock_run_ffmpeg, monkeypatch):
+        """Test that a retry at a different target size skips the analysis pass"""
+        # 480p stays 480p at both targets; stats of another resolution could not be reused
+        mock_probe.return_value = self._media_info(width=854, height=480)
+        mock_run_ffmpeg.return_value = (0, "")
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            monkeypatch.setenv("ITG_VC_DATA_DIR", tmpdir)
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            for path in (input_path, output_path):
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 4096)
+            
+            first = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG, rate_control=RATE_TWO_PASS)
+            assert first.compress_video(input_path, output_path) == True
+            assert mock_run_ffmpeg.call_count == 2
+            
+            # Simulate the stats file pass 1 leaves behind
+            prefix = mock_run_ffmpeg.call_args_list[0][0][0]
+            prefix = prefix[prefix.index("-passlogfile") + 1]
+            with open(f"{prefix}-0.log", 'w') as f:
+                f.write("#options: stats")
+            assert passlog.has_stats(prefix)
+            
+            mock_run_ffmpeg.reset_mock()
+            retry = VideoCompressor(target_size_mb=5, engine=ENGINE_FFMPEG, rate_control=RATE_TWO_PASS)
+            assert retry.compress_video(input_path, output_path) == True
+            assert mock_run_ffmpeg.call_count == 1
+            assert mock_run_ffmpeg.call_args[0][0][mock_run_ffmpeg.call_args[0][0].index("-pass") + 1] == "2"
+
+    
+    # ========== Passthrough Tests ==========
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    @patch('compressor.VideoFileClip')
+    def test_passthrough_copies_small_file(self, mock_videofileclip, mock_probe, mock_run_ffmpeg):
+        """Test that an input already under target is copied without encoding"""
+        mock_probe.return_value = self._media_info(size_bytes=4096)
+        compressor = VideoCompressor(target_size_mb=10)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "input_compressed.mp4")
+            with open(input_path, 'wb') as f:
+                f.write(b"x" * 4096)
+            
+            assert compressor.compress_video(input_path, output_path) == True
+            with open(output_path, 'rb') as f:
+                assert f.read() == b"x" * 4096
+        
+        mock_videofileclip.assert_not_called()
+        mock_run_ffmpeg.assert_not_called()
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    def test_passthrough_remuxes_other_container(self, mock_probe, mock_run_ffmpeg):
+        """Test that a container change is done with stream copy"""
+        mock_probe.return_value = self._media_info(size_bytes=4096)
+        compressor = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mkv")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            with open(input_path, 'wb') as f:
+                f.write(b"x" * 4096)
+            
+            def fake_remux(cmd, **kwargs):
+                with open(cmd[-1], 'wb') as f:
+                    f.write(b"x" * 4000)
+                return 0, ""
+            mock_run_ffmpeg.side_effect = fake_remux
+            
+            assert compressor.compress_video(input_path, output_path) == True
+        
+        cmd = mock_run_ffmpeg.call_args[0][0]
+        assert mock_run_ffmpeg.call_count == 1
+        assert cmd[cmd.index("-c") + 1] == "copy"
+        assert cmd[-1] == output_path
+    
+    def test_passthrough_rejects_other_codecs(self):
+        """Test that non-H.264 inputs are still re-encoded"""
+        compressor = VideoCompressor(target_size_mb=10)
+        info = self._media_info(size_bytes=4096, video="prores", audio="pcm_s16le")
+        assert compressor.try_passthrough("input.mov", "out.mov", info) == False
+    
+    def test_passthrough_skips_files_over_target(self):
+        """Test that inputs bigger than the target are never passed through"""
+        compressor = VideoCompressor(target_size_mb=1)
+        info = self._media_info(size_bytes=2 * 1024 * 1024)
+        assert compressor.try_passthrough("input.mp4", "output.mp4", info) == False
+    
+    def test_passthrough_can_be_disabled(self):
+        """Test that allow_passthrough=False always encodes"""
+        compressor = VideoCompressor(target_size_mb=10, allow_passthrough=False)
+        assert compressor.try_passthrough("input.mp4", "output.mp4", self._media_info(size_bytes=4096)) == False
+    
+    def test_passthrough_refuses_frame_rate_cap(self):
+        """Test that an input over the frame rate cap is encoded, even though it fits"""
+        compressor = VideoCompressor(target_size_mb=10, max_fps=24)
+        info = self._media_info(size_bytes=4096, fps=30.0)
+        assert compressor.try_passthrough("input.mp4", "output.mp4", info) == False
+        # A cap at or above the source frame rate leaves the frames alone
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path, output_path = os.path.join(tmpdir, "input.mp4"), os.path.join(tmpdir, "output.mp4")
+            with open(input_path, 'wb') as f:
+                f.write(b"x" * 4096)
+            assert VideoCompressor(target_size_mb=10, max_fps=30).try_passthrough(input_path, output_path, info) == True
+    
+    def test_passthrough_refuses_duplicate_dropping(self):
+        """Test that dropping near-duplicate frames always encodes"""
+        compressor = VideoCompressor(target_size_mb=10, drop_duplicates=True)
+        assert compressor.try_passthrough("input.mp4", "output.mp4", self._media_info(size_bytes=4096)) == False
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    @patch('compressor.crop.plan_crop')
+    def test_passthrough_refuses_crop(self, mock_plan_crop, mock_probe, mock_run_ffmpeg, tmp_path):
+        """Test that a file with black bars is cropped by an encode rather than passed through"""
+        mock_probe.return_value = self._media_info(size_bytes=4096)
+        mock_plan_crop.return_value = (1920, 800, 0, 140)
+        mock_run_ffmpeg.side_effect = self._overshooting_encoder(1.0, duration=60.0)
+        input_path, output_path = str(tmp_path / "input.mp4"), str(tmp_path / "output.mp4")
+        with open(input_path, 'wb') as f:
+            f.write(b"x" * 4096)
+        
+        compressor = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG, auto_crop=True)
+        assert compressor.compress_video(input_path, output_path) == True
+        cmd = mock_run_ffmpeg.call_args[0][0]
+        assert "crop=1920:800:0:140" in cmd[cmd.index("-vf") + 1]
+    
+    @patch('compressor.probe_media')
+    @patch('compressor.VideoFileClip')
+    def test_passthrough_never_copies_unreadable_input(self, mock_videofileclip, mock_probe, tmp_path):
+        """Test that an input neither ffprobe nor MoviePy can read fails instead of being copied"""
+        mock_probe.return_value = None
+        mock_videofileclip.side_effect = OSError("moov atom not found")
+        input_path, output_path = str(tmp_path / "input.mp4"), str(tmp_path / "output.mp4")
+        with open(input_path, 'wb') as f:
+            f.write(b"x" * 4096)
+        
+        assert VideoCompressor(target_size_mb=10).compress_video(input_path, output_path) == False
+        assert not os.path.exists(output_path)
+    
+    @pytest.mark.parametrize("duration", [0.0, 0.05])
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    @patch('compressor.VideoFileClip')
+    def test_passthrough_never_copies_zero_duration_input(self, mock_videofileclip, mock_probe, mock_run_ffmpeg,
+                                                          duration, tmp_path):
+        """Test that duration validation runs before passthrough (zero durations also go through MoviePy)"""
+        mock_probe.return_value = self._media_info(size_bytes=4096, duration=duration)
+        mock_videofileclip.return_value = MagicMock(duration=duration, size=(1920, 1080), fps=30.0)
+        input_path, output_path = str(tmp_path / "input.mp4"), str(tmp_path / "output.mp4")
+        with open(input_path, 'wb') as f:
+            f.write(b"x" * 4096)
+        
+        assert VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG).compress_video(input_path, output_path) == False
+        assert not os.path.exists(output_path)
+        mock_run_ffmpeg.assert_not_called()
+    
+    # ========== Segment-Parallel Tests ==========
+    
+    def test_plan_chunk_seconds(self):
+        """Test that chunk length adapts to duration and encoder count within bounds"""
+        assert plan_chunk_seconds(5400, encoders=4) == 300
+        assert plan_chunk_seconds(1200, encoders=4) == 150
+        assert plan_chunk_seconds(600, encoders=16) == 30
+        # Never shorter than the keyframe spacing
+        assert plan_chunk_seconds(600, encoders=16, keyframe_interval=45) == 45
+    
+    @patch('utils.segments.run_ffmpeg')
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    def test_segmented_encode(self, mock_probe, mock_run_ffmpeg, mock_split, monkeypatch):
+        """Test split, parallel chunk encodes, single audio encode and lossless join"""
+        mock_probe.return_value = self._media_info(duration=1200.0)
+        mock_run_ffmpeg.return_value = (0, "")
+        
+        def fake_split(cmd, **kwargs):
+            scratch_dir = os.path.dirname(cmd[-1])
+            with open(os.path.join(scratch_dir, "chunks.csv"), 'w') as f:
+                f.write("source_0000.mkv,0.0,400.0\nsource_0001.mkv,400.0,800.0\nsource_0002.mkv,800.0,1200.0\n")
+            return 0, ""
+        mock_split.side_effect = fake_split
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            monkeypatch.setenv("ITG_VC_DATA_DIR", tmpdir)
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            for path in (input_path, output_path):
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 4096)
+            
+            compressor = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG, segmented=True)
+            assert compressor.compress_video(input_path, output_path, cpu_budget=4) == True
+            # Scratch directory is gone once the encode finished
+            assert os.listdir(os.path.join(tmpdir, "scratch")) == []
+        
+        commands = [c[0][0] for c in mock_run_ffmpeg.call_args_list]
+        chunk_commands = [c for c in commands if "-b:v" in c]
+        assert len(chunk_commands) == 3
+        assert len({c[c.index("-b:v") + 1] for c in chunk_commands}) == 1
+        assert sum(1 for c in commands if "-vn" in c) == 1
+        concat = commands[-1]
+        assert concat[concat.index("-f") + 1] == "concat"
+        assert concat[concat.index("-c") + 1] == "copy"
+        assert concat[-1] == output_path
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    def test_segmented_skips_short_inputs(self, mock_probe, mock_run_ffmpeg):
+        """Test that short inputs are encoded in one piece"""
+        mock_probe.return_value = self._media_info(duration=60.0)
+        mock_run_ffmpeg.return_value = (0, "")
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            for path in (input_path, output_path):
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 4096)
+            compressor = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG, segmented=True)
+            assert compressor.compress_video(input_path, output_path, cpu_budget=4) == True
+        
+        assert mock_run_ffmpeg.call_count == 1
+
+    
+    # ========== Resolution Ladder Tests ==========
+    
+    def test_plan_resolution_keeps_source_with_enough_bits(self):
+        """Test that a generous bitrate keeps the source size"""
+        assert plan_resolution(1920, 1080, 30, 5000)[:2] == (1920, 1080)
+    
+    def test_plan_resolution_steps_down_ladder(self):
+        """Test that a starved 1440p encode steps down until bits per pixel are reasonable"""
+        width, height, bpp = plan_resolution(2560, 1440, 30, 1000)
+        assert (width, height) == (960, 540)
+        assert bpp >= 0.05
+        # Nothing is good enough: stop at the lowest rung
+        assert plan_resolution(2560, 1440, 30, 100)[:2] == (854, 480)
+    
+    def test_plan_resolution_portrait_and_no_upscale(self):
+        """Test that portrait video scales its short side and small sources are never upscaled"""
+        assert plan_resolution(1080, 1920, 30, 1000)[:2] == (540, 960)
+        assert plan_resolution(640, 360, 30, 50)[:2] == (640, 360)
+        assert plan_resolution(None, None, 30, 1000) is None
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    def test_compress_video_downscales_low_bitrate(self, mock_probe, mock_run_ffmpeg):
+        """Test that a long 1080p input squeezed into a small target is encoded at a lower resolution"""
+        mock_probe.return_value = self._media_info(duration=1200.0)
+        mock_run_ffmpeg.return_value = (0, "")
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            for path in (input_path, output_path):
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 4096)
+            
+            assert VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG, auto_downscale=True).compress_video(input_path, output_path) == True
+            cmd = mock_run_ffmpeg.call_args[0][0]
+            assert cmd[cmd.index("-vf") + 1] == "scale=854:480"
+            
+            VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG).compress_video(input_path, output_path)
+            cmd = mock_run_ffmpeg.call_args[0][0]
+            assert cmd[cmd.index("-vf") + 1] == "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+
+    
+    # ========== Frame Rate Reduction Tests ==========
+    
+    def test_build_ffmpeg_command_drops_duplicates(self):
+        """Test that the fps cap runs before mpdecimate and keyframes are forced by time"""
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG, drop_duplicates=True, max_fps=15)
+        cmd = compressor.build_ffmpeg_command("in.mp4", "out.mp4", 900, 128, fps_cap=15, source_fps=60.0)
+        
+        assert cmd[cmd.index("-vf") + 1] == "fps=15,mpdecimate,scale=trunc(iw/2)*2:trunc(ih/2)*2"
+        assert cmd[cmd.index("-fps_mode") + 1] == "vfr"
+        assert "prev_forced_t+4.167" in cmd[cmd.index("-force_key_frames") + 1]
+    
+    def test_frame_options_off_by_default(self):
+        """Test that the default command keeps every frame"""
+        cmd = VideoCompressor(engine=ENGINE_FFMPEG).build_ffmpeg_command("in.mp4", "out.mp4", 900, 128)
+        assert "mpdecimate" not in cmd[cmd.index("-vf") + 1]
+        assert "-fps_mode" not in cmd
+        assert "-force_key_frames" not in cmd
+    
+    def test_plan_fps_cap_never_raises_frame_rate(self):
+        """Test that sources at or below max_fps keep their rate"""
+        compressor = VideoCompressor(max_fps=24)
+        assert compressor.plan_fps_cap(self._media_info(fps=60.0)) == 24
+        assert compressor.plan_fps_cap(self._media_info(fps=15.0)) is None
+        assert VideoCompressor().plan_fps_cap(self._media_info(fps=60.0)) is None
+        with pytest.raises(ValueError):
+            VideoCompressor(max_fps=0)
+
+    
+    # ========== Size Prediction Tests ==========
+    
+    def test_sample_windows_bounded(self):
+        """Test that samples are spread across the input and cover a small share of it"""
+        assert sample_windows(60) == []
+        windows = sample_windows(3600)
+        assert len(windows) == 3
+        assert windows[0][0] < 1200 < windows[1][0] < 2400 < windows[2][0]
+        assert sum(seconds for _, seconds in sample_windows(150)) <= 150 * 0.05
+    
+    def test_prediction_corrects_overshoot(self):
+        """Test that a 25% overshoot in the samples lowers the requested bitrate"""
+        prediction = SizePrediction(requested_kbps=1000, sampled_seconds=12, sampled_bytes=int(1250 * 1000 / 8 * 12), encode_seconds=3)
+        assert prediction.ratio == pytest.approx(1.25)
+        assert prediction.corrected_kbps(1000) == 800
+        assert prediction.predicted_video_bytes(800, 600) == pytest.approx(1000 * 1000 / 8 * 600)
+        assert prediction.predicted_seconds(600) == pytest.approx(150)
+        # Close enough: left alone
+        assert SizePrediction(1000, 12, int(1020 * 1000 / 8 * 12), 3).corrected_kbps(1000) == 1000
+        # An undershoot is encoder warm-up: never raised, and the full encode expected on target
+        undershoot = SizePrediction(1000, 12, int(850 * 1000 / 8 * 12), 3)
+        assert undershoot.corrected_kbps(1000) == 1000
+        assert undershoot.predicted_video_bytes(1000, 600) == pytest.approx(1000 * 1000 / 8 * 600)
+    
+    def test_real_samples_keep_full_encode_under_request(self):
+        """Test that real short samples never correct a full encode above the requested bitrate"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "in.mp4")
+            cmd = [get_ffmpeg_path(), "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=s=320x180:r=25:d=120",
+                   "-c:v", "libx264", "-preset", "ultrafast", "-b:v", "2M", path]
+            try:
+                subprocess.run(cmd, check=True, capture_output=True)
+            except (OSError, subprocess.CalledProcessError):
+                pytest.skip("ffmpeg not available")
+            info = probe_media(path)
+            compressor = VideoCompressor(engine=ENGINE_FFMPEG)
+            prediction = compressor.predict_output(path, info, 150, "ultrafast", 1)
+            assert prediction is not None
+            corrected_kbps = prediction.corrected_kbps(150)
+            assert corrected_kbps <= 150
+            output_path = os.path.join(tmpdir, "out.mkv")
+            cmd = compressor.build_ffmpeg_command(path, output_path, corrected_kbps, 0, preset="ultrafast", threads=1,
+                                                  audio_plan=AudioPlan("none"))
+            subprocess.run(cmd, check=True, capture_output=True)
+            actual_kbps = os.path.getsize(output_path) * 8 / info.duration / 1000
+            assert actual_kbps <= 150 * 1.05
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    @patch('utils.predictor.run_ffmpeg')
+    def test_compress_video_applies_prediction(self, mock_sample_ffmpeg, mock_probe, mock_run_ffmpeg):
+        """Test that samples are encoded without audio and their overshoot corrects the full encode"""
+        mock_probe.return_value = self._media_info(duration=600.0, width=854, height=480)
+        mock_run_ffmpeg.return_value = (0, "")
+        
+        def sample_encode(cmd, **kwargs):
+            # Every sample overshoots the requested bitrate by 25%
+            requested = int(cmd[cmd.index("-b:v") + 1].rstrip("k"))
+            seconds = float(cmd[cmd.index("-t") + 1])
+            with open(cmd[-1], 'wb') as f:
+                f.write(b"x" * int(requested * 1.25 * 1000 / 8 * seconds))
+            assert "-an" in cmd
+            return 0, ""
+        mock_sample_ffmpeg.side_effect = sample_encode
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            for path in (input_path, output_path):
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 4096)
+            
+            with patch('compressor.segments.get_user_data_dir', return_value=tmpdir):
+                compressor = VideoCompressor(target_size_mb=20, engine=ENGINE_FFMPEG, predict_size=True)
+                assert compressor.compress_video(input_path, output_path) == True
+            full = mock_run_ffmpeg.call_args[0][0]
+            sample = mock_sample_ffmpeg.call_args[0][0]
+            assert mock_sample_ffmpeg.call_count == 3
+            assert int(full[full.index("-b:v") + 1].rstrip("k")) == int(int(sample[sample.index("-b:v") + 1].rstrip("k")) * 0.8)
+            assert not [name for name in os.listdir(tmpdir) if name.startswith("samples_")]
+    
+    @patch('compressor.run_ffmpeg')
+    @patch('compressor.probe_media')
+    @patch('utils.predictor.run_ffmpeg')
+    def test_prediction_far_over_target_replans(self, mock_sample_ffmpeg, mock_probe, mock_run_ffmpeg):
+        """Test that samples over 2x the request lower the bitrate in full and the output resolution with it"""
+        mock_probe.return_value = self._media_info(duration=600.0, width=1280, height=720, size_bytes=500 * 1024 * 1024)
+        mock_run_ffmpeg.return_value = (0, "")
+        
+        def sample_encode(cmd, **kwargs):
+            # Every sample comes out at 4x the requested bitrate
+            requested = int(cmd[cmd.index("-b:v") + 1].rstrip("k"))
+            seconds = float(cmd[cmd.index("-t") + 1])
+            with open(cmd[-1], 'wb') as f:
+                f.write(b"x" * int(requested * 4 * 1000 / 8 * seconds))
+            return 0, ""
+        mock_sample_ffmpeg.side_effect = sample_encode
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            for path in (input_path, output_path):
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 4096)
+            
+            with patch('compressor.segments.get_user_data_dir', return_value=tmpdir):
+                compressor = VideoCompressor(target_size_mb=200, engine=ENGINE_FFMPEG, predict_size=True,
+                                             auto_downscale=True)
+                assert compressor.compress_video(input_path, output_path)
+            full = mock_run_ffmpeg.call_args[0][0]
+            sample = mock_sample_ffmpeg.call_args[0][0]
+            sampled_kbps = int(sample[sample.index("-b:v") + 1].rstrip("k"))
+            # Not held at the 0.5x correction limit
+            assert int(full[full.index("-b:v") + 1].rstrip("k")) == sampled_kbps // 4
+            assert "854:480" not in sample[sample.index("-vf") + 1]
+            assert "854:480" in full[full.index("-vf") + 1]
+
+    
+    # ========== Retargeting Tests ==========
+    
+    @staticmethod
+    def _video_kbps(cmd):
+        """Requested video bitrate of a command: the average, or the ceiling in quality mode."""
+        option = "-maxrate" if "-maxrate" in cmd else "-b:v"
+        return int(cmd[cmd.index(option) + 1].rstrip("k"))
+    
+    def _overshooting_encoder(self, factor=None, fixed_bytes=None, duration=20.0):
+        """Fake run_ffmpeg writing video at factor x the requested bitrate plus exact audio (or a fixed size)."""
+        def encode(cmd, **kwargs):
+            requested = self._video_kbps(cmd)
+            audio = int(cmd[cmd.index("-b:a") + 1].rstrip("k")) if "-b:a" in cmd else 0
+            size = fixed_bytes or int((requested * factor + audio) * 1000 / 8 * duration)
+            with open(cmd[-1], 'wb') as f:
+                f.write(b"x" * size)
+            return 0, ""
+        return encode
+    
+    def _run_retarget(self, tmpdir, encoder, **kwargs):
+        input_path = os.path.join(tmpdir, "input.mp4")
+        output_path = os.path.join(tmpdir, "output.mp4")
+        with open(input_path, 'wb') as f:
+            f.write(b"x" * 4096)
+        with patch('compressor.run_ffmpeg', side_effect=encoder) as mock_run_ffmpeg:
+            result = VideoCompressor(target_size_mb=4, engine=ENGINE_FFMPEG, **kwargs).compress_video(input_path, output_path)
+        bitrates = [self._video_kbps(c[0][0]) for c in mock_run_ffmpeg.call_args_list]
+        return result, output_path, bitrates
+    
+    @patch('compressor.probe_media')
+    def test_overshoot_is_retargeted(self, mock_probe, tmp_path):
+        """Test that a 50% overshoot is re-encoded at a lower bitrate and the smaller output replaces the first"""
+        mock_probe.return_value = self._media_info(duration=20.0, width=854, height=480)
+        history = RateHistory(db_path=str(tmp_path / "history.sqlite3"))
+        
+        result, output_path, bitrates = self._run_retarget(str(tmp_path), self._overshooting_encoder(1.5), rate_history=history)
+        assert result == True
+        assert len(bitrates) == 2
+        assert bitrates[1] == pytest.approx(bitrates[0] / 1.5, rel=0.02)
+        assert os.path.getsize(output_path) <= 4 * 1024 * 1024
+        assert not [name for name in os.listdir(tmp_path) if ".retry" in name]
+        assert len(history) == 2
+    
+    @patch('compressor.probe_media')
+    def test_retargeting_is_bounded(self, mock_probe, tmp_path):
+        """Test that an encoder that never shrinks gets max_attempts tries and the first output is kept"""
+        mock_probe.return_value = self._media_info(duration=20.0, width=854, height=480)
+        
+        result, output_path, bitrates = self._run_retarget(str(tmp_path), self._overshooting_encoder(fixed_bytes=6 * 1024 * 1024),
+                                                           max_attempts=3)
+        assert result == True
+        assert len(bitrates) == 3
+        assert bitrates[0] > bitrates[1] > bitrates[2]
+        assert os.path.getsize(output_path) == 6 * 1024 * 1024
+        assert sorted(os.listdir(tmp_path)) == ["input.mp4", "output.mp4"]
+        
+        # A single attempt only warns
+        _, _, bitrates = self._run_retarget(str(tmp_path), self._overshooting_encoder(1.5), max_attempts=1)
+        assert len(bitrates) == 1
+    
+    @patch('compressor.probe_media')
+    def test_rate_history_seeds_next_file(self, mock_probe, tmp_path):
+        """Test that earlier overshoots of the same profile lower the first bitrate of the next file"""
+        info = self._media_info(duration=20.0, width=854, height=480)
+        mock_probe.return_value = info
+        history = RateHistory(db_path=str(tmp_path / "history.sqlite3"))
+        
+        _, _, plain = self._run_retarget(str(tmp_path), self._overshooting_encoder(1.0))
+        profile = rate_profile(ENGINE_FFMPEG, "abr", "medium", "h264", 480, 30.0)
+        history.record(profile, 1000, 1250)
+        assert history.estimate(profile) is None  # one file is not enough
+        history.record(profile, 1000, 1300)
+        history.record(profile, 1000, 1200)
+        assert history.estimate(profile) == pytest.approx(1.25)
+        
+        _, _, seeded = self._run_retarget(str(tmp_path), self._overshooting_encoder(1.0), rate_history=history)
+        assert seeded[0] == int(plain[0] * 0.8)
+    
+    @patch('compressor.probe_media')
+    def test_ffmpeg_first_attempt_uses_retarget_floor(self, mock_probe, tmp_path):
+        """Test that the ffmpeg engine starts at the retarget floor, not MoviePy's 400 kbps, on a tiny budget"""
+        mock_probe.return_value = self._media_info(duration=600.0, width=854, height=480, audio=None)
+        
+        _, _, bitrates = self._run_retarget(str(tmp_path), self._overshooting_encoder(1.0, duration=600.0))
+        assert bitrates == [MIN_RETARGET_KBPS]
+        assert VideoCompressor(engine=ENGINE_FFMPEG).clamp_video_bitrate(250) == 250
+        assert VideoCompressor(engine=ENGINE_MOVIEPY).clamp_video_bitrate(250) == 400
+    
+    # ========== Quality Mode Tests ==========
+    
+    def test_build_ffmpeg_command_quality(self):
+        """Test that quality mode encodes at constant quality under a ceiling instead of an average bitrate"""
+        cmd = VideoCompressor(engine=ENGINE_FFMPEG, rate_control=RATE_QUALITY).build_ffmpeg_command("in.mp4", "out.mp4", 900, 128)
+        assert "-b:v" not in cmd
+        assert "-crf" in cmd
+        assert cmd[cmd.index("-maxrate") + 1] == "900k"
+        assert cmd[cmd.index("-bufsize") + 1] == "1800k"
+    
+    @patch('compressor.probe_media')
+    def test_quality_mode_reencodes_only_over_ceiling(self, mock_probe, tmp_path):
+        """Test that undershooting quality encodes are kept and a broken ceiling lowers it"""
+        mock_probe.return_value = self._media_info(duration=20.0, width=854, height=480)
+        
+        _, _, ceilings = self._run_retarget(str(tmp_path), self._overshooting_encoder(0.6), rate_control=RATE_QUALITY)
+        assert len(ceilings) == 1
+        _, output_path, ceilings = self._run_retarget(str(tmp_path), self._overshooting_encoder(1.3), rate_control=RATE_QUALITY)
+        assert len(ceilings) == 2
+        assert ceilings[1] < ceilings[0]
+        assert os.path.getsize(output_path) <= 4 * 1024 * 1024
+    
+    @patch('compressor.probe_media')
+    @patch('compressor.VideoFileClip')
+    def test_quality_mode_moviepy(self, mock_videofileclip, mock_probe):
+        """Test that the MoviePy engine passes the quality options instead of a bitrate"""
+        mock_probe.return_value = self._media_info(duration=20.0, width=854, height=480)
+        mock_clip = MagicMock()
+        mock_clip.duration = 20.0
+        mock_clip.fps = 30.0
+        mock_videofileclip.return_value = mock_clip
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = os.path.join(tmpdir, "input.mp4")
+            output_path = os.path.join(tmpdir, "output.mp4")
+            for path in (input_path, output_path):
+                with open(path, 'wb') as f:
+                    f.write(b"x" * 4096)
+            assert VideoCompressor(target_size_mb=4, rate_control=RATE_QUALITY).compress_video(input_path, output_path) == True
+        kwargs = mock_clip.write_videofile.call_args[1]
+        assert kwargs["bitrate"] is None
+        assert "-crf" in kwargs["ffmpeg_params"] and "-maxrate" in kwargs["ffmpeg_params"]
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,116 @@
+import pytest
+import os
+import sys
+import subprocess
+import tempfile
+
+import numpy as np
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from compressor import VideoCompressor, ENGINE_FFMPEG, SCREEN_MAX_FPS
+from utils.codecs import get_backend
+from utils.content import ContentStats, classify_content, frame_statistics, SCREEN, CAMERA
+from utils.ffmpeg_tools import get_ffmpeg_path
+from utils.media_info import MediaInfo, StreamInfo
+
+
+def screen_frames(count=3, width=320, height=180):
+    """Identical RGB frames of a light window with rows of dark 'text'."""
+    frame = np.full((height, width, 3), 245, dtype=np.uint8)
+    frame[:12] = (60, 63, 65)  # Title bar
+    for row in range(20, height - 10, 10):
+        frame[row:row + 2, 20:width - 40:3] = (20, 20, 120)  # Glyph strokes
+    return np.repeat(frame[None], count, axis=0)
+
+
+def camera_frames(count=3, width=320, height=180, seed=0):
+    """A smooth moving gradient with sensor noise."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    frames = []
+    for i in range(count):
+        base = np.broadcast_to((x + i * 8) % 256, (height, width))
+        rgb = np.stack([base, base[::-1] * 0.8, np.full_like(base, 90)], axis=-1)
+        frames.append(np.clip(rgb + rng.normal(0, 12, rgb.shape), 0, 255).astype(np.uint8))
+    return np.stack(frames)
+
+
+def info_for(path, width, height, fps, duration):
+    return MediaInfo(path, size_bytes=os.path.getsize(path) if os.path.exists(path) else 1, duration=duration,
+                     streams=[StreamInfo(0, "video", codec_name="h264", width=width, height=height, fps=fps)])
+
+
+class TestContentClassifier:
+    """Test suite for screen/camera content classification and the screen profile"""
+
+    def test_screen_and_camera_statistics(self):
+        """Test that flat, sharp, still frames are screen content and noisy moving ones are camera"""
+        screen = frame_statistics([screen_frames(), screen_frames()])
+        assert screen.kind == SCREEN
+        assert screen.motion == 0 and screen.edge_density > 0.05 and screen.colors < 10
+        camera = frame_statistics([camera_frames(seed=1), camera_frames(seed=2)])
+        assert camera.kind == CAMERA
+        assert camera.motion > 1 and camera.colors > 768
+        assert frame_statistics([None]) is None
+
+    def test_motion_only_within_bursts(self):
+        """Test that two unrelated sample points do not count as motion"""
+        dark = np.zeros((2, 90, 160, 3), dtype=np.uint8)
+        bright = np.full((2, 90, 160, 3), 200, dtype=np.uint8)
+        assert frame_statistics([dark, bright]).motion == 0
+
+    def test_screen_profile_command(self):
+        """Test that screen content gets the codec tune, a long GOP and the frame rate ceiling"""
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG)
+        info = info_for("in.mp4", 1920, 1080, 60.0, 60.0)
+        assert compressor.plan_fps_cap(info) is None
+        assert "-tune" not in compressor.build_ffmpeg_command("in.mp4", "out.mp4", 900, 128, source_fps=60.0)
+
+        compressor.content_stats = ContentStats(motion=0.1, edge_density=0.1, colors=300, frames=24)
+        fps_cap = compressor.plan_fps_cap(info)
+        assert fps_cap == SCREEN_MAX_FPS
+        cmd = compressor.build_ffmpeg_command("in.mp4", "out.mp4", 900, 128, fps_cap=fps_cap, source_fps=60.0)
+        assert cmd[cmd.index("-tune") + 1] == "animation"
+        assert cmd[cmd.index("-g") + 1] == "300"
+        assert "prev_forced_t+20.000" in cmd[cmd.index("-force_key_frames") + 1]
+
+        # A lower user cap still wins; other codecs use their own screen tools
+        assert VideoCompressor(engine=ENGINE_FFMPEG, max_fps=10).plan_fps_cap(info) == 10
+        assert get_backend("vp9").screen_args() == ["-tune-content", "screen"]
+
+    def test_screen_content_keeps_resolution(self):
+        """Test that screen content is downscaled less at the same bitrate, so text stays readable"""
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG, auto_downscale=True)
+        info = info_for("in.mp4", 1280, 720, 30.0, 60.0)
+        assert compressor.plan_output_size(info, 500) is not None
+        compressor.content_stats = ContentStats(motion=0.1, edge_density=0.1, colors=300, frames=24)
+        assert compressor.plan_output_size(info, 500) is None
+
+    def test_real_files_classified(self):
+        """Test sampling and classifying a real UI-like recording and a real noisy one"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            screen_path = os.path.join(tmpdir, "screen.mp4")
+            camera_path = os.path.join(tmpdir, "camera.mp4")
+            ffmpeg = get_ffmpeg_path()
+            try:
+                with subprocess.Popen([ffmpeg, "-v", "error", "-y", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", "320x180",
+                                       "-r", "10", "-i", "-", "-c:v", "libx264", "-preset", "ultrafast", "-crf", "10",
+                                       "-pix_fmt", "yuv444p", screen_path], stdin=subprocess.PIPE) as proc:
+                    proc.stdin.write(screen_frames(count=60).tobytes())
+                subprocess.run([ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=s=320x180:r=10:d=4",
+                                "-vf", "noise=alls=40:allf=t", "-c:v", "libx264", "-preset", "ultrafast", camera_path],
+                               check=True, capture_output=True)
+            except (OSError, subprocess.CalledProcessError):
+                pytest.skip("ffmpeg not available")
+
+            screen = classify_content(screen_path, info_for(screen_path, 320, 180, 10.0, 6.0), points=3)
+            camera = classify_content(camera_path, info_for(camera_path, 320, 180, 10.0, 4.0), points=3)
+            compressor = VideoCompressor(engine=ENGINE_FFMPEG, content_tuning=False)
+            assert compressor.plan_content(screen_path, info_for(screen_path, 320, 180, 10.0, 6.0)) is None
+        assert screen.frames == 9 and screen.kind == SCREEN
+        assert camera.kind == CAMERA
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
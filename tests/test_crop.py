@@ -0,0 +1,86 @@
+import pytest
+import os
+import sys
+import subprocess
+import tempfile
+
+import numpy as np
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from compressor import VideoCompressor, ENGINE_FFMPEG
+from utils.crop import active_box, detect_crop
+from utils.ffmpeg_tools import get_ffmpeg_path
+from utils.frame_sampler import sample_frames, sample_times
+from utils.media_info import MediaInfo, StreamInfo
+
+
+def canvas(width=1280, height=720, box=(472, 0, 808, 720), level=200, noise=0):
+    """Black luma frame with a bright picture inside box (left, top, right, bottom)."""
+    rng = np.random.default_rng(0)
+    frame = np.full((height, width), 16, dtype=np.uint8)
+    if noise:
+        frame = (frame + rng.integers(0, noise, frame.shape)).astype(np.uint8)
+    left, top, right, bottom = box
+    frame[top:bottom, left:right] = level
+    return frame
+
+
+class TestCropDetection:
+    """Test suite for frame sampling and black border detection"""
+
+    def test_active_box(self):
+        """Test the picture box of a single frame, ignoring noise in the bars"""
+        assert active_box(canvas(noise=6)) == (472, 0, 808, 720)
+        assert active_box(canvas(level=16)) is None
+
+    def test_letterbox_detected_and_aligned(self):
+        """Test that letterboxing is cropped to aligned, even dimensions that contain the picture"""
+        crop = detect_crop([canvas(box=(0, 88, 1280, 632))], 1280, 720)
+        width, height, x, y = crop
+        assert (width, x) == (1280, 0)
+        assert height % 16 == 0 and y % 2 == 0
+        assert y <= 88 and y + height >= 632
+
+    def test_union_of_samples(self):
+        """Test that content reaching an edge in one sample is kept, and black frames are ignored"""
+        frames = [canvas(box=(472, 0, 808, 720)), canvas(box=(400, 0, 900, 720)), canvas(level=16)]
+        width, height, x, y = detect_crop(frames, 1280, 720)
+        assert x <= 400 and x + width >= 900
+
+    def test_small_borders_left_alone(self):
+        """Test that a crop saving only a few percent of the frame is skipped"""
+        assert detect_crop([canvas(box=(8, 0, 1272, 720))], 1280, 720) is None
+        assert detect_crop([], 1280, 720) is None
+
+    def test_sample_times(self):
+        """Test that samples avoid the very start and end"""
+        times = sample_times(100, 8)
+        assert len(times) == 8
+        assert times[0] == pytest.approx(5) and times[-1] == pytest.approx(95)
+        assert sample_times(None) == []
+
+    def test_real_pillarbox_cropped(self):
+        """Test sampling and cropping a real phone-shaped recording on a landscape canvas"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "phone.mp4")
+            cmd = [get_ffmpeg_path(), "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=s=176x320:r=10:d=4",
+                   "-vf", "pad=640:360:232:20:black", "-c:v", "libx264", "-preset", "ultrafast", path]
+            try:
+                subprocess.run(cmd, check=True, capture_output=True)
+            except (OSError, subprocess.CalledProcessError):
+                pytest.skip("ffmpeg not available")
+            info = MediaInfo(path, size_bytes=os.path.getsize(path), duration=4.0,
+                             streams=[StreamInfo(0, "video", codec_name="h264", width=640, height=360, fps=10.0)])
+
+            frames = sample_frames(path, info, count=4)
+            assert len(frames) == 4 and frames[0][1].shape == (360, 640)
+            compressor = VideoCompressor(engine=ENGINE_FFMPEG, auto_crop=True)
+            width, height, x, y = compressor.plan_crop(path, info)
+        assert x <= 232 and x + width >= 408
+        assert y <= 20 and y + height >= 340
+        assert "crop={}:{}:{}:{}".format(width, height, x, y) in compressor.video_filter()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,167 @@
+import pytest
+import os
+import sys
+import json
+from unittest.mock import patch, MagicMock
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from utils.media_info import MediaInfo, StreamInfo, probe_media
+from utils.probe_cache import ProbeCache
+
+
+FFPROBE_OUTPUT = {
+    "packets": [
+        {"stream_index": 1, "pts_time": "0.000000", "flags": "K__"},
+        {"stream_index": 0, "pts_time": "0.000000", "flags": "K__"},
+        {"stream_index": 0, "pts_time": "0.033333", "flags": "___"},
+        {"stream_index": 0, "pts_time": "4.000000", "flags": "K__"},
+        {"stream_index": 0, "pts_time": "8.000000", "flags": "K__"},
+    ],
+    "streams": [
+        {"index": 0, "codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080,
+         "avg_frame_rate": "30000/1001", "side_data_list": [{"side_data_type": "Display Matrix", "rotation": -90}]},
+        {"index": 1, "codec_type": "audio", "codec_name": "aac", "channels": 2, "sample_rate": "48000", "bit_rate": "128000"},
+    ],
+    "format": {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "duration": "120.500000", "size": "30000000", "bit_rate": "1991701"},
+}
+
+FFMPEG_OUTPUT = """Input #0, matroska,webm, from 'recording.mkv':
+  Duration: 00:01:30.25, start: 0.000000, bitrate: 2500 kb/s
+  Stream #0:0(eng): Video: h264 (High), yuv420p(progressive), 2560x1440 [SAR 1:1 DAR 16:9], 60 fps, 60 tbr, 1k tbn
+  Stream #0:1(eng): Audio: opus, 48000 Hz, mono, fltp
+At least one output file must be specified
+"""
+
+
+class TestMediaInfo:
+    """Test suite for the single-probe media metadata model"""
+
+    @patch('utils.media_info.subprocess.run')
+    def test_probe_with_ffprobe(self, mock_run):
+        """Test that one ffprobe JSON call fills every field"""
+        mock_run.return_value = MagicMock(returncode=0, stdout=json.dumps(FFPROBE_OUTPUT))
+        info = probe_media("video.mp4")
+
+        assert mock_run.call_count == 1
+        assert info.source == "ffprobe"
+        assert info.duration == 120.5
+        assert info.size_bytes == 30000000
+        assert info.video_codec == "h264"
+        assert info.audio_codec == "aac"
+        assert info.audio_channels == 2
+        assert info.fps == pytest.approx(29.97, abs=0.01)
+        # Rotated portrait recording: display size is swapped
+        assert info.rotation == -90
+        assert (info.width, info.height) == (1080, 1920)
+        assert info.keyframe_times == [0.0, 4.0, 8.0]
+        assert info.keyframe_interval == 4.0
+
+    @patch('utils.media_info.subprocess.run')
+    def test_probe_falls_back_to_ffmpeg(self, mock_run):
+        """Test that ffmpeg -i output is parsed when ffprobe is missing"""
+        mock_run.side_effect = [FileNotFoundError(), MagicMock(returncode=1, stderr=FFMPEG_OUTPUT)]
+        info = probe_media("recording.mkv")
+
+        assert info.source == "ffmpeg"
+        assert info.duration == pytest.approx(90.25)
+        assert info.bit_rate == 2500000
+        assert (info.width, info.height) == (2560, 1440)
+        assert info.fps == 60
+        assert info.video_codec == "h264"
+        assert info.audio_codec == "opus"
+        assert info.audio_channels == 1
+        assert info.keyframe_interval is None
+
+    @patch('utils.media_info.subprocess.run')
+    def test_probe_unreadable_file(self, mock_run):
+        """Test that unreadable files return None"""
+        mock_run.side_effect = [MagicMock(returncode=1, stdout=""),
+                                MagicMock(returncode=1, stderr="video.mp4: Invalid data found when processing input")]
+        assert probe_media("video.mp4") is None
+
+    def test_video_bit_rate_estimated_from_container(self):
+        """Test video bitrate estimate when the stream does not report one"""
+        streams = [StreamInfo(0, "video", codec_name="h264"), StreamInfo(1, "audio", codec_name="aac", bit_rate=128000)]
+        info = MediaInfo("video.mkv", duration=10.0, bit_rate=1128000, streams=streams)
+        assert info.video_bit_rate == 1000000
+
+    def test_round_trip_dict(self):
+        """Test serialization used by caches"""
+        streams = [StreamInfo(0, "video", codec_name="h264", width=1280, height=720, fps=30.0)]
+        info = MediaInfo("video.mp4", size_bytes=1000, duration=5.0, streams=streams, keyframe_times=[0.0, 2.0])
+        restored = MediaInfo.from_dict(json.loads(json.dumps(info.to_dict())))
+
+        assert restored.to_dict() == info.to_dict()
+        assert restored.width == 1280
+
+
+class TestProbeCache:
+    """Test suite for the persistent probe cache"""
+
+    @staticmethod
+    def _make_file(tmp_path, name="video.mp4", data=b"x" * 2048):
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+
+    @staticmethod
+    def _info(path):
+        return MediaInfo(path, size_bytes=2048, duration=42.0,
+                         streams=[StreamInfo(0, "video", codec_name="h264", width=1280, height=720)])
+
+    def test_hit_for_unchanged_file(self, tmp_path):
+        """Test that an unchanged file is served without probing"""
+        cache = ProbeCache(db_path=str(tmp_path / "cache.sqlite3"))
+        path = self._make_file(tmp_path)
+        cache.put(self._info(path))
+
+        with patch('utils.probe_cache.probe_media') as mock_probe:
+            info = cache.probe(path)
+        mock_probe.assert_not_called()
+        assert info.duration == 42.0
+        assert info.width == 1280
+
+    def test_miss_when_file_changes(self, tmp_path):
+        """Test that a changed size or mtime invalidates the entry"""
+        cache = ProbeCache(db_path=str(tmp_path / "cache.sqlite3"))
+        path = self._make_file(tmp_path)
+        cache.put(self._info(path))
+
+        with open(path, 'ab') as f:
+            f.write(b"more data")
+        assert cache.get(path) is None
+
+    def test_probe_stores_result(self, tmp_path):
+        """Test that a miss probes once and caches the result"""
+        cache = ProbeCache(db_path=str(tmp_path / "cache.sqlite3"))
+        path = self._make_file(tmp_path)
+
+        with patch('utils.probe_cache.probe_media', return_value=self._info(path)) as mock_probe:
+            cache.probe(path)
+            cache.probe(path)
+        assert mock_probe.call_count == 1
+
+    def test_eviction_by_count(self, tmp_path):
+        """Test that the least recently used entries are evicted past max_entries"""
+        cache = ProbeCache(db_path=str(tmp_path / "cache.sqlite3"), max_entries=2)
+        paths = [self._make_file(tmp_path, f"video{i}.mp4") for i in range(3)]
+        for path in paths:
+            cache.put(self._info(path))
+
+        assert len(cache) == 2
+        assert cache.get(paths[0]) is None
+        assert cache.get(paths[2]) is not None
+
+    def test_eviction_by_age(self, tmp_path):
+        """Test that entries older than max_age_days are evicted"""
+        cache = ProbeCache(db_path=str(tmp_path / "cache.sqlite3"), max_age_days=0)
+        path = self._make_file(tmp_path)
+        cache.put(self._info(path))
+        cache.put(self._info(self._make_file(tmp_path, "other.mp4")))
+
+        assert cache.get(path) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,205 @@
+import pytest
+import os
+import sys
+import threading
+import time
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from utils.ffmpeg_tools import get_ffmpeg_path, parse_progress, run_ffmpeg
+from utils.progress import ProgressTracker
+from utils.cancellation import CancellationToken
+from utils.watchdog import StallWatchdog
+
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestProgress:
+    """Test suite for live encoder progress reporting"""
+
+    def test_parse_progress_block(self):
+        """Test conversion of ffmpeg -progress key=value pairs"""
+        stats = parse_progress({
+            "frame": "300", "fps": "59.94", "out_time_us": "10010000", "total_size": "1048576",
+            "speed": "2.5x", "progress": "continue",
+        })
+        assert stats["out_time"] == pytest.approx(10.01)
+        assert stats["fps"] == pytest.approx(59.94)
+        assert stats["speed"] == 2.5
+        assert stats["total_size"] == 1048576
+        assert stats["done"] == False
+
+    def test_parse_progress_unknown_values(self):
+        """Test that N/A values are reported as None"""
+        stats = parse_progress({"out_time_us": "N/A", "speed": "N/A", "total_size": "N/A", "progress": "end"})
+        assert stats["out_time"] is None
+        assert stats["speed"] is None
+        assert stats["done"] == True
+
+    def test_tracker_weights_steps(self):
+        """Test that two passes add up to one job-level percentage"""
+        events = []
+        tracker = ProgressTracker(events.append, duration=100.0, interval=0)
+        pass1 = tracker.step("pass1", weight=0.25, writes_output=False)
+        pass2 = tracker.step("pass2", weight=0.75)
+
+        pass1({"out_time": 100.0, "speed": 8.0, "total_size": 0, "done": True})
+        assert events[-1]["percent"] == 25.0
+        pass2({"out_time": 50.0, "speed": 2.0, "fps": 60.0, "total_size": 2048, "done": False})
+        assert events[-1]["percent"] == 62.5
+        assert events[-1]["speed"] == 2.0
+        assert events[-1]["total_size"] == 2048
+
+    def test_tracker_sums_parallel_chunks(self):
+        """Test that parallel chunk encodes report a combined speed"""
+        events = []
+        tracker = ProgressTracker(events.append, duration=60.0, interval=0)
+        first = tracker.step("chunk0", weight=30, duration=30)
+        second = tracker.step("chunk1", weight=30, duration=30)
+        first({"out_time": 15.0, "speed": 1.5, "total_size": 100, "done": False})
+        second({"out_time": 15.0, "speed": 1.5, "total_size": 100, "done": False})
+
+        assert events[-1]["percent"] == 50.0
+        assert events[-1]["speed"] == 3.0
+        assert events[-1]["total_size"] == 200
+
+    def test_tracker_throttles_events(self):
+        """Test that updates within the interval are coalesced except the final one"""
+        events = []
+        tracker = ProgressTracker(events.append, duration=10.0, interval=60)
+        on_progress = tracker.step("encode")
+        for second in range(1, 10):
+            on_progress({"out_time": float(second), "done": False})
+        on_progress({"out_time": 10.0, "done": True})
+        assert [e["percent"] for e in events] == [10.0, 100.0]
+
+    def test_disabled_tracker(self):
+        """Test that no callback means no progress hook"""
+        assert ProgressTracker(None, 10.0).step("encode") is None
+
+    def test_run_ffmpeg_reports_progress(self):
+        """Test that a real ffmpeg run streams progress to the callback"""
+        events = []
+        cmd = [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-f", "lavfi", "-i", "testsrc=duration=2:size=160x120:rate=25",
+               "-f", "null", "-"]
+        try:
+            returncode, _ = run_ffmpeg(cmd, on_progress=events.append)
+        except OSError:
+            pytest.skip("ffmpeg not available")
+
+        assert returncode == 0
+        assert events and events[-1]["done"] == True
+        assert events[-1]["out_time"] == pytest.approx(2.0, abs=0.1)
+
+
+    def test_run_ffmpeg_cancel_kills_encoder(self):
+        """Test that a cancelled token kills a never-ending ffmpeg run quickly"""
+        token = CancellationToken()
+        cmd = [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-re", "-f", "lavfi", "-i", "testsrc=size=160x120:rate=25",
+               "-f", "null", "-"]
+        timer = threading.Timer(0.5, token.cancel)
+        timer.start()
+        start = time.monotonic()
+        try:
+            returncode, _ = run_ffmpeg(cmd, cancel_token=token)
+        except OSError:
+            pytest.skip("ffmpeg not available")
+        finally:
+            timer.cancel()
+
+        assert returncode != 0
+        assert time.monotonic() - start < 3
+
+    def test_tracker_flags_budget_overrun_once(self):
+        """Test that a predicted finish past the budget is reported once"""
+        overruns = []
+        tracker = ProgressTracker(None, duration=100.0, interval=0, budget_seconds=60, on_overrun=overruns.append)
+        on_progress = tracker.step("encode")
+        tracker._started -= 20  # 10% done after 20s predicts 200s in total
+        on_progress({"out_time": 10.0})
+        on_progress({"out_time": 11.0})
+        assert len(overruns) == 1
+        assert overruns[0] == pytest.approx(200, rel=0.05)
+
+    def test_tracker_within_budget(self):
+        """Test that an encode on track for its budget is not flagged"""
+        events = []
+        tracker = ProgressTracker(events.append, duration=100.0, interval=0, budget_seconds=600)
+        on_progress = tracker.step("encode")
+        tracker._started -= 20
+        on_progress({"out_time": 50.0})
+        assert events[-1]["eta"] == pytest.approx(20, rel=0.05)
+        assert events[-1]["over_budget"] == False
+
+
+class TestStallWatchdog:
+    """Test suite for progress-based stall detection"""
+
+    def test_healthy_long_encode_never_expires(self):
+        """Test that an encode advancing slowly for hours is never cut off"""
+        clock = FakeClock()
+        watchdog = StallWatchdog(stall_seconds=20, startup_seconds=60, clock=clock)
+        for second in range(0, 4 * 3600, 10):
+            clock.now = second
+            watchdog.observe({"out_time": second / 10, "total_size": second * 100})
+            assert watchdog.expired() == False
+
+    def test_stall_after_progress(self):
+        """Test that repeated updates without an advancing timestamp count as a stall"""
+        clock = FakeClock()
+        watchdog = StallWatchdog(stall_seconds=20, clock=clock)
+        watchdog.observe({"out_time": 5.0, "total_size": 1000})
+        for second in range(1, 25):
+            clock.now = second
+            watchdog.observe({"out_time": 5.0, "total_size": 1000})
+        assert watchdog.expired() == True
+        assert watchdog.stalled == True
+        assert "20s" in watchdog.reason
+
+    def test_startup_grace(self):
+        """Test that slow start-up is allowed the longer startup window"""
+        clock = FakeClock()
+        watchdog = StallWatchdog(stall_seconds=20, startup_seconds=60, clock=clock)
+        clock.now = 50
+        assert watchdog.expired() == False
+        clock.now = 61
+        assert watchdog.expired() == True
+
+    def test_touch_counts_as_progress(self):
+        """Test that MoviePy-style counter updates keep the watchdog alive"""
+        clock = FakeClock()
+        watchdog = StallWatchdog(stall_seconds=20, clock=clock)
+        for second in range(0, 100, 5):
+            clock.now = second
+            watchdog.touch()
+            assert watchdog.expired() == False
+
+    @pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs named pipes")
+    def test_run_ffmpeg_kills_hung_decoder(self, tmp_path):
+        """Test that an ffmpeg run blocked on its input is killed by the watchdog"""
+        fifo = str(tmp_path / "never_written")
+        os.mkfifo(fifo)
+        cmd = [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-f", "rawvideo", "-pix_fmt", "gray", "-s", "16x16",
+               "-i", fifo, "-f", "null", "-"]
+        watchdog = StallWatchdog(stall_seconds=0.5, startup_seconds=0.5)
+        start = time.monotonic()
+        try:
+            returncode, _ = run_ffmpeg(cmd, watchdog=watchdog)
+        except OSError:
+            pytest.skip("ffmpeg not available")
+
+        assert returncode != 0
+        assert watchdog.stalled == True
+        assert time.monotonic() - start < 5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
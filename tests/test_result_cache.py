@@ -0,0 +1,95 @@
+import pytest
+import os
+import sys
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from utils.result_cache import ResultCache, fingerprint
+from compressor import VideoCompressor
+
+
+class TestFingerprint:
+    """Test suite for the head/middle/tail content fingerprint"""
+
+    def test_same_content_different_name(self, tmp_path):
+        """Test that renamed copies share a fingerprint"""
+        data = os.urandom(4 * 1024 * 1024)
+        first = tmp_path / "recording.mp4"
+        second = tmp_path / "recording (1).mp4"
+        first.write_bytes(data)
+        second.write_bytes(data)
+        assert fingerprint(str(first)) == fingerprint(str(second))
+
+    def test_middle_change_detected(self, tmp_path):
+        """Test that a change in the sampled middle region changes the fingerprint"""
+        data = bytearray(os.urandom(4 * 1024 * 1024))
+        first = tmp_path / "a.mp4"
+        first.write_bytes(bytes(data))
+        data[len(data) // 2] ^= 0xFF
+        second = tmp_path / "b.mp4"
+        second.write_bytes(bytes(data))
+        assert fingerprint(str(first)) != fingerprint(str(second))
+
+    def test_empty_file(self, tmp_path):
+        """Test that empty files can be fingerprinted"""
+        empty = tmp_path / "empty.mp4"
+        empty.write_bytes(b"")
+        assert fingerprint(str(empty))
+
+
+class TestResultCache:
+    """Test suite for the content-addressed result cache"""
+
+    @staticmethod
+    def _write(path, data):
+        with open(path, 'wb') as f:
+            f.write(data)
+        return str(path)
+
+    def test_store_and_restore(self, tmp_path):
+        """Test that a stored output is reused for the same input and settings"""
+        cache = ResultCache(cache_dir=str(tmp_path / "cache"))
+        source = self._write(tmp_path / "input.mp4", b"source" * 1000)
+        output = self._write(tmp_path / "input_compressed.mp4", b"compressed")
+
+        key = cache.make_key(source, "target=10")
+        cache.store(key, output)
+
+        copy = self._write(tmp_path / "copy of input.mp4", b"source" * 1000)
+        restored = str(tmp_path / "copy_compressed.mp4")
+        assert cache.restore(cache.make_key(copy, "target=10"), restored) == True
+        with open(restored, 'rb') as f:
+            assert f.read() == b"compressed"
+
+    def test_miss_for_different_settings(self, tmp_path):
+        """Test that other settings never reuse an output"""
+        cache = ResultCache(cache_dir=str(tmp_path / "cache"))
+        source = self._write(tmp_path / "input.mp4", b"source" * 1000)
+        cache.store(cache.make_key(source, "target=10"), self._write(tmp_path / "out.mp4", b"compressed"))
+
+        assert cache.restore(cache.make_key(source, "target=25"), str(tmp_path / "other.mp4")) == False
+
+    def test_lru_eviction_by_size(self, tmp_path):
+        """Test that the least recently used outputs are evicted past max_bytes"""
+        cache = ResultCache(cache_dir=str(tmp_path / "cache"), max_bytes=2500)
+        keys = []
+        for i in range(3):
+            source = self._write(tmp_path / f"input{i}.mp4", f"source{i}".encode() * 100)
+            key = cache.make_key(source, "target=10")
+            cache.store(key, self._write(tmp_path / f"out{i}.mp4", b"x" * 1000))
+            keys.append(key)
+
+        assert cache.total_bytes() <= 2500
+        assert cache.restore(keys[0], str(tmp_path / "restored0.mp4")) == False
+        assert cache.restore(keys[2], str(tmp_path / "restored2.mp4")) == True
+
+    def test_settings_key_tracks_output_settings(self):
+        """Test that the compressor settings key changes with target and container"""
+        compressor = VideoCompressor(target_size_mb=10)
+        assert compressor.settings_key("a.mp4") == compressor.settings_key("b.mp4")
+        assert compressor.settings_key("a.mp4") != compressor.settings_key("a.mkv")
+        assert compressor.settings_key("a.mp4") != VideoCompressor(target_size_mb=25).settings_key("a.mp4")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,153 @@
+import pytest
+import os
+import sys
+import subprocess
+import tempfile
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from compressor import VideoCompressor, ENGINE_FFMPEG, ENGINE_MOVIEPY, STATUS_DONE
+from utils.audio import AudioPlan
+from utils.ffmpeg_tools import get_ffmpeg_path
+from utils.media_info import MediaInfo, StreamInfo
+from utils.predictor import SizePrediction
+from utils.targets import OutputTarget, build_multi_command, parse_target_sizes, target_suffix
+
+
+class TestOutputTargets:
+    """Test suite for multi-target outputs encoded from a single decode"""
+
+    def test_parse_target_sizes(self):
+        """Test that sizes can be separated by commas, semicolons or spaces and repeats are dropped"""
+        assert parse_target_sizes("10") == [10.0]
+        assert parse_target_sizes("10, 25;50 25") == [10.0, 25.0, 50.0]
+        assert target_suffix("_compressed", 25.0) == "_compressed_25MB"
+        assert target_suffix("_c", 7.5) == "_c_7.5MB"
+        for text in ("", "ten", "10, -5", "0"):
+            with pytest.raises(ValueError):
+                parse_target_sizes(text)
+
+    def test_target_round_trip_and_child_settings(self):
+        """Test that targets survive the trip to a worker and override size, codec and height only"""
+        target = OutputTarget.from_dict(OutputTarget(25, codec="vp9", height=480).to_dict())
+        assert target.describe() == "25 MB vp9 480p"
+        with pytest.raises(ValueError):
+            OutputTarget(0)
+        parent = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG, max_fps=24)
+        child = parent.for_target(target)
+        assert child.target_size_mb == 25 and child.backend.name == "vp9" and child.max_height == 480
+        assert child.max_fps == 24 and child.auto_crop is False
+        assert parent.for_target(OutputTarget(5)).backend.name == parent.backend.name
+        with pytest.raises(ValueError):
+            VideoCompressor(engine=ENGINE_MOVIEPY).for_target(OutputTarget(5, codec="vp9"))
+
+    def test_max_height_limits_output(self, capsys):
+        """Test that a height limit scales down a source the bitrate alone would keep"""
+        info = MediaInfo("in.mp4", size_bytes=1, duration=10.0,
+                         streams=[StreamInfo(0, "video", codec_name="h264", width=1920, height=1080, fps=30.0)])
+        assert VideoCompressor(engine=ENGINE_FFMPEG).plan_output_size(info, 5000) is None
+        assert VideoCompressor(engine=ENGINE_FFMPEG, max_height=480).plan_output_size(info, 5000) == (854, 480)
+        capsys.readouterr()
+        limited = VideoCompressor(engine=ENGINE_FFMPEG, max_height=480)
+        assert limited.plan_output_size(info, 5000, report=False) == (854, 480)
+        assert capsys.readouterr().out == ""
+
+    def test_passthrough_only_for_matching_targets(self, tmp_path):
+        """Test that a fitting input is not copied for a target with another codec or a lower height"""
+        input_path = tmp_path / "in.mp4"
+        input_path.write_bytes(b"\0" * 4096)
+        info = MediaInfo(str(input_path), size_bytes=4096, duration=10.0,
+                         streams=[StreamInfo(0, "video", codec_name="h264", width=1920, height=1080, fps=30.0)])
+        parent = VideoCompressor(target_size_mb=10, engine=ENGINE_FFMPEG)
+        assert not parent.for_target(OutputTarget(10, height=720)).try_passthrough(
+            str(input_path), str(tmp_path / "out_720.mp4"), info)
+        assert not parent.for_target(OutputTarget(10, codec="vp9")).try_passthrough(
+            str(input_path), str(tmp_path / "out.webm"), info)
+        assert parent.for_target(OutputTarget(10, height=1080)).try_passthrough(
+            str(input_path), str(tmp_path / "out_1080.mp4"), info)
+        assert (tmp_path / "out_1080.mp4").read_bytes() == input_path.read_bytes()
+
+    def test_split_encodes_run_per_target(self, tmp_path, monkeypatch):
+        """Test that inputs long enough for a split encode compress each target on its own, each with a share of the time budget"""
+        input_path = tmp_path / "in.mp4"
+        input_path.write_bytes(b"\0" * 4096)
+        info = MediaInfo(str(input_path), size_bytes=4096, duration=1200.0,
+                         streams=[StreamInfo(0, "video", codec_name="h264", width=1280, height=720, fps=30.0)])
+        calls = []
+        monkeypatch.setattr(VideoCompressor, "probe", lambda self, path: info)
+        monkeypatch.setattr(VideoCompressor, "compress_video",
+                            lambda self, input_path, output_path, *args, **kwargs: calls.append(
+                                (self.target_size_mb, output_path, kwargs["cpu_budget"],
+                                 kwargs["max_processing_time"])) or True)
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG, segmented=True)
+        outputs = [(OutputTarget(10), "out_10MB.mp4"), (OutputTarget(25), "out_25MB.mp4")]
+        assert compressor.compress_targets(str(input_path), outputs, cpu_budget=8, max_processing_time=1200)
+        assert calls == [(10, "out_10MB.mp4", 8, 600), (25, "out_25MB.mp4", 8, 600)]
+
+    def test_shared_encode_corrects_each_target_from_samples(self, tmp_path, monkeypatch):
+        """Test that size prediction samples every target and the shared encode uses the corrected bitrates"""
+        input_path = tmp_path / "in.mp4"
+        input_path.write_bytes(b"\0" * 4096)
+        info = MediaInfo(str(input_path), size_bytes=4096, duration=100.0,
+                         streams=[StreamInfo(0, "video", codec_name="h264", width=640, height=360, fps=30.0)])
+        sampled = []
+
+        def predict_output(self, input_path, info, video_bitrate_kbps, *args):
+            sampled.append(video_bitrate_kbps)
+            # The encoder overshoots by 25% on this content
+            return SizePrediction(video_bitrate_kbps, 10.0, video_bitrate_kbps * 1.25 * 10.0 * 1000 / 8, 1.0)
+
+        commands = []
+        monkeypatch.setattr(VideoCompressor, "probe", lambda self, path: info)
+        monkeypatch.setattr(VideoCompressor, "predict_output", predict_output)
+        monkeypatch.setattr(VideoCompressor, "run_ffmpeg_step",
+                            lambda self, cmd, *args: commands.append(cmd) and False)
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG, allow_passthrough=False, predict_size=True)
+        outputs = [(OutputTarget(5), str(tmp_path / "out_5MB.mp4")),
+                   (OutputTarget(10), str(tmp_path / "out_10MB.mp4"))]
+        assert not compressor.compress_targets(str(input_path), outputs, threads=2)
+        assert len(sampled) == 2 and len(commands) == 1
+        rates = [arg for arg in commands[0] if arg.endswith("k") and arg[:-1].isdigit()]
+        assert rates == [f"{int(kbps * 0.8)}k" for kbps in sampled]
+
+    def test_multi_command_shares_decode(self):
+        """Test that one command decodes once, splits, and gives each output its own scaler and encoder"""
+        parent = VideoCompressor(engine=ENGINE_FFMPEG, drop_duplicates=True)
+        small = parent.for_target(OutputTarget(10))
+        webm = parent.for_target(OutputTarget(25, codec="vp9"))
+        cmd = build_multi_command(parent, "in.mp4", [
+            (small, "out_10MB.mp4", 600, AudioPlan("encode", bitrate_kbps=64, codec="aac"), (640, 360)),
+            (webm, "out_25MB.webm", 1500, AudioPlan("none"), None),
+        ], threads=4, source_fps=30.0)
+        assert cmd.count("-i") == 1
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        assert graph.count("mpdecimate") == 1 and "split=2[split0][split1]" in graph
+        assert "[split0]scale=640:360" in graph and graph.endswith("[out1]")
+        second = cmd.index("out_10MB.mp4")
+        first_output, second_output = cmd[:second], cmd[second:]
+        assert "libx264" in first_output and "600k" in first_output and "+faststart" in first_output
+        assert "libvpx-vp9" in second_output and "1500k" in second_output and "-an" in second_output
+        assert first_output[first_output.index("-threads") + 1] == "2"
+        assert second_output[-1] == "out_25MB.webm"
+
+    def test_real_multi_target_encode(self):
+        """Test a real encode writing two sizes from one decode, each under its target"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "in.mp4")
+            cmd = [get_ffmpeg_path(), "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=s=640x360:r=25:d=8",
+                   "-c:v", "libx264", "-preset", "ultrafast", "-b:v", "6M", path]
+            try:
+                subprocess.run(cmd, check=True, capture_output=True)
+            except (OSError, subprocess.CalledProcessError):
+                pytest.skip("ffmpeg not available")
+            outputs = [(OutputTarget(1), os.path.join(tmpdir, "out_1MB.mp4")),
+                       (OutputTarget(2, height=240), os.path.join(tmpdir, "out_2MB.mp4"))]
+            compressor = VideoCompressor(engine=ENGINE_FFMPEG, allow_passthrough=False)
+            assert compressor.compress_targets(path, outputs, preset="ultrafast", threads=2)
+            assert compressor.last_status == STATUS_DONE
+            for target, output_path in outputs:
+                assert 0 < os.path.getsize(output_path) <= target.size_mb * 1024 * 1024 * 1.1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,147 @@
+import pytest
+import os
+import sys
+import subprocess
+import tempfile
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from compressor import VideoCompressor, ENGINE_FFMPEG, STATUS_DONE, STATUS_CANCELLED
+from utils.cancellation import CancellationToken
+from utils.ffmpeg_tools import get_ffmpeg_path
+from utils.media_info import probe_media
+from utils.probe_cache import ProbeCache
+from utils.trim import format_time, parse_keyframes, parse_range, parse_time, plan_smart_cut, trimmed_duration
+from utils.trim import count_copied_frames, cut_range, list_keyframes, parse_packets
+
+
+def make_clip(path, seconds=10, keyint=25, fps=25, preset="ultrafast"):
+    """H.264 test clip with a keyframe every keyint frames and a sine audio track (B-frames from "veryfast" up)."""
+    cmd = [get_ffmpeg_path(), "-v", "error", "-y", "-f", "lavfi", "-i", f"testsrc2=s=320x180:r={fps}:d={seconds}",
+           "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}", "-c:v", "libx264", "-preset", preset,
+           "-x264-params", f"keyint={keyint}:min-keyint={keyint}:scenecut=0", "-c:a", "aac", "-shortest", path]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("ffmpeg not available")
+
+
+class TestTrim:
+    """Test suite for compressing a time range with smart rendering"""
+
+    def test_parse_times_and_ranges(self):
+        """Test time and range parsing, open-ended ranges and display"""
+        assert parse_time("95") == 95 and parse_time("1:35") == 95 and parse_time("1:01:35.5") == 3695.5
+        assert parse_range("12:30-13:10") == (750.0, 790.0)
+        assert parse_range("-1:00") == (0.0, 60.0) and parse_range("45:00-") == (2700.0, None)
+        assert parse_range("  ") is None
+        for text in ("13:10-12:30", "1:2:3:4-", "ten-20", "1-2-3"):
+            with pytest.raises(ValueError):
+                parse_range(text)
+        assert format_time(750) == "12:30" and format_time(3723.5) == "1:02:03.5"
+        assert trimmed_duration((60, None), 100) == 40 and trimmed_duration((60, 500), 100) == 40
+        assert trimmed_duration(None, 100) == 100
+
+    def test_smart_cut_plan(self):
+        """Test that keyframes are read from framecrc flags and only whole GOPs inside the range are copied"""
+        text = "\n".join(["#tb 0: 1/1000",
+                          "0,          0,          0,       40,     5000, 0x00000000",
+                          "0,         40,         40,       40,      300, 0x00000000, F=0x0",
+                          "0,       2000,       2000,       40,     5000, 0x00000000",
+                          "0,       4000,       4000,       40,     5000, 0x00000000, F=0x3"])
+        assert parse_keyframes(text) == [0.0, 2.0, 4.0]
+        assert plan_smart_cut([0.0, 2.0, 4.0, 6.0], 1.5, 7.0) == (2.0, 6.0)
+        assert plan_smart_cut([0.0, 2.0, 4.0, 6.0], 2.0, 4.0) == (2.0, 4.0)
+        assert plan_smart_cut([0.0, 10.0], 1.0, 9.0) is None
+
+    def test_settings_key_includes_range(self):
+        """Test that a range changes the result cache key"""
+        compressor = VideoCompressor(engine=ENGINE_FFMPEG)
+        assert compressor.settings_key("a.mp4") != compressor.settings_key("a.mp4", trim=(10.0, 20.0))
+
+    def test_real_smart_cut(self):
+        """Test a real cut: the middle GOPs are copied, the edges re-encoded, audio kept, frames exact"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "in.mp4")
+            make_clip(path)
+            compressor = VideoCompressor(engine=ENGINE_FFMPEG)
+            cut_path = cut_range(compressor, path, (2.4, 7.6), tmpdir)
+            assert cut_path is not None
+            parts = [name for name in os.listdir(tmpdir) if name.startswith("part") and name.endswith(".mp4")]
+            assert len(parts) == 3
+            info = probe_media(cut_path)
+            assert info.duration == pytest.approx(5.2, abs=0.1)
+            assert info.has_audio
+            count = subprocess.run([get_ffmpeg_path(), "-v", "error", "-i", cut_path, "-map", "0:v:0", "-f", "framecrc", "-"],
+                                   capture_output=True, text=True).stdout
+            assert len([line for line in count.splitlines() if not line.startswith("#")]) == 130
+
+    def test_smart_cut_with_b_frames_joins_without_overlap(self):
+        """Test that the copied middle stops before the keyframe the last edge re-encodes, so frames neither
+        repeat nor go back in time at either join"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "in.mp4")
+            make_clip(path, seconds=120, keyint=60, fps=30, preset="veryfast")
+            compressor = VideoCompressor(engine=ENGINE_FFMPEG)
+            cut_path = cut_range(compressor, path, (31.3, 47.7), tmpdir)
+            assert cut_path is not None
+            listing = subprocess.run([get_ffmpeg_path(), "-v", "error", "-i", cut_path, "-map", "0:v:0", "-f", "framecrc", "-"],
+                                     capture_output=True, text=True).stdout
+            times = [pts for pts, _ in parse_packets(listing)]
+            assert len(times) == 492  # 16.4 s at 30 fps
+            steps = [later - earlier for earlier, later in zip(times, times[1:])]
+            assert min(steps) > 0
+            assert max(steps) - min(steps) < 0.002  # Millisecond timestamps of the Matroska cut
+
+    def test_copied_frame_count(self):
+        """Test that a copy takes the packets between its keyframes in decode order, not up to a time"""
+        # I0 P3 B1 B2 | I4 ... in decode order: the next keyframe is decoded before frames shown before it
+        packets = [(0.0, True), (0.3, False), (0.1, False), (0.2, False), (0.4, True), (0.6, False), (0.5, False)]
+        assert count_copied_frames(packets, 0.0, 0.4) == 4
+        assert count_copied_frames(packets, 0.0, 0.9) is None
+
+    def test_compress_range(self):
+        """Test that only the range is compressed and the bitrate is planned for its length"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "in.mp4")
+            make_clip(path, seconds=20)
+            output_path = os.path.join(tmpdir, "out.mp4")
+            compressor = VideoCompressor(target_size_mb=0.3, engine=ENGINE_FFMPEG)
+            assert compressor.compress_video(path, output_path, preset="ultrafast", threads=1, trim=(5.0, 9.0))
+            assert compressor.last_status == STATUS_DONE
+            assert probe_media(output_path).duration == pytest.approx(4.0, abs=0.15)
+            assert os.path.getsize(output_path) <= 0.3 * 1024 * 1024 * 1.1
+            assert not [name for name in os.listdir(tmpdir) if name.startswith("part")]
+
+    def test_range_messages_name_input_and_cut_is_not_cached(self, capsys):
+        """Test that messages name the user's file and only the input lands in the probe cache"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "holiday.mp4")
+            make_clip(path, seconds=6)
+            output_path = os.path.join(tmpdir, "out.mp4")
+            cache = ProbeCache(db_path=os.path.join(tmpdir, "probes.sqlite3"))
+            compressor = VideoCompressor(target_size_mb=0.3, engine=ENGINE_FFMPEG, probe_cache=cache)
+            assert compressor.compress_video(path, output_path, preset="ultrafast", threads=1, trim=(1.0, 4.0))
+            output = capsys.readouterr().out
+            assert "Passthrough: holiday.mp4" in output and "cut.mkv" not in output
+            assert compressor.display_name is None
+            with cache._connect() as conn:
+                paths = [row[0] for row in conn.execute("SELECT path FROM probes")]
+            assert paths == [os.path.abspath(path)]
+
+    def test_cancelled_keyframe_listing(self):
+        """Test that listing keyframes runs through the cancellable runner"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "in.mp4")
+            make_clip(path)
+            compressor = VideoCompressor(engine=ENGINE_FFMPEG)
+            assert list_keyframes(compressor, path, 2.0, 8.0, tmpdir) == [2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0]
+            token = CancellationToken()
+            token.cancel()
+            output_path = os.path.join(tmpdir, "out.mp4")
+            assert not compressor.compress_video(path, output_path, cancel_token=token, trim=(2.4, 7.6))
+            assert compressor.last_status == STATUS_CANCELLED
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])